@@ -0,0 +1,245 @@
+import logging
+import multiprocessing as mp
+import os
+import queue
+import shutil
+from collections import deque
+
+import numpy as np
+from tqdm import tqdm
+
+from Arena import Arena
+from BatchedSelfPlay import BatchedSelfPlay
+from Coach import Coach
+from EvaluationCache import EvaluationCacheManager
+from MCTS import MCTS
+from Reanalyse import Reanalyser
+
+log = logging.getLogger(__name__)
+
+
+def selfPlayWorker(game, nnetClass, args, shared, reader, version, examplesQueue, stop, seed, cache=None):
+    """
+    Self-play process. Plays episodes with the latest accepted network and puts their examples on examplesQueue
+    as (modelVersion, examples).
+
+    If the network supports shared weights (shared is not None), the worker attaches to them read-only and
+    hot-swaps to a newly published model before each episode. Otherwise the network is reloaded from
+    best.pth.tar whenever the shared version counter moves, which AsyncCoach only does after the file has been
+    atomically replaced.
+
+    cache is an optional EvaluationCache proxy shared by all workers, used under the model version. With
+    args.selfPlayBatchSize, the worker plays that many episodes at once with BatchedSelfPlay, which does not use it.
+    """
+    np.random.seed(seed)
+    coach = Coach(game, nnetClass(game), args, selfPlayOnly=True)
+    if shared is not None:
+        coach.nnet.attach_weights(shared, reader)
+    loadedVersion = 0
+
+    while not stop.is_set():
+        if version.value != loadedVersion:
+            loadedVersion = version.value
+            if shared is not None:
+                coach.nnet.refresh_weights()
+            else:
+                coach.nnet.load_checkpoint(folder=args.checkpoint, filename='best.pth.tar')
+        if args.get('selfPlayBatchSize'):
+            for examples in BatchedSelfPlay(game, coach.nnet, args, book=coach.book).playEpisodes(
+                    args.selfPlayBatchSize):
+                examplesQueue.put((loadedVersion, examples))
+            continue
+        coach.mcts = MCTS(game, coach.nnet, args, cache=cache, cacheVersion=loadedVersion,
+                          book=coach.book)  # reset search tree
+        examplesQueue.put((loadedVersion, coach.executeEpisode()))
+
+
+def arenaWorker(game, nnetClass, args, candidates, results):
+    """
+    Arena process. For every (iteration, filename) taken from candidates, pits the candidate checkpoint against
+    best.pth.tar and puts (iteration, filename, pwins, nwins, draws) on results. A None candidate stops it.
+    """
+    pnet = nnetClass(game)
+    nnet = nnetClass(game)
+
+    while True:
+        candidate = candidates.get()
+        if candidate is None:
+            return
+        iteration, filename = candidate
+
+        pnet.load_checkpoint(folder=args.checkpoint, filename='best.pth.tar')
+        nnet.load_checkpoint(folder=args.checkpoint, filename=filename)
+        pmcts = MCTS(game, pnet, args)
+        nmcts = MCTS(game, nnet, args)
+
+        arena = Arena(lambda x: np.argmax(pmcts.getActionProb(x, temp=0)),
+                      lambda x: np.argmax(nmcts.getActionProb(x, temp=0)), game)
+        pwins, nwins, draws = arena.playGames(args.arenaCompare)
+        results.put((iteration, filename, pwins, nwins, draws))
+
+
+class AsyncCoach(Coach):
+    """
+    Pipelined version of Coach. Instead of running self-play, training and arena one after the other, the stages
+    run concurrently:
+
+    - numSelfPlayWorkers processes keep generating games with the latest accepted network,
+    - the trainer (this process) consumes numEps episodes per iteration from them and trains a candidate,
+    - an arena process evaluates the previous candidate against best.pth.tar while the next one is trained.
+
+    Checkpoints are handed between the processes as files, which NeuralNet.save_checkpoint writes under a temporary
+    name and then atomically renames, so no stage ever reads a partially written network. If the network supports
+    it, the accepted weights are additionally published once into shared memory, which the self-play workers attach
+    to instead of each loading best.pth.tar. At most one candidate is in the arena at a time. Unlike Coach, a rejected candidate does not roll back the trainer: training continues from the
+    current weights and the next candidate is gated against best.pth.tar again.
+
+    Since the stages overlap, the recorded phase times are the time the trainer spends blocked on them
+    ('coach.selfplay_wait', 'coach.arena_wait') next to 'coach.training'.
+
+    With args.reanalysePositions, the reanalysis of the history (see Reanalyse) runs in a background thread of the
+    trainer on a copy of the accepted network, refreshing that many examples per iteration while the trainer
+    trains or waits for self-play.
+    """
+
+    def learn(self):
+        """
+        Performs numIters training iterations with the self-play and arena stages running in the background.
+        """
+        ctx = mp.get_context('spawn')
+        self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='best.pth.tar')
+
+        self.shared = self.nnet.share_weights(self.args.numSelfPlayWorkers)
+        if self.reanalyser is not None:
+            self.reanalyser = Reanalyser(self.game, self.nnet.__class__(self.game), self.args)
+            self.reanalyser.setWeights(self.nnet.snapshot())
+            self.reanalyser.start(self.trainExamplesHistory)
+        version = ctx.Value('i', 1)
+        manager = None
+        if self.args.get('evaluationCacheSize'):
+            manager = EvaluationCacheManager(ctx=ctx)
+            manager.start()
+            self.cache = manager.EvaluationCache(self.args.evaluationCacheSize, version.value)
+        stop = ctx.Event()
+        examplesQueue = ctx.Queue(maxsize=max(1, self.args.numEps))
+        self.examplesQueue = examplesQueue
+        self.drainedEpisodes = deque()
+        candidates = ctx.Queue()
+        results = ctx.Queue()
+
+        workers = [ctx.Process(target=selfPlayWorker, daemon=True,
+                               args=(self.game, self.nnet.__class__, self.args, self.shared, reader, version,
+                                     examplesQueue, stop, np.random.randint(2 ** 31), self.cache))
+                   for reader in range(self.args.numSelfPlayWorkers)]
+        arena = ctx.Process(target=arenaWorker, daemon=True,
+                            args=(self.game, self.nnet.__class__, self.args, candidates, results))
+        for p in workers + [arena]:
+            p.start()
+
+        pending = False
+        reported = 0  # reanalysed positions counted in the metrics
+        try:
+            for i in range(1, self.args.numIters + 1):
+                log.info(f'Starting Iter #{i} ...')
+                if not self.skipFirstSelfPlay or i > 1:
+                    iterationTrainExamples = deque([], maxlen=self.args.maxlenOfQueue)
+                    with self.metrics.timer('coach.selfplay_wait'):
+                        for _ in tqdm(range(self.args.numEps), desc="Self Play"):
+                            self.getEpisodeExamples(examplesQueue, iterationTrainExamples, workers)
+                    self.trainExamplesHistory.append(self.compactExamples(iterationTrainExamples))
+                    self.logCacheStats()
+                    if self.reanalyser is not None:
+                        self.reanalyser.grant(self.args.reanalysePositions)
+                        # counted like Coach.reanalyseHistory: the positions refreshed since the last iteration
+                        refreshed = self.reanalyser.refreshed
+                        self.metrics.count('reanalyse.positions', refreshed - reported)
+                        reported = refreshed
+
+                trainExamples = self.prepareTrainExamples(i)
+                self.trainNetwork(trainExamples)
+
+                # only one candidate is evaluated at a time: wait for the previous verdict before handing over
+                if pending:
+                    with self.metrics.timer('coach.arena_wait'):
+                        result = results.get()
+                    self.handleArenaResult(result, version)
+                candidate = f'candidate_{i}.pth.tar'
+                self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=candidate)
+                self.candidateSnapshot = self.nnet.snapshot() \
+                    if self.shared is not None or self.reanalyser is not None else None
+                candidates.put((i, candidate))
+                pending = True
+                self.exportMetrics(i)
+
+            if pending:
+                self.handleArenaResult(results.get(), version)
+        finally:
+            if self.reanalyser is not None:
+                self.reanalyser.stop()
+            stop.set()
+            candidates.put(None)
+            for p in workers:
+                p.terminate()
+            for p in workers + [arena]:
+                p.join(timeout=10)
+            if manager is not None:
+                manager.shutdown()
+
+    def getEpisodeExamples(self, examplesQueue, iterationTrainExamples, workers):
+        """
+        Blocks until a self-play worker delivers an episode and adds its examples to iterationTrainExamples.
+        """
+        if self.drainedEpisodes:
+            iterationTrainExamples += self.drainedEpisodes.popleft()
+            return
+        while True:
+            try:
+                _, examples = examplesQueue.get(timeout=5)
+                break
+            except queue.Empty:
+                if not any(p.is_alive() for p in workers):
+                    raise RuntimeError('All self-play workers have exited')
+        iterationTrainExamples += examples
+
+    def drainEpisodes(self):
+        """
+        Moves the episodes waiting on the examples queue to drainedEpisodes, where getEpisodeExamples takes them
+        first. Called while a publish waits for the self-play workers: a worker blocked on the full queue only
+        releases the old weights once its episode has been taken.
+        """
+        while True:
+            try:
+                _, examples = self.examplesQueue.get_nowait()
+            except queue.Empty:
+                return
+            self.drainedEpisodes.append(examples)
+
+    def handleArenaResult(self, result, version):
+        """
+        Accepts or rejects an evaluated candidate. Accepted candidates atomically replace best.pth.tar, are published
+        to the shared weights and bump the shared version counter so that the self-play workers switch to them.
+        """
+        iteration, filename, pwins, nwins, draws = result
+        candidatePath = os.path.join(self.args.checkpoint, filename)
+
+        log.info('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
+        if pwins + nwins == 0 or float(nwins) / (pwins + nwins) < self.args.updateThreshold:
+            log.info(f'REJECTING CANDIDATE OF ITER #{iteration}')
+            os.remove(candidatePath)
+        else:
+            log.info(f'ACCEPTING CANDIDATE OF ITER #{iteration}')
+            self.copyCheckpointAtomic(candidatePath, self.getCheckpointFile(iteration))
+            os.replace(candidatePath, os.path.join(self.args.checkpoint, 'best.pth.tar'))
+            if self.shared is not None:
+                self.nnet.publish_weights(self.shared, self.candidateSnapshot, wait=self.drainEpisodes)
+            if self.reanalyser is not None:
+                self.reanalyser.setWeights(self.candidateSnapshot)
+            with version.get_lock():
+                version.value += 1
+            if self.cache is not None:
+                self.cache.invalidate(version.value)
+
+    def copyCheckpointAtomic(self, path, filename):
+        target = os.path.join(self.args.checkpoint, filename)
+        shutil.copyfile(path, target + '.tmp')
+        os.replace(target + '.tmp', target)
@@ -0,0 +1,125 @@
+import numpy as np
+
+from GameRecord import GameRecord
+from MCTS import MCTS
+from Reanalyse import BatchedMCTS
+
+
+class GameBatch():
+    """
+    Batch engine for games without one of their own (see Game.getBatchEngine): steps the games one by one through
+    the game.
+    """
+
+    def __init__(self, game):
+        self.game = game
+
+    def getInitBoards(self, size):
+        return np.array([self.game.getInitBoard() for _ in range(size)])
+
+    def getNextState(self, boards, players, actions):
+        states = [self.game.getNextState(board, player, action) for board, player, action in
+                  zip(boards, players, actions)]
+        return np.array([board for board, _ in states]), np.array([player for _, player in states])
+
+    def getGameEnded(self, boards, players):
+        return np.array([self.game.getGameEnded(board, player) for board, player in zip(boards, players)],
+                        dtype=np.float64)
+
+    def getCanonicalForm(self, boards, players):
+        return np.array([self.game.getCanonicalForm(board, player) for board, player in zip(boards, players)])
+
+
+class BatchedSelfPlay():
+    """
+    Plays many self-play games at once in a single process. Like Coach.executeEpisode, every game searches its own
+    tree (a BatchedMCTS), but the searches of all games advance together: every simulation round descends once in
+    each tree, evaluates all the leaves reached in one nnet.predict_batch call and backs them up. The games are
+    stepped together through game.getBatchEngine(), one by one through the game if it has none.
+
+    Moves are chosen as by Coach.executeEpisode with MCTS.getActionProb: args.numMCTSSims simulations, temp 1
+    before args.tempThreshold and 0 after it, forced moves and positions of book (an OpeningBook) answered without
+    the batched search. The time budget and early stop of getActionProb do not apply, and leaf evaluations bypass
+    the evaluation cache.
+    """
+
+    def __init__(self, game, nnet, args, book=None):
+        self.game = game
+        self.nnet = nnet
+        self.args = args
+        self.book = book
+        self.engine = game.getBatchEngine() or GameBatch(game)
+
+    def playEpisodes(self, numEpisodes):
+        """
+        Plays numEpisodes games, each starting with player 1. With args.gameRecords, every game is appended to it
+        as a GameRecord.
+
+        Returns:
+            episodes: list with the training examples (board, pi, v) of every game, as returned by
+                      Coach.executeEpisode
+        """
+        boards = self.engine.getInitBoards(numEpisodes)
+        players = np.ones(numEpisodes, dtype=int)
+        trees = [BatchedMCTS(self.game, self.nnet, self.args, book=self.book) for _ in range(numEpisodes)]
+        trainExamples = [[] for _ in range(numEpisodes)]
+        records = [GameRecord() for _ in range(numEpisodes)] if self.args.get('gameRecords') else None
+        episodes = [None] * numEpisodes
+        active = np.arange(numEpisodes)
+        episodeStep = 0
+
+        while len(active) > 0:
+            episodeStep += 1
+            temp = int(episodeStep < self.args.tempThreshold)
+            canonicalBoards = self.engine.getCanonicalForm(boards[active], players[active])
+            pis = self.getActionProbs([trees[g] for g in active], canonicalBoards, temp)
+
+            actions = np.zeros(len(active), dtype=int)
+            for i, g in enumerate(active):
+                for b, p in self.game.getSymmetries(canonicalBoards[i], pis[i]):
+                    trainExamples[g].append([b, players[g], p, None])
+                actions[i] = np.random.choice(len(pis[i]), p=pis[i])
+                if records is not None:
+                    records[g].add(actions[i], trees[g].getVisitCounts(canonicalBoards[i]))
+
+            boards[active], players[active] = self.engine.getNextState(boards[active], players[active], actions)
+            results = self.engine.getGameEnded(boards[active], players[active])
+
+            for g, r in zip(active[results != 0], results[results != 0]):
+                curPlayer = players[g]
+                if records is not None:
+                    records[g].result = r * curPlayer
+                    records[g].appendTo(self.args.gameRecords)
+                episodes[g] = [(x[0], x[2], r * ((-1) ** (x[1] != curPlayer))) for x in trainExamples[g]]
+                trees[g] = trainExamples[g] = None  # release the finished game
+            active = active[results == 0]
+
+        return episodes
+
+    def getActionProbs(self, trees, canonicalBoards, temp):
+        """
+        Returns the policies MCTS.getActionProb would return for canonicalBoards, each searched in its tree of trees,
+        with the leaves of all trees evaluated together in every simulation round.
+        """
+        pis = [tree.getShortcutProb(board, temp) for tree, board in zip(trees, canonicalBoards)]
+        searching = [i for i, pi in enumerate(pis) if pi is None]
+
+        for _ in range(self.args.numMCTSSims):
+            leaves = []  # (tree index, path, s, canonicalBoard of the leaf)
+            for i in searching:
+                path, s, leafBoard = trees[i].descend(canonicalBoards[i])
+                if trees[i].Es[s] != 0:
+                    trees[i].backup(path, -trees[i].Es[s])
+                else:
+                    leaves.append((i, path, s, leafBoard))
+            if not leaves:
+                continue
+
+            ps, vs = self.nnet.predict_batch(np.array([leafBoard for _, _, _, leafBoard in leaves]))
+            for (i, path, s, leafBoard), p, v in zip(leaves, ps, vs):
+                trees[i].expandLeaf(s, leafBoard, p)
+                trees[i].backup(path, -v)
+
+        for i in searching:
+            pis[i] = MCTS.countsToProbs(trees[i].getVisitCounts(canonicalBoards[i]), temp)
+        return pis
@@ -9,7 +9,14 @@ import numpy as np
 from tqdm import tqdm
 
 from Arena import Arena
+from BatchedSelfPlay import BatchedSelfPlay
+from EvaluationCache import EvaluationCache
+from GameRecord import GameRecord
 from MCTS import MCTS
+from Metrics import Metrics
+from OpeningBook import OpeningBook
+from Reanalyse import Reanalyser
+from ReplayBuffer import ReplayBuffer
 
 log = logging.getLogger(__name__)
 
@@ -18,14 +25,57 @@ class Coach():
     """
     This class executes the self-play + learning. It uses the functions defined
     in Game and NeuralNet. args are specified in main.py.
+
+    The wall time of every phase (selfplay, training, arena) is recorded in
+    self.metrics under 'coach.*', the statistics the network reports from
+    training (e.g. its throughput) under 'nnet.*'. With args.profileMCTS the self-play searches
+    are instrumented as well (see MCTS). With args.metricsFile the metrics are
+    exported after every iteration, as JSON lines or, if args.metricsFormat is
+    'prometheus', in the Prometheus text format.
+
+    With args.evaluationCacheSize, network evaluations of the accepted model
+    are kept in an EvaluationCache across episodes and shared by self-play and
+    the previous-model player of the arena. It is invalidated whenever a new
+    model is accepted.
+
+    With args.openingBook (path of an OpeningBook), self-play consults the
+    book, mixed with search according to args.bookMix. The arena never uses
+    the book, so that gating compares the networks alone.
+
+    With args.dedupExamples, the examples of every iteration, and the training
+    set drawn from the history, are aggregated by state (see ReplayBuffer), so
+    that positions recurring across episodes are stored and trained on once,
+    weighted by their count.
+
+    With args.gameRecords (path of a log file), every self-play game is
+    appended to it as a GameRecord: the actions played and the root visit
+    counts of their searches, from which games can be replayed later.
+
+    With args.selfPlayBatchSize, self-play plays that many episodes at once
+    in this process (see BatchedSelfPlay), evaluating the leaves of all their
+    searches in one forward pass per simulation round.
+
+    With args.reanalysePositions, that many examples of the previous
+    iterations are searched again with the accepted network after every
+    self-play phase and their targets refreshed in place (see Reanalyse).
+
+    With selfPlayOnly, only what executeEpisode needs is set up (the self-play
+    workers of AsyncCoach): no competitor network, evaluation cache or
+    reanalyser, so learn() cannot be used.
     """
 
-    def __init__(self, game, nnet, args):
+    def __init__(self, game, nnet, args, selfPlayOnly=False):
         self.game = game
         self.nnet = nnet
-        self.pnet = self.nnet.__class__(self.game)  # the competitor network
+        self.pnet = self.nnet.__class__(self.game) if not selfPlayOnly else None  # the competitor network
         self.args = args
-        self.mcts = MCTS(self.game, self.nnet, self.args)
+        self.metrics = Metrics()
+        self.modelVersion = 0  # incremented whenever a new model is accepted
+        self.cache = EvaluationCache(args.evaluationCacheSize) \
+            if args.get('evaluationCacheSize') and not selfPlayOnly else None
+        self.book = OpeningBook.load(args.openingBook) if args.get('openingBook') else None
+        self.mcts = self.selfPlayMCTS()
+        self.reanalyser = Reanalyser(game, nnet, args) if args.get('reanalysePositions') and not selfPlayOnly else None
         self.trainExamplesHistory = []  # history of examples from args.numItersForTrainExamplesHistory latest iterations
         self.skipFirstSelfPlay = False  # can be overriden in loadTrainExamples()
 
@@ -46,6 +96,7 @@ class Coach():
                            the player eventually won the game, else -1.
         """
         trainExamples = []
+        record = GameRecord() if self.args.get('gameRecords') else None
         board = self.game.getInitBoard()
         self.curPlayer = 1
         episodeStep = 0
@@ -61,11 +112,16 @@ class Coach():
                 trainExamples.append([b, self.curPlayer, p, None])
 
             action = np.random.choice(len(pi), p=pi)
+            if record is not None:
+                record.add(action, self.mcts.getVisitCounts(canonicalBoard))
             board, self.curPlayer = self.game.getNextState(board, self.curPlayer, action)
 
             r = self.game.getGameEnded(board, self.curPlayer)
 
             if r != 0:
+                if record is not None:
+                    record.result = r * self.curPlayer
+                    record.appendTo(self.args.gameRecords)
                 return [(x[0], x[2], r * ((-1) ** (x[1] != self.curPlayer))) for x in trainExamples]
 
     def learn(self):
@@ -84,48 +140,138 @@ class Coach():
             if not self.skipFirstSelfPlay or i > 1:
                 iterationTrainExamples = deque([], maxlen=self.args.maxlenOfQueue)
 
-                for _ in tqdm(range(self.args.numEps), desc="Self Play"):
-                    self.mcts = MCTS(self.game, self.nnet, self.args)  # reset search tree
-                    iterationTrainExamples += self.executeEpisode()
+                with self.metrics.timer('coach.selfplay'):
+                    for examples in self.selfPlay(self.args.numEps):
+                        iterationTrainExamples += examples
 
                 # save the iteration examples to the history 
-                self.trainExamplesHistory.append(iterationTrainExamples)
-
-            if len(self.trainExamplesHistory) > self.args.numItersForTrainExamplesHistory:
-                log.warning(
-                    f"Removing the oldest entry in trainExamples. len(trainExamplesHistory) = {len(self.trainExamplesHistory)}")
-                self.trainExamplesHistory.pop(0)
-            # backup history to a file
-            # NB! the examples were collected using the model from the previous iteration, so (i-1)  
-            self.saveTrainExamples(i - 1)
-
-            # shuffle examples before training
-            trainExamples = []
-            for e in self.trainExamplesHistory:
-                trainExamples.extend(e)
-            shuffle(trainExamples)
-
-            # training new network, keeping a copy of the old one
-            self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
-            self.pnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
-            pmcts = MCTS(self.game, self.pnet, self.args)
-
-            self.nnet.train(trainExamples)
+                self.trainExamplesHistory.append(self.compactExamples(iterationTrainExamples))
+                self.logCacheStats()
+                self.reanalyseHistory()
+
+            trainExamples = self.prepareTrainExamples(i)
+
+            # training new network, keeping an in-memory copy of the old one
+            snapshot = self.nnet.snapshot()
+            self.pnet.restore(snapshot)
+            pmcts = MCTS(self.game, self.pnet, self.args, cache=self.cache, cacheVersion=self.modelVersion)
+
+            self.trainNetwork(trainExamples)
             nmcts = MCTS(self.game, self.nnet, self.args)
 
             log.info('PITTING AGAINST PREVIOUS VERSION')
             arena = Arena(lambda x: np.argmax(pmcts.getActionProb(x, temp=0)),
                           lambda x: np.argmax(nmcts.getActionProb(x, temp=0)), self.game)
-            pwins, nwins, draws = arena.playGames(self.args.arenaCompare)
+            with self.metrics.timer('coach.arena'):
+                pwins, nwins, draws = arena.playGames(self.args.arenaCompare)
 
             log.info('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
             if pwins + nwins == 0 or float(nwins) / (pwins + nwins) < self.args.updateThreshold:
                 log.info('REJECTING NEW MODEL')
-                self.nnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
+                self.nnet.restore(snapshot)
             else:
                 log.info('ACCEPTING NEW MODEL')
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=self.getCheckpointFile(i))
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='best.pth.tar')
+                self.modelVersion += 1
+                if self.cache is not None:
+                    self.cache.invalidate(self.modelVersion)
+
+            self.exportMetrics(i)
+
+    def trainNetwork(self, trainExamples):
+        """
+        Trains self.nnet on trainExamples and records the time and the statistics train() returns.
+        """
+        with self.metrics.timer('coach.training'):
+            stats = self.nnet.train(trainExamples)
+        for name, value in (stats or {}).items():
+            self.metrics.gauge(f'nnet.{name}', value)
+
+    def selfPlay(self, numEps):
+        """
+        Plays numEps self-play episodes, one after the other with executeEpisode or, with args.selfPlayBatchSize,
+        that many at once with BatchedSelfPlay.
+
+        Returns:
+            episodes: iterator over the training examples of every episode
+        """
+        batchSize = self.args.get('selfPlayBatchSize')
+        if not batchSize:
+            for _ in tqdm(range(numEps), desc="Self Play"):
+                self.mcts = self.selfPlayMCTS()  # reset search tree
+                yield self.executeEpisode()
+            return
+
+        selfPlay = BatchedSelfPlay(self.game, self.nnet, self.args, book=self.book)
+        for start in tqdm(range(0, numEps, batchSize), desc="Self Play"):
+            yield from selfPlay.playEpisodes(min(batchSize, numEps - start))
+
+    def selfPlayMCTS(self):
+        """
+        Returns a fresh search tree for self-play, instrumented if args.profileMCTS is set.
+        """
+        metrics = self.metrics if self.args.get('profileMCTS') else None
+        return MCTS(self.game, self.nnet, self.args, metrics=metrics, cache=self.cache, cacheVersion=self.modelVersion,
+                    book=self.book)
+
+    def logCacheStats(self):
+        """
+        Logs the evaluation cache hit rate since the last call and records it in the metrics.
+        """
+        if self.cache is None:
+            return
+        stats = self.cache.stats(reset=True)
+        log.info(f"Evaluation cache: hit rate {stats['hit_rate']:.1%}, {stats['size']} entries")
+        self.metrics.gauge('cache.hit_rate', stats['hit_rate'])
+        self.metrics.gauge('cache.size', stats['size'])
+
+    def exportMetrics(self, iteration):
+        """
+        Writes the metrics to args.metricsFile (if set) in args.metricsFormat ('json' lines by default).
+        """
+        if self.args.get('metricsFile'):
+            self.metrics.export(self.args.metricsFile, self.args.get('metricsFormat', 'json'), iteration=iteration)
+
+    def reanalyseHistory(self):
+        """
+        Refreshes args.reanalysePositions examples of the iterations before the latest one with the accepted
+        network, which self.nnet is between self-play and training.
+        """
+        if self.reanalyser is None:
+            return
+        with self.metrics.timer('coach.reanalyse'):
+            refreshed = self.reanalyser.reanalyse(self.trainExamplesHistory[:-1], self.args.reanalysePositions)
+        self.metrics.count('reanalyse.positions', refreshed)
+
+    def compactExamples(self, examples):
+        """
+        Returns examples aggregated by state if args.dedupExamples is set, else unchanged.
+        """
+        if self.args.get('dedupExamples'):
+            return ReplayBuffer.deduplicate(self.game, examples)
+        return examples
+
+    def prepareTrainExamples(self, iteration):
+        """
+        Trims trainExamplesHistory to the numItersForTrainExamplesHistory latest iterations, backs it up to a file
+        and returns all of its examples as one shuffled list.
+        """
+        if len(self.trainExamplesHistory) > self.args.numItersForTrainExamplesHistory:
+            log.warning(
+                f"Removing the oldest entry in trainExamples. len(trainExamplesHistory) = {len(self.trainExamplesHistory)}")
+            self.trainExamplesHistory.pop(0)
+        # backup history to a file
+        # NB! the examples were collected using the model from the previous iteration, so (i-1)
+        self.saveTrainExamples(iteration - 1)
+
+        # shuffle examples before training
+        trainExamples = []
+        for e in self.trainExamplesHistory:
+            trainExamples.extend(e)
+        trainExamples = self.compactExamples(trainExamples)
+        shuffle(trainExamples)
+        return trainExamples
 
     def getCheckpointFile(self, iteration):
         return 'checkpoint_' + str(iteration) + '.pth.tar'
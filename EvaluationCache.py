@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+
+import numpy as np
+
+
+class EvaluationCache():
+    """
+    Size-bounded LRU cache of network evaluations, shared by the MCTS instances of many episodes (and, through
+    EvaluationCacheManager, of many processes).
+
+    Entries map a state key (game.stringRepresentation of a canonical board) to the evaluation MCTS derives from
+    the network: the valid actions, the masked and renormalized policy over them, and the value. Only entries of the
+    current network version are kept: get and put with another version miss and are ignored respectively, and
+    invalidate(version) switches to a new version and drops everything, so an evaluation of an old network can never
+    be served for a new one.
+
+    All methods hold a lock, so the cache can be shared by threads (TreeParallelMCTS, and the connection threads of
+    EvaluationCacheManager).
+    """
+
+    def __init__(self, maxsize=100000, version=0):
+        self.maxsize = maxsize
+        self.version = version
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, version, s):
+        """
+        Returns:
+            entry: (actions, probs, v) cached for s under version, or None
+        """
+        with self.lock:
+            entry = self.entries.get(s) if version == self.version else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(s)
+            return entry
+
+    def put(self, version, s, entry):
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[s] = entry
+            self.entries.move_to_end(s)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, version):
+        """
+        Drops all entries and only accepts evaluations of the given network version from now on.
+        """
+        with self.lock:
+            self.version = version
+            self.entries.clear()
+
+    def stats(self, reset=False):
+        """
+        Returns:
+            stats: dict with hits, misses, hit_rate, size and version. With reset, the hit and miss counters
+                   start over afterwards.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            stats = {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.,
+                     'size': len(self.entries), 'version': self.version}
+            if reset:
+                self.hits = self.misses = 0
+            return stats
+
+
+def toEntry(ps, valids, v):
+    """
+    Compresses an evaluation (dense masked policy, valid moves, value) into a cache entry.
+    """
+    actions = np.flatnonzero(valids).astype(np.int32)
+    return actions, ps[actions], v
+
+
+def fromEntry(entry, actionSize):
+    """
+    Expands a cache entry back into (ps, valids, v) as returned by MCTS.evaluate.
+    """
+    actions, probs, v = entry
+    ps = np.zeros(actionSize)
+    ps[actions] = probs
+    valids = np.zeros(actionSize, dtype=int)
+    valids[actions] = 1
+    return ps, valids, v
+
+
+class EvaluationCacheManager(BaseManager):
+    """
+    Manager serving one EvaluationCache to several processes:
+
+        manager = EvaluationCacheManager(ctx=mp.get_context('spawn'))
+        manager.start()
+        cache = manager.EvaluationCache(maxsize, version)  # a proxy that can be passed to worker processes
+    """
+
+
+EvaluationCacheManager.register('EvaluationCache', EvaluationCache)
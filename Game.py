@@ -113,6 +113,30 @@ class Game():
         """
         pass
 
+    def getPlyCount(self, board):
+        """
+        Input:
+            board: current board
+
+        Returns:
+            plies: the number of plies played to reach board, or None if the
+                   board does not tell. Used to restrict the opening book to
+                   the opening.
+        """
+        return None
+
+    def getBatchEngine(self):
+        """
+        Returns:
+            engine: an engine stepping many games of this game at once, with
+                    getInitBoards(size) and the batched counterparts of
+                    getNextState, getGameEnded and getCanonicalForm (see
+                    ninemensmorris.NineMensMorrisBatch), or None. Used by
+                    BatchedSelfPlay, which steps the games one by one through
+                    this game without it.
+        """
+        return None
+
 
     def getValidMovesAsTuple(self, board, player):
         pass
@@ -0,0 +1,189 @@
+"""
+Compact binary log of self-play games: the sequence of actions played and the sparse root visit counts of every
+search, from which all positions are reconstructed through game.getNextState. A game takes a few bytes per ply
+instead of the dense policies of its training examples, so whole games can be kept and reprocessed later, e.g.
+to re-derive targets with a newer network or to build an opening book.
+
+A log file is a plain concatenation of records, each one a varint byte length followed by the body:
+
+    version          1 byte
+    result           float64, the game result from the perspective of player 1 (as getGameEnded reports it)
+    plies            varint
+    per ply:         varint action, varint number of visited actions k, then k times
+                     (varint action - previous visited action - 1, varint visit count), actions ascending
+
+Every record is appended with a single write to a file opened in append mode, so several self-play processes
+can log to the same file.
+"""
+import logging
+import struct
+
+import numpy as np
+
+from MCTS import MCTS
+
+log = logging.getLogger(__name__)
+
+VERSION = 1
+RESULT = struct.Struct('<d')
+
+
+def putVarint(out, value):
+    """
+    Appends the unsigned LEB128 encoding of value to the bytearray out.
+    """
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def getVarint(data, offset):
+    """
+    Returns:
+        (value, offset): the varint decoded from data at offset and the offset after it
+    """
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class GameRecord():
+    """
+    One self-play game: actions[i] was played at ply i after a search that visited the actions visits[i][0]
+    visits[i][1] times each (both int arrays, empty if the move was made without search), result is the outcome
+    for player 1.
+    """
+
+    def __init__(self, actions=None, visits=None, result=0):
+        self.actions = actions if actions is not None else []
+        self.visits = visits if visits is not None else []
+        self.result = result
+
+    def add(self, action, counts):
+        """
+        Records the action played and the dense root visit counts (MCTS.getVisitCounts) of the search before it.
+        """
+        counts = np.asarray(counts)
+        visited = np.flatnonzero(counts)
+        self.actions.append(int(action))
+        self.visits.append((visited, counts[visited]))
+
+    def __len__(self):
+        return len(self.actions)
+
+    def encode(self):
+        """
+        Returns:
+            data: the record as bytes, including its length prefix
+        """
+        body = bytearray([VERSION])
+        body += RESULT.pack(self.result)
+        putVarint(body, len(self.actions))
+        for action, (visited, counts) in zip(self.actions, self.visits):
+            putVarint(body, action)
+            putVarint(body, len(visited))
+            previous = -1
+            for a, n in zip(visited.tolist(), counts.tolist()):
+                putVarint(body, a - previous - 1)
+                putVarint(body, n)
+                previous = a
+        data = bytearray()
+        putVarint(data, len(body))
+        return bytes(data + body)
+
+    @classmethod
+    def decode(cls, body):
+        """
+        Returns the record of body (without the length prefix).
+        """
+        if body[0] != VERSION:
+            raise ValueError(f'Unsupported game record version {body[0]}')
+        result, = RESULT.unpack_from(body, 1)
+        plies, offset = getVarint(body, 1 + RESULT.size)
+        actions, visits = [], []
+        for _ in range(plies):
+            action, offset = getVarint(body, offset)
+            k, offset = getVarint(body, offset)
+            visited, counts = np.empty(k, dtype=np.int64), np.empty(k, dtype=np.int64)
+            previous = -1
+            for j in range(k):
+                delta, offset = getVarint(body, offset)
+                counts[j], offset = getVarint(body, offset)
+                previous = visited[j] = previous + delta + 1
+            actions.append(action)
+            visits.append((visited, counts))
+        return cls(actions, visits, result)
+
+    def appendTo(self, path):
+        """
+        Appends the record to the log file at path.
+        """
+        with open(path, 'ab', buffering=0) as f:
+            f.write(self.encode())
+
+    def positions(self, game):
+        """
+        Replays the game from game.getInitBoard through game.getNextState.
+
+        Yields:
+            (board, curPlayer, action, counts) for every ply: the position before the action, the player to move,
+            the action played and the dense root visit counts of its search
+        """
+        board, curPlayer = game.getInitBoard(), 1
+        for action, (visited, visitCounts) in zip(self.actions, self.visits):
+            counts = np.zeros(game.getActionSize(), dtype=np.int64)
+            counts[visited] = visitCounts
+            yield board, curPlayer, action, counts
+            board, curPlayer = game.getNextState(board, curPlayer, action)
+
+    def examples(self, game, tempThreshold):
+        """
+        Returns:
+            trainExamples: the examples (board, pi, v) of the game as Coach.executeEpisode builds them, pi from the
+                           recorded visit counts (one-hot on the action played for moves made without search)
+        """
+        trainExamples = []
+        for episodeStep, (board, curPlayer, action, counts) in enumerate(self.positions(game), 1):
+            canonicalBoard = game.getCanonicalForm(board, curPlayer)
+            if counts.any():
+                pi = MCTS.countsToProbs(counts, int(episodeStep < tempThreshold))
+            else:
+                pi = np.zeros(game.getActionSize())
+                pi[action] = 1
+            for b, p in game.getSymmetries(canonicalBoard, pi):
+                trainExamples.append((b, p, self.result * curPlayer))
+        return trainExamples
+
+
+def readGameRecords(path):
+    """
+    Streams the records of the log file at path. A record cut short (a writer killed while appending) ends the
+    stream with a warning.
+
+    Yields:
+        record: GameRecord
+    """
+    with open(path, 'rb') as f:
+        while True:
+            length = shift = 0
+            while True:
+                byte = f.read(1)
+                if not byte:
+                    if shift:
+                        log.warning(f'{path}: truncated game record length')
+                    return
+                length |= (byte[0] & 0x7f) << shift
+                shift += 7
+                if byte[0] < 0x80:
+                    break
+            body = f.read(length)
+            if len(body) < length:
+                log.warning(f'{path}: truncated game record')
+                return
+            yield GameRecord.decode(body)
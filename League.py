@@ -0,0 +1,377 @@
+"""
+League of checkpoints rated by Elo: every checkpoint_N.pth.tar of a folder joins the league, matches between them
+are played in parallel worker processes and the ratings are refit after every match.
+
+    python League.py --game ninemensmorris --folder temp/ --games 200          # spend 200 games on the league
+    python League.py --game ninemensmorris --folder temp/ --focus checkpoint_12.pth.tar --target-se 30
+
+The second form rates a new checkpoint: only pairs involving it are played, until its rating is known to
++-30 Elo (one standard error).
+
+Ratings are the Bradley-Terry strengths of all results so far (a draw counts as half a win for each side) on the Elo
+scale, fit by minorization-maximization. Every player also has --prior virtual draws against a fixed opponent of
+rating 0, which keeps the ratings of unbeaten or unplayed players finite and centres the league around 0.
+
+Pairs are chosen adaptively, most informative first: the expected information of a game, p * (1 - p) for the
+predicted score p, weighted by the summed rating variances of the two players. New, rarely played checkpoints
+and close opponents are thus preferred over pairs whose outcome is already known. A match is --match-games games
+of MCTS players (temp 0): random openings of --opening-plies plies, each played once with either side starting.
+
+The league is stored as JSON (results and the resulting ratings) after every match, so runs can be interrupted and
+continued later with more checkpoints.
+"""
+import argparse
+import json
+import logging
+import math
+import multiprocessing as mp
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from MCTS import MCTS
+from utils import dotdict
+
+log = logging.getLogger(__name__)
+
+ELO = 400 / math.log(10)  # Elo points per unit of log strength
+
+args = dotdict({
+    'prior': 2,            # Virtual games (as draws) of every player against an opponent of rating 0.
+    'matchGames': 4,       # Games per match, half of them with either side starting.
+    'openingPlies': 4,     # Random plies before the players take over, so that repeated games differ.
+    'numMCTSSims': 25,     # Simulations per move of the players.
+    'cpuct': 1.0,
+    'earlyStop': True,
+})
+
+
+class League():
+    """
+    Results between named players and their ratings.
+
+    results maps a pair (a, b) of names, in sorted order, to [wins of a, wins of b, draws].
+    """
+
+    def __init__(self, prior=args.prior):
+        self.prior = prior
+        self.players = []
+        self.results = {}
+        self.gammas = {}  # name -> Bradley-Terry strength, rating = ELO * log(strength)
+
+    def addPlayer(self, name):
+        if name not in self.gammas:
+            self.players.append(name)
+            self.gammas[name] = 1.0
+
+    def addResult(self, a, b, winsA, winsB, draws):
+        """
+        Records the results of a match between a and b and refits the ratings.
+        """
+        self.addPlayer(a)
+        self.addPlayer(b)
+        if a > b:
+            a, b, winsA, winsB = b, a, winsB, winsA
+        result = self.results.setdefault((a, b), [0, 0, 0])
+        result[0] += winsA
+        result[1] += winsB
+        result[2] += draws
+        self.fit()
+
+    def fit(self, iterations=1000, tolerance=1e-7):
+        """
+        Fits the strengths to all results by minorization-maximization, starting from the current ones (a few
+        iterations suffice after a single new result).
+        """
+        index = {name: i for i, name in enumerate(self.players)}
+        n = len(self.players)
+        score = np.full(n, self.prior / 2)  # wins, draws as halves, including the virtual draws
+        games = np.zeros((n, n))
+        for (a, b), (winsA, winsB, draws) in self.results.items():
+            i, j = index[a], index[b]
+            score[i] += winsA + draws / 2
+            score[j] += winsB + draws / 2
+            games[i, j] += winsA + winsB + draws
+            games[j, i] += winsA + winsB + draws
+
+        gammas = np.array([self.gammas[name] for name in self.players])
+        for _ in range(iterations):
+            denominator = (games / (gammas[:, None] + gammas[None, :])).sum(axis=1) + self.prior / (gammas + 1)
+            updated = score / denominator
+            converged = np.max(np.abs(np.log(updated) - np.log(gammas))) < tolerance
+            gammas = updated
+            if converged:
+                break
+        self.gammas = dict(zip(self.players, gammas.tolist()))
+
+    def rating(self, name):
+        return ELO * math.log(self.gammas[name])
+
+    def expected(self, a, b):
+        """
+        Returns the expected score of a against b.
+        """
+        return self.gammas[a] / (self.gammas[a] + self.gammas[b])
+
+    def games(self, name):
+        return sum(sum(result) for pair, result in self.results.items() if name in pair)
+
+    def stderr(self, name):
+        """
+        Returns the standard error of the rating of name in Elo, from the Fisher information of its games (the
+        ratings of the opponents taken as known).
+        """
+        gamma = self.gammas[name]
+        information = self.prior * gamma / (gamma + 1) ** 2
+        for (a, b), result in self.results.items():
+            if name in (a, b):
+                p = self.expected(a, b)
+                information += sum(result) * p * (1 - p)
+        return ELO / math.sqrt(information)
+
+    def selectPair(self, busy=(), focus=None):
+        """
+        Returns the most informative pair of players to play next, skipping the pairs in busy and, if focus (a
+        collection of names) is given, the pairs without a focus player; None if there is none.
+        """
+        variances = {name: self.stderr(name) ** 2 for name in self.players}
+        best, bestScore = None, -1
+        for i, a in enumerate(self.players):
+            for b in self.players[i + 1:]:
+                pair = (min(a, b), max(a, b))
+                if pair in busy or (focus and a not in focus and b not in focus):
+                    continue
+                p = self.expected(a, b)
+                score = p * (1 - p) * (variances[a] + variances[b])
+                if score > bestScore:
+                    best, bestScore = pair, score
+        return best
+
+    def table(self):
+        """
+        Returns:
+            rows: (name, rating, standard error, games) of every player, strongest first
+        """
+        rows = [(name, self.rating(name), self.stderr(name), self.games(name)) for name in self.players]
+        return sorted(rows, key=lambda row: -row[1])
+
+    def save(self, path):
+        data = {
+            'prior': self.prior,
+            'players': self.players,
+            'results': [[a, b] + result for (a, b), result in sorted(self.results.items())],
+            'ratings': {name: {'elo': rating, 'stderr': stderr, 'games': games}
+                        for name, rating, stderr, games in self.table()},
+        }
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        league = cls(data['prior'])
+        for name in data['players']:
+            league.addPlayer(name)
+        for a, b, winsA, winsB, draws in data['results']:
+            league.results[(a, b)] = [winsA, winsB, draws]
+        league.fit()
+        return league
+
+
+def playGame(game, player1, player2, opening):
+    """
+    Plays the actions of opening, then lets player1 (starting) and player2 move as in Arena.playGame.
+
+    Returns:
+        result: 1 if player1 won, -1 if player2 won, else the draw result of the game
+    """
+    players = [player2, None, player1]
+    board, curPlayer = game.getInitBoard(), 1
+    ply = 0
+    while game.getGameEnded(board, curPlayer) == 0:
+        canonicalBoard = game.getCanonicalForm(board, curPlayer)
+        action = opening[ply] if ply < len(opening) else players[curPlayer + 1](canonicalBoard)
+        board, curPlayer = game.getNextState(board, curPlayer, action)
+        ply += 1
+    return curPlayer * game.getGameEnded(board, curPlayer)
+
+
+def randomOpening(game, plies, rng):
+    """
+    Returns up to plies random valid actions from the initial position (fewer if the game ends before).
+    """
+    board, curPlayer = game.getInitBoard(), 1
+    opening = []
+    while len(opening) < plies and game.getGameEnded(board, curPlayer) == 0:
+        action = int(rng.choice(np.flatnonzero(game.getValidMoves(board, curPlayer))))
+        opening.append(action)
+        board, curPlayer = game.getNextState(board, curPlayer, action)
+    return opening
+
+
+def playMatch(game, playerA, playerB, numGames, openingPlies, rng):
+    """
+    Plays numGames games (rounded down to an even number) between playerA and playerB: every random opening once
+    with either player starting.
+
+    Returns:
+        (winsA, winsB, draws)
+    """
+    winsA = winsB = draws = 0
+    for _ in range(numGames // 2):
+        opening = randomOpening(game, openingPlies, rng)
+        for first, second, sign in ((playerA, playerB, 1), (playerB, playerA, -1)):
+            result = playGame(game, first, second, opening)
+            if abs(result) != 1:
+                draws += 1
+            elif result * sign == 1:
+                winsA += 1
+            else:
+                winsB += 1
+    return winsA, winsB, draws
+
+
+def makeGame(name):
+    if name == 'ninemensmorris':
+        from ninemensmorris.NineMensMorrisGame import NineMensMorrisGame
+        return NineMensMorrisGame()
+    from othello.OthelloGame import OthelloGame
+    return OthelloGame(6 if name == 'othello6' else 8)
+
+
+def makeNNet(name, game):
+    if name == 'ninemensmorris':
+        from ninemensmorris.pytorch.NNet import NNetWrapper
+    else:
+        from othello.pytorch.NNet import NNetWrapper
+    return NNetWrapper(game)
+
+
+_worker = None
+
+
+def initWorker(gameName, folder, matchArgs):
+    global _worker
+    game = makeGame(gameName)
+    _worker = dotdict({'gameName': gameName, 'game': game, 'folder': folder, 'args': matchArgs, 'nnets': {}})
+
+
+def loadNNet(name):
+    """
+    Returns the network of checkpoint name, keeping the networks of the last few matches of the worker loaded.
+    """
+    nnets = _worker.nnets
+    if name not in nnets:
+        if len(nnets) >= 4:
+            nnets.pop(next(iter(nnets)))
+        nnet = makeNNet(_worker.gameName, _worker.game)
+        nnet.load_checkpoint(folder=_worker.folder, filename=name)
+        nnets[name] = nnet
+    return nnets[name]
+
+
+def matchWorker(a, b, seed):
+    """
+    Worker: plays a match between the checkpoints a and b.
+
+    Returns:
+        (a, b, winsA, winsB, draws)
+    """
+    game, matchArgs = _worker.game, _worker.args
+    mctsA = MCTS(game, loadNNet(a), matchArgs)
+    mctsB = MCTS(game, loadNNet(b), matchArgs)
+    result = playMatch(game, lambda x: np.argmax(mctsA.getActionProb(x, temp=0)),
+                       lambda x: np.argmax(mctsB.getActionProb(x, temp=0)),
+                       matchArgs.matchGames, matchArgs.openingPlies, np.random.RandomState(seed))
+    return (a, b) + result
+
+
+def checkpoints(folder):
+    """
+    Returns the checkpoint_N.pth.tar files of folder, ordered by N.
+    """
+    names = [name for name in os.listdir(folder) if re.fullmatch(r'checkpoint_\d+\.pth\.tar', name)]
+    return sorted(names, key=lambda name: int(re.search(r'\d+', name).group()))
+
+
+def runLeague(league, path, gameName, folder, matchArgs, games, workers, focus=None, targetStderr=None, seed=0):
+    """
+    Plays matches chosen by League.selectPair in workers processes until games games are played, or the ratings of
+    the focus players (all players without focus) have a standard error below targetStderr. The league is saved to
+    path after every match.
+    """
+    def converged():
+        names = focus or league.players
+        return targetStderr is not None and all(league.stderr(name) < targetStderr for name in names)
+
+    played = scheduled = 0
+    ctx = mp.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=initWorker,
+                             initargs=(gameName, folder, matchArgs)) as pool:
+        pending = {}  # future -> pair
+        while True:
+            while len(pending) < workers and scheduled < games and not converged():
+                pair = league.selectPair(busy=set(pending.values()), focus=focus)
+                if pair is None:
+                    break
+                pending[pool.submit(matchWorker, *pair, seed + scheduled)] = pair
+                scheduled += matchArgs.matchGames
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                a, b, winsA, winsB, draws = future.result()
+                league.addResult(a, b, winsA, winsB, draws)
+                played += winsA + winsB + draws
+                league.save(path)
+                log.info(f'{a} - {b}: {winsA} / {winsB} ; DRAWS : {draws}, '
+                         f'{league.rating(a):.0f} / {league.rating(b):.0f} Elo')
+    return played
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rate the checkpoints of a folder in a league.')
+    parser.add_argument('--game', default='ninemensmorris', choices=['ninemensmorris', 'othello6', 'othello8'])
+    parser.add_argument('--folder', required=True, help='folder of the checkpoint_N.pth.tar files')
+    parser.add_argument('--league', help='league file (default: FOLDER/league.json)')
+    parser.add_argument('--games', type=int, default=100, help='games to play at most')
+    parser.add_argument('--focus', nargs='*', help='only play pairs involving these checkpoints')
+    parser.add_argument('--target-se', type=float, help='stop once the (focus) ratings have this standard error')
+    parser.add_argument('--match-games', type=int, default=args.matchGames, help='games per match')
+    parser.add_argument('--opening-plies', type=int, default=args.openingPlies, help='random plies per opening')
+    parser.add_argument('--sims', type=int, default=args.numMCTSSims, help='MCTS simulations per move')
+    parser.add_argument('--prior', type=float, default=args.prior, help='virtual draws of every player')
+    parser.add_argument('--workers', type=int, default=mp.cpu_count(), help='parallel matches')
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args()
+
+    path = options.league or os.path.join(options.folder, 'league.json')
+    league = League.load(path) if os.path.exists(path) else League(options.prior)
+    for name in checkpoints(options.folder):
+        league.addPlayer(name)
+    for name in options.focus or []:
+        if name not in league.gammas:
+            parser.error(f'unknown checkpoint {name}')
+    league.fit()
+
+    matchArgs = dotdict(dict(args, matchGames=options.match_games, openingPlies=options.opening_plies,
+                             numMCTSSims=options.sims))
+    played = runLeague(league, path, options.game, options.folder, matchArgs, options.games, options.workers,
+                       options.focus, options.target_se, options.seed)
+    league.save(path)
+
+    print(f'{played} games played')
+    for name, rating, stderr, games in league.table():
+        print(f'{name:30} {rating:7.0f} +- {stderr:4.0f}  ({games} games)')
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,8 +1,12 @@
 import logging
 import math
+import time
 
 import numpy as np
 
+from EvaluationCache import fromEntry, toEntry
+from Metrics import TimedGame, TimedNNet
+
 EPS = 1e-8
 
 log = logging.getLogger(__name__)
@@ -11,9 +15,28 @@ log = logging.getLogger(__name__)
 class MCTS():
     """
     This class handles the MCTS tree.
+
+    If metrics (a Metrics.Metrics) is given, the search is instrumented: network calls and the time spent in
+    inference, the rules engine and hashing (stringRepresentation), Ps/Es cache hits, tree size and simulations/sec
+    are recorded under 'mcts.*'. Without metrics the search runs uninstrumented.
+
+    If cache (an EvaluationCache.EvaluationCache, or a proxy to one) is given,
+    leaf evaluations are looked up in and added to it under cacheVersion, which
+    must identify the weights of nnet.
+
+    If book (an OpeningBook.OpeningBook) is given, positions in the book are
+    answered from it, mixed with a search of proportionally fewer simulations
+    (see getActionProb).
     """
 
-    def __init__(self, game, nnet, args):
+    def __init__(self, game, nnet, args, metrics=None, cache=None, cacheVersion=0, book=None):
+        self.metrics = metrics
+        self.book = book
+        self.cache = cache
+        self.cacheVersion = cacheVersion
+        if metrics is not None:
+            game = TimedGame(game, metrics)
+            nnet = TimedNNet(nnet, metrics)
         self.game = game
         self.nnet = nnet
         self.args = args
@@ -24,22 +47,159 @@ class MCTS():
 
         self.Es = {}  # stores game.getGameEnded ended for board s
         self.Vs = {}  # stores game.getValidMoves for board s
+        self.As = {}  # stores the indices of the valid moves for board s
 
     def getActionProb(self, canonicalBoard, temp=1):
         """
         This function performs numMCTSSims simulations of MCTS starting from
         canonicalBoard.
 
+        The search stops earlier if
+        - there is only one valid move (args.instantForcedMoves, on by default):
+          it is returned without any simulation,
+        - the args.timeBudget seconds for the move are used up,
+        - temp is 0, args.earlyStop is set and the most visited action can no
+          longer be overtaken in the remaining simulations.
+        Budget and early stop are checked every args.searchCheckInterval
+        simulations.
+
+        For positions in the opening book, the policy is
+        bookMix * book policy + (1 - bookMix) * search policy, where the search
+        only runs (1 - bookMix) * numMCTSSims simulations. args.bookMix defaults
+        to 1, i.e. book moves are played without any search.
+
         Returns:
             probs: a policy vector where the probability of the ith action is
                    proportional to Nsa[(s,a)]**(1./temp)
         """
-        for i in range(self.args.numMCTSSims):
+        start = time.perf_counter()
+        probs = self.getShortcutProb(canonicalBoard, temp)
+        if probs is not None:
+            return probs
+
+        numSims, stop = self.runSimulations(canonicalBoard, temp, start)
+        if self.metrics is not None:
+            elapsed = time.perf_counter() - start
+            self.metrics.count('mcts.simulations', numSims)
+            self.metrics.add_time('mcts.search', elapsed)
+            self.metrics.gauge('mcts.simulations_per_sec', numSims / max(elapsed, EPS))
+            self.metrics.gauge('mcts.tree_size', len(self.Ns))
+            if stop == 'early':
+                self.metrics.count('mcts.early_stops')
+            elif stop == 'budget':
+                self.metrics.count('mcts.budget_stops')
+
+        return self.countsToProbs(self.getVisitCounts(canonicalBoard), temp)
+
+    def getShortcutProb(self, canonicalBoard, temp=1):
+        """
+        Returns:
+            probs: the policy of getActionProb for a forced move or a position
+                   in the opening book, or None if canonicalBoard needs a
+                   regular search
+        """
+        if self.args.get('instantForcedMoves', True):
+            valids = self.game.getValidMoves(canonicalBoard, 1)
+            if np.count_nonzero(valids) == 1:
+                if self.metrics is not None:
+                    self.metrics.count('mcts.forced_moves')
+                probs = [0] * len(valids)
+                probs[int(np.flatnonzero(valids)[0])] = 1
+                return probs
+
+        if self.book is not None:
+            ply = self.game.getPlyCount(canonicalBoard) if self.book.plies is not None else None
+            bookPi = self.book.lookup(self.game.stringRepresentation(canonicalBoard), ply)
+            if bookPi is not None:
+                if self.metrics is not None:
+                    self.metrics.count('mcts.book_hits')
+                return self.countsToProbs(self.mixBook(canonicalBoard, bookPi), temp)
+        return None
+
+    def mixBook(self, canonicalBoard, bookPi):
+        """
+        Returns:
+            pi: bookPi mixed with the visit distribution of a search shortened by args.bookMix
+        """
+        mix = self.args.get('bookMix', 1.0)
+        numSims = int(round(self.args.numMCTSSims * (1 - mix)))
+        if numSims == 0:
+            return bookPi
+        self.simulate(canonicalBoard, numSims)
+        counts = np.array(self.getVisitCounts(canonicalBoard), dtype=np.float64)
+        if counts.sum() == 0:
+            return bookPi
+        return mix * bookPi + (1 - mix) * counts / counts.sum()
+
+    def runSimulations(self, canonicalBoard, temp, start):
+        """
+        Runs up to numMCTSSims simulations from canonicalBoard, honouring the
+        time budget (counted from start) and the early stop of getActionProb.
+
+        Returns:
+            numSims: the number of simulations that were run
+            stop: why the search stopped before numMCTSSims simulations, 'budget'
+                  or 'early', or None if it ran them all
+        """
+        total = self.args.numMCTSSims
+        budget = self.args.get('timeBudget')
+        earlyStop = temp == 0 and self.args.get('earlyStop', False)
+        if budget is None and not earlyStop:
+            self.simulate(canonicalBoard, total)
+            return total, None
+
+        interval = self.args.get('searchCheckInterval', 10)
+        done = 0
+        while done < total:
+            numSims = min(interval, total - done)
+            self.simulate(canonicalBoard, numSims)
+            done += numSims
+            if done == total:
+                break
+            if budget is not None and time.perf_counter() - start >= budget:
+                return done, 'budget'
+            if earlyStop:
+                best, second = np.sort(self.getVisitCounts(canonicalBoard))[:-3:-1]
+                if best - second > total - done:
+                    return done, 'early'
+        return done, None
+
+    def simulate(self, canonicalBoard, numSims):
+        """
+        Runs numSims simulations from canonicalBoard.
+        """
+        for i in range(numSims):
             self.search(canonicalBoard)
 
+    def getVisitCounts(self, canonicalBoard):
+        """
+        Returns:
+            counts: list with the number of visits Nsa[(s,a)] of every action a at canonicalBoard
+        """
         s = self.game.stringRepresentation(canonicalBoard)
-        counts = [self.Nsa[(s, a)] if (s, a) in self.Nsa else 0 for a in range(self.game.getActionSize())]
+        return [self.Nsa[(s, a)] if (s, a) in self.Nsa else 0 for a in range(self.game.getActionSize())]
 
+    def close(self):
+        """
+        Releases the resources of the search. The sequential search holds none; the parallel searches stop their
+        workers or threads.
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def countsToProbs(counts, temp):
+        """
+        Returns:
+            probs: a policy vector where the probability of the ith action is
+                   proportional to counts[i]**(1./temp), or the argmax (random
+                   among ties) if temp is 0
+        """
         if temp == 0:
             bestAs = np.array(np.argwhere(counts == np.max(counts))).flatten()
             bestA = np.random.choice(bestAs)
@@ -54,9 +214,9 @@ class MCTS():
 
     def search(self, canonicalBoard):
         """
-        This function performs one iteration of MCTS. It is recursively called
-        till a leaf node is found. The action chosen at each node is one that
-        has the maximum upper confidence bound as in the paper.
+        This function performs one iteration of MCTS. It descends from
+        canonicalBoard till a leaf node is found. The action chosen at each
+        node is one that has the maximum upper confidence bound as in the paper.
 
         Once a leaf node is found, the neural network is called to return an
         initial policy P and a value v for the state. This value is propagated
@@ -64,73 +224,140 @@ class MCTS():
         outcome is propagated up the search path. The values of Ns, Nsa, Qsa are
         updated.
 
-        NOTE: the return values are the negative of the value of the current
-        state. This is done since v is in [-1,1] and if v is the value of a
-        state for the current player, then its value is -v for the other player.
+        The descent is a loop rather than a recursion: the visited (s, a) edges
+        are kept on a path and the value is backed up along it in one pass,
+        flipping its sign at every ply, since v is in [-1,1] and if v is the
+        value of a state for the current player, then its value is -v for the
+        other player. This avoids a Python frame per ply and the recursion limit
+        on long games.
 
         Returns:
             v: the negative of the value of the current canonicalBoard
         """
+        path = []  # (s, a) edges from canonicalBoard down to the leaf
 
-        s = self.game.stringRepresentation(canonicalBoard)
+        while True:
+            s = self.game.stringRepresentation(canonicalBoard)
 
-        if s not in self.Es:
-            self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
-        if self.Es[s] != 0:
-            # terminal node
-            return -self.Es[s]
+            if s not in self.Es:
+                self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
+            elif self.metrics is not None:
+                self.metrics.count('mcts.es_hits')
+            if self.Es[s] != 0:
+                # terminal node
+                v = -self.Es[s]
+                break
 
-        if s not in self.Ps:
-            # leaf node
-            self.Ps[s], v = self.nnet.predict(canonicalBoard)
-            valids = self.game.getValidMoves(canonicalBoard, 1)
-            self.Ps[s] = self.Ps[s] * valids  # masking invalid moves
-            sum_Ps_s = np.sum(self.Ps[s])
-            if sum_Ps_s > 0:
-                self.Ps[s] /= sum_Ps_s  # renormalize
-            else:
-                # if all valid moves were masked make all valid moves equally probable
+            if s not in self.Ps:
+                # leaf node
+                v = -self.expand(canonicalBoard, s)
+                break
 
-                # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
-                # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
-                log.error("All valid moves were masked, doing a workaround.")
-                self.Ps[s] = self.Ps[s] + valids
-                self.Ps[s] /= np.sum(self.Ps[s])
+            if self.metrics is not None:
+                self.metrics.count('mcts.ps_hits')
+            a = self.selectAction(s)
+            path.append((s, a))
+            next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
+            canonicalBoard = self.game.getCanonicalForm(next_s, next_player)
 
-            self.Vs[s] = valids
-            self.Ns[s] = 0
-            return -v
+        return self.backup(path, v)
 
-        valids = self.Vs[s]
-        cur_best = -float('inf')
-        best_act = -1
+    def backup(self, path, v):
+        """
+        Backs up v, the value of the leaf for the player who moved into it, along the (s, a) edges of path.
 
-        # pick the action with the highest upper confidence bound
-        for a in range(self.game.getActionSize()):
-            if valids[a]:
-                if (s, a) in self.Qsa:
-                    u = self.Qsa[(s, a)] + self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s]) / (
-                            1 + self.Nsa[(s, a)])
-                else:
-                    u = self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s] + EPS)  # Q = 0 ?
+        Returns:
+            v: the negative of the value of the first state of path
+        """
+        for s, a in reversed(path):
+            if (s, a) in self.Qsa:
+                self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
+                self.Nsa[(s, a)] += 1
+
+            else:
+                self.Qsa[(s, a)] = v
+                self.Nsa[(s, a)] = 1
+
+            self.Ns[s] += 1
+            v = -v
+        return v
+
+    def expand(self, canonicalBoard, s):
+        """
+        Evaluates the leaf s with the neural network and stores its masked
+        policy and valid moves.
+
+        Returns:
+            v: the value of canonicalBoard for the player to move
+        """
+        self.Ps[s], self.Vs[s], v = self.evaluate(canonicalBoard, s)
+        self.As[s] = np.flatnonzero(self.Vs[s]).tolist()
+        self.Ns[s] = 0
+        return v
 
-                if u > cur_best:
-                    cur_best = u
-                    best_act = a
+    def evaluate(self, canonicalBoard, s):
+        """
+        Calls the neural network on canonicalBoard (with key s) and masks its
+        policy to the valid moves, or takes both from the evaluation cache.
 
-        a = best_act
-        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
-        next_s = self.game.getCanonicalForm(next_s, next_player)
+        Returns:
+            ps: the renormalized policy over the valid moves
+            valids: game.getValidMoves of canonicalBoard
+            v: the value of canonicalBoard for the player to move
+        """
+        if self.cache is not None:
+            entry = self.cache.get(self.cacheVersion, s)
+            if entry is not None:
+                return fromEntry(entry, self.game.getActionSize())
 
-        v = self.search(next_s)
+        ps, v = self.nnet.predict(canonicalBoard)
+        valids = self.game.getValidMoves(canonicalBoard, 1)
+        ps = self.maskPolicy(ps, valids)
 
-        if (s, a) in self.Qsa:
-            self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
-            self.Nsa[(s, a)] += 1
+        if self.cache is not None:
+            self.cache.put(self.cacheVersion, s, toEntry(ps, valids, v))
+        return ps, valids, v
 
+    @staticmethod
+    def maskPolicy(ps, valids):
+        """
+        Returns:
+            ps: the network policy ps masked to the valid moves and renormalized
+        """
+        ps = ps * valids  # masking invalid moves
+        sum_Ps_s = np.sum(ps)
+        if sum_Ps_s > 0:
+            ps /= sum_Ps_s  # renormalize
         else:
-            self.Qsa[(s, a)] = v
-            self.Nsa[(s, a)] = 1
+            # if all valid moves were masked make all valid moves equally probable
+
+            # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
+            # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
+            log.error("All valid moves were masked, doing a workaround.")
+            ps = ps + valids
+            ps /= np.sum(ps)
+        return ps
+
+    def selectAction(self, s):
+        """
+        Returns the valid action of the expanded node s with the highest upper
+        confidence bound (the first one on ties).
+        """
+        cur_best = -float('inf')
+        best_act = -1
+        Ps = self.Ps[s]
+        sqrt_Ns = math.sqrt(self.Ns[s])
+        sqrt_Ns_eps = math.sqrt(self.Ns[s] + EPS)
+
+        # pick the action with the highest upper confidence bound
+        for a in self.As[s]:
+            if (s, a) in self.Qsa:
+                u = self.Qsa[(s, a)] + self.args.cpuct * Ps[a] * sqrt_Ns / (1 + self.Nsa[(s, a)])
+            else:
+                u = self.args.cpuct * Ps[a] * sqrt_Ns_eps  # Q = 0 ?
+
+            if u > cur_best:
+                cur_best = u
+                best_act = a
 
-        self.Ns[s] += 1
-        return -v
+        return best_act
@@ -0,0 +1,168 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+class Metrics():
+    """
+    Lightweight in-process counters, timers and gauges.
+
+    Counters accumulate event counts (count), timers accumulate wall time and the number of timed sections
+    (timer / add_time), gauges hold the last observed value (gauge). Everything is a plain dict update, so the
+    layer is cheap enough for the MCTS hot path. Snapshots can be exported as JSON lines or in the Prometheus text
+    exposition format.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}  # name -> [total seconds, number of sections]
+        self.gauges = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [seconds, 1]
+        else:
+            timer[0] += seconds
+            timer[1] += 1
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def reset(self):
+        self.counters.clear()
+        self.timers.clear()
+        self.gauges.clear()
+
+    def to_dict(self):
+        """
+        Returns:
+            metrics: {'counters': {name: count}, 'timers': {name: {'seconds': s, 'count': n}},
+                      'gauges': {name: value}}
+        """
+        return {
+            'counters': dict(self.counters),
+            'timers': {name: {'seconds': s, 'count': n} for name, (s, n) in self.timers.items()},
+            'gauges': dict(self.gauges),
+        }
+
+    def to_json_line(self, **labels):
+        """
+        Returns the metrics as one line of JSON, with the given labels (e.g. iteration=3) and a timestamp added.
+        """
+        record = dict(labels, time=time.time())
+        record.update(self.to_dict())
+        return json.dumps(record) + '\n'
+
+    def to_prometheus(self, prefix='alphazero', **labels):
+        """
+        Returns the metrics in the Prometheus text exposition format. Counters become a <name> counter (sampled as
+        <name>_total), timers a <name>_seconds summary without quantiles (<name>_seconds_sum and
+        <name>_seconds_count) and gauges a <name> gauge.
+        """
+        label = ','.join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+        label = '{' + label + '}' if label else ''
+        lines = []
+
+        def family(name, kind, samples):
+            name = f'{prefix}_{name}'.replace('.', '_').replace('-', '_')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, value in samples:
+                lines.append(f'{name}{suffix}{label} {value}')
+
+        for name, value in sorted(self.counters.items()):
+            family(name, 'counter', [('_total', value)])
+        for name, (seconds, n) in sorted(self.timers.items()):
+            family(name + '_seconds', 'summary', [('_sum', seconds), ('_count', n)])
+        for name, value in sorted(self.gauges.items()):
+            family(name, 'gauge', [('', value)])
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path, format='json', **labels):
+        """
+        Writes the metrics to path: 'json' appends one JSON line, 'prometheus' replaces the file (suitable for the
+        node_exporter textfile collector).
+        """
+        if format == 'json':
+            with open(path, 'a') as f:
+                f.write(self.to_json_line(**labels))
+        elif format == 'prometheus':
+            with open(path + '.tmp', 'w') as f:
+                f.write(self.to_prometheus(**labels))
+            os.replace(path + '.tmp', path)
+        else:
+            raise ValueError(f'Unknown metrics format "{format}"')
+
+
+def escape_label(value):
+    """
+    Returns value as a Prometheus label value: backslashes, double quotes and newlines escaped.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class TimedGame():
+    """
+    Proxy around a Game that adds the time of every call to a timer of metrics: stringRepresentation to 'mcts.hash',
+    all other rules to 'mcts.rules'. Used by MCTS when it is given a Metrics instance.
+    """
+
+    HASH_METHODS = ('stringRepresentation',)
+
+    def __init__(self, game, metrics):
+        self._game = game
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attr = getattr(self._game, name)
+        if not callable(attr):
+            return attr
+        timer = 'mcts.hash' if name in self.HASH_METHODS else 'mcts.rules'
+        metrics = self._metrics
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                metrics.add_time(timer, time.perf_counter() - start)
+
+        setattr(self, name, timed)  # later calls skip __getattr__
+        return timed
+
+
+class TimedNNet():
+    """
+    Proxy around a NeuralNet that counts and times predict calls ('mcts.nnet_calls', 'mcts.inference').
+    """
+
+    def __init__(self, nnet, metrics):
+        self._nnet = nnet
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._nnet, name)
+
+    def predict(self, board):
+        start = time.perf_counter()
+        try:
+            return self._nnet.predict(board)
+        finally:
+            self._metrics.add_time('mcts.inference', time.perf_counter() - start)
+            self._metrics.count('mcts.nnet_calls')
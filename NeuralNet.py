@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class NeuralNet():
     """
     This class specifies the base NeuralNet class. To define your own neural
@@ -21,6 +24,10 @@ class NeuralNet():
                       (board, pi, v). pi is the MCTS informed policy vector for
                       the given board, and v is its value. The examples has
                       board in its canonical form.
+
+        Returns:
+            stats: optional dict of training statistics (e.g. examples_per_sec),
+                   which Coach records as 'nnet.*' gauges
         """
         pass
 
@@ -36,10 +43,81 @@ class NeuralNet():
         """
         pass
 
+    def predict_batch(self, boards):
+        """
+        Input:
+            boards: array of canonical boards, stacked along the first axis.
+
+        Returns:
+            pis: array of the policy vectors of the boards
+            vs: array of their values
+
+        Networks able to evaluate many positions in one forward pass should
+        override this; the default calls predict on every board.
+        """
+        pis, vs = zip(*(self.predict(board) for board in boards))
+        return np.array(pis), np.array(vs).reshape(-1)
+
+    def snapshot(self):
+        """
+        Returns:
+            snapshot: an in-memory copy of the network parameters (and any
+                      optimizer state) that is unaffected by later training
+                      and can be passed to restore() of this or another
+                      instance of the same class. Used by Coach to clone the
+                      competitor and to roll back rejected models without
+                      going through the disk.
+        """
+        pass
+
+    def restore(self, snapshot):
+        """
+        Loads the parameters captured by snapshot() into this network.
+        """
+        pass
+
+    def share_weights(self, readers):
+        """
+        Publishes the current parameters once into shared memory for the
+        given number of worker processes.
+
+        Returns:
+            shared: a picklable handle to pass to the workers, or None if
+                    this network does not support shared weights (workers
+                    then load checkpoint files instead).
+        """
+        return None
+
+    def publish_weights(self, shared, snapshot, wait=None):
+        """
+        Hot-swaps the weights behind shared to the given snapshot() of this
+        network, e.g. when Coach accepts a new model. wait is called while
+        the workers still bound to the weights being replaced are waited
+        for (see SharedWeights.publish).
+        """
+        pass
+
+    def attach_weights(self, shared, reader):
+        """
+        Called in worker number reader (0 <= reader < readers) to bind this
+        network read-only to the weights behind shared.
+        """
+        pass
+
+    def refresh_weights(self):
+        """
+        Switches an attached network to the most recently published weights.
+
+        Returns:
+            swapped: True if newer weights were bound
+        """
+        return False
+
     def save_checkpoint(self, folder, filename):
         """
         Saves the current neural network (with its parameters) in
-        folder/filename
+        folder/filename. The file should be replaced atomically, so that
+        concurrent readers never see a partially written checkpoint.
         """
         pass
 
@@ -0,0 +1,214 @@
+"""
+Opening book: search policies of frequent early positions, aggregated offline so that MCTS can skip or shorten the
+search there.
+
+    python OpeningBook.py --game ninemensmorris --examples temp/checkpoint_5.pth.tar.examples --output book.pkl
+    python OpeningBook.py --game ninemensmorris --records temp/games.rec --plies 8 --output book.pkl
+    python OpeningBook.py --game ninemensmorris --search temp/best.pth.tar --plies 4 --output book.pkl
+
+The first form aggregates the policies stored in saved .examples files, the second the visit counts of logged
+self-play games (see GameRecord), the third runs dedicated deep searches with a trained network. Every form covers
+the first --plies plies of the game only (4 by default), and MCTS consults the book there only.
+"""
+import argparse
+import logging
+import os
+from pickle import Pickler, Unpickler
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class OpeningBook():
+    """
+    Maps the state key (game.stringRepresentation of a canonical board) of early positions to the average of the
+    search policies observed there, stored sparsely as (actions, probs, count).
+
+    The book covers the positions before ply plies (game.getPlyCount): later positions, and those whose ply the
+    board does not tell, are neither added by the builders below nor looked up, even if they recur often. Books
+    without plies (saved before the limit was recorded) are looked up at every position.
+    """
+
+    def __init__(self, actionSize, plies=None):
+        self.actionSize = actionSize
+        self.plies = plies
+        self.sums = {}  # s -> dense sum of the added policies, only while building
+        self.entries = {}  # s -> (actions, probs, count)
+
+    def add(self, s, pi, weight=1):
+        """
+        Adds one observed policy pi of state s.
+        """
+        pi = np.asarray(pi, dtype=np.float64) * weight
+        if s in self.sums:
+            self.sums[s][0] += pi
+            self.sums[s][1] += weight
+        else:
+            self.sums[s] = [pi, weight]
+
+    def finalize(self, minCount=1):
+        """
+        Turns the added policies into book entries, keeping only states seen at least minCount times.
+        """
+        for s, (total, count) in self.sums.items():
+            if count < minCount or total.sum() <= 0:
+                continue
+            actions = np.flatnonzero(total).astype(np.int32)
+            self.entries[s] = (actions, total[actions] / total.sum(), count)
+        self.sums = {}
+        log.info(f'Opening book has {len(self.entries)} positions')
+
+    def covers(self, ply):
+        """
+        Returns:
+            covered: whether positions at ply (game.getPlyCount, None if unknown) belong to the book
+        """
+        return self.plies is None or (ply is not None and ply < self.plies)
+
+    def lookup(self, s, ply=None):
+        """
+        Returns:
+            pi: the book policy of state s at ply as a dense vector, or None if s is not in the book
+        """
+        if not self.covers(ply):
+            return None
+        entry = self.entries.get(s)
+        if entry is None:
+            return None
+        actions, probs, _ = entry
+        pi = np.zeros(self.actionSize)
+        pi[actions] = probs
+        return pi
+
+    def __len__(self):
+        return len(self.entries)
+
+    def save(self, path):
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(path, "wb+") as f:
+            Pickler(f).dump((self.actionSize, self.entries, self.plies))
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f'No opening book in path "{path}"')
+        with open(path, "rb") as f:
+            actionSize, entries, *plies = Unpickler(f).load()
+        book = cls(actionSize, *plies)
+        book.entries = entries
+        return book
+
+    @classmethod
+    def fromExamples(cls, game, paths, plies, minCount=2):
+        """
+        Builds a book from saved .examples files (Coach.saveTrainExamples). States before ply plies that occur at
+        least minCount times across all files are the repetitive opening positions; their policy is the average of
+        the stored MCTS policies.
+        """
+        book = cls(game.getActionSize(), plies)
+        for path in paths:
+            with open(path, "rb") as f:
+                history = Unpickler(f).load()
+            for iterationExamples in history:
+                for example in iterationExamples:
+                    if not book.covers(game.getPlyCount(example[0])):
+                        continue
+                    # examples aggregated by ReplayBuffer carry their count as a fourth element
+                    weight = example[3] if len(example) > 3 else 1
+                    book.add(game.stringRepresentation(example[0]), example[1], weight)
+        book.finalize(minCount)
+        return book
+
+    @classmethod
+    def fromGameRecords(cls, game, paths, plies, minCount=2):
+        """
+        Builds a book from game record logs (GameRecord). The games are replayed over their first plies plies; the
+        policy of a state is the average of the normalized root visit counts recorded there, and states that occur
+        at least minCount times across all games are kept. Moves made without search are skipped.
+        """
+        from GameRecord import readGameRecords
+
+        book = cls(game.getActionSize(), plies)
+        for path in paths:
+            for record in readGameRecords(path):
+                for ply, (board, curPlayer, _, counts) in enumerate(record.positions(game)):
+                    if ply >= plies:
+                        break
+                    if counts.any():
+                        canonicalBoard = game.getCanonicalForm(board, curPlayer)
+                        book.add(game.stringRepresentation(canonicalBoard), counts / counts.sum())
+        book.finalize(minCount)
+        return book
+
+    @classmethod
+    def fromSearch(cls, game, nnet, args, plies, width=3):
+        """
+        Builds a book by dedicated searches: every position reached within plies plies from the initial position
+        by one of the width most visited moves is searched with args.numMCTSSims simulations (typically far more
+        than during self-play).
+        """
+        from MCTS import MCTS
+
+        book = cls(game.getActionSize(), plies)
+        frontier = [(game.getInitBoard(), 1)]
+        for ply in range(plies):
+            nextFrontier = []
+            for board, player in frontier:
+                canonicalBoard = game.getCanonicalForm(board, player)
+                s = game.stringRepresentation(canonicalBoard)
+                if s in book.sums or game.getGameEnded(board, player) != 0:
+                    continue
+                pi = MCTS(game, nnet, args).getActionProb(canonicalBoard, temp=1)
+                book.add(s, pi, weight=args.numMCTSSims)
+                for a in np.argsort(pi)[::-1][:width]:
+                    if pi[a] > 0:
+                        nextFrontier.append(game.getNextState(board, player, a))
+            log.info(f'Ply {ply}: searched {len(frontier)} positions')
+            frontier = nextFrontier
+        book.finalize()
+        return book
+
+
+def main():
+    from utils import dotdict
+
+    parser = argparse.ArgumentParser(description='Build an opening book.')
+    parser.add_argument('--game', default='ninemensmorris', choices=['ninemensmorris', 'othello6', 'othello8'])
+    parser.add_argument('--examples', nargs='*', default=[], help='.examples files to aggregate')
+    parser.add_argument('--records', nargs='*', default=[], help='game record logs to aggregate')
+    parser.add_argument('--min-count', type=int, default=2,
+                        help='minimum occurrences of a state in the examples or records')
+    parser.add_argument('--search', help='checkpoint file of the network for dedicated searches')
+    parser.add_argument('--plies', type=int, default=4, help='plies covered by the book')
+    parser.add_argument('--width', type=int, default=3, help='moves expanded per position by dedicated searches')
+    parser.add_argument('--sims', type=int, default=800, help='simulations per dedicated search')
+    parser.add_argument('--output', required=True)
+    options = parser.parse_args()
+
+    if options.game == 'ninemensmorris':
+        from ninemensmorris.NineMensMorrisGame import NineMensMorrisGame
+        from ninemensmorris.pytorch.NNet import NNetWrapper
+        game = NineMensMorrisGame()
+    else:
+        from othello.OthelloGame import OthelloGame
+        from othello.pytorch.NNet import NNetWrapper
+        game = OthelloGame(6 if options.game == 'othello6' else 8)
+
+    if options.search:
+        nnet = NNetWrapper(game)
+        nnet.load_checkpoint(*os.path.split(options.search))
+        args = dotdict({'numMCTSSims': options.sims, 'cpuct': 1.0})
+        book = OpeningBook.fromSearch(game, nnet, args, options.plies, options.width)
+    elif options.records:
+        book = OpeningBook.fromGameRecords(game, options.records, options.plies, options.min_count)
+    else:
+        book = OpeningBook.fromExamples(game, options.examples, options.plies, options.min_count)
+    book.save(options.output)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,234 @@
+import logging
+import math
+import multiprocessing as mp
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from MCTS import MCTS, EPS
+
+log = logging.getLogger(__name__)
+
+
+def rootSearchWorker(game, nnetClass, snapshot, args, noise, seed, conn):
+    """
+    Root-parallel search process. Keeps its own tree across moves and answers every (canonicalBoard, numSims)
+    received on conn with the sparse visit counts (actions, counts) of canonicalBoard after numSims more
+    simulations. A None message stops it.
+
+    If noise is set, the prior of every newly expanded root is mixed with Dirichlet noise
+    (args.rootDirichletAlpha, args.rootNoiseEpsilon) so that the trees of the workers explore differently.
+    """
+    np.random.seed(seed)
+    nnet = nnetClass(game)
+    nnet.restore(snapshot)
+    mcts = MCTS(game, nnet, args)
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            return
+        canonicalBoard, numSims = message
+
+        s = game.stringRepresentation(canonicalBoard)
+        if noise and s not in mcts.Ps and numSims > 0:
+            mcts.search(canonicalBoard)  # expands the root
+            numSims -= 1
+            if s in mcts.Ps:
+                actions = mcts.As[s]
+                eta = np.random.dirichlet([args.get('rootDirichletAlpha', 0.3)] * len(actions))
+                epsilon = args.get('rootNoiseEpsilon', 0.25)
+                mcts.Ps[s][actions] = (1 - epsilon) * mcts.Ps[s][actions] + epsilon * eta
+        mcts.simulate(canonicalBoard, numSims)
+
+        counts = np.array(mcts.getVisitCounts(canonicalBoard))
+        actions = np.flatnonzero(counts)
+        conn.send((actions, counts[actions]))
+
+
+class RootParallelMCTS(MCTS):
+    """
+    Root parallelism: args.numSearchWorkers processes each grow an independent tree from the same root and their
+    root visit counts are summed. Every worker runs its share of numMCTSSims, so one decision takes roughly
+    1/numSearchWorkers of the wall time of MCTS on a multi-core machine.
+
+    The workers receive a snapshot of nnet when they are started; call close() when done (or use the instance as
+    a context manager) to stop them. Worker 0 searches with the plain prior, the others add root Dirichlet noise to
+    diversify their trees.
+    """
+
+    def __init__(self, game, nnet, args, **kwargs):
+        super().__init__(game, nnet, args, **kwargs)
+        self.numWorkers = args.get('numSearchWorkers', mp.cpu_count())
+        self.counts = {}  # merged root visit counts of the last searched boards
+
+        ctx = mp.get_context('spawn')
+        snapshot = nnet.snapshot()
+        self.conns = []
+        self.workers = []
+        for i in range(self.numWorkers):
+            conn, workerConn = ctx.Pipe()
+            worker = ctx.Process(target=rootSearchWorker, daemon=True,
+                                 args=(game, nnet.__class__, snapshot, args, i > 0, np.random.randint(2 ** 31),
+                                       workerConn))
+            worker.start()
+            self.conns.append(conn)
+            self.workers.append(worker)
+
+    def simulate(self, canonicalBoard, numSims):
+        shares = [numSims // self.numWorkers + (i < numSims % self.numWorkers) for i in range(self.numWorkers)]
+        for conn, share in zip(self.conns, shares):
+            conn.send((canonicalBoard, share))
+
+        counts = np.zeros(self.game.getActionSize(), dtype=np.int64)
+        for conn in self.conns:
+            actions, actionCounts = conn.recv()
+            counts[actions] += actionCounts
+        self.counts[self.game.stringRepresentation(canonicalBoard)] = counts.tolist()
+
+    def getVisitCounts(self, canonicalBoard):
+        s = self.game.stringRepresentation(canonicalBoard)
+        return self.counts.get(s, [0] * self.game.getActionSize())
+
+    def close(self):
+        for conn in self.conns:
+            conn.send(None)
+        for worker in self.workers:
+            worker.join(timeout=10)
+        self.conns, self.workers = [], []
+
+
+class TreeParallelMCTS(MCTS):
+    """
+    Tree parallelism: args.numSearchThreads threads run the numMCTSSims simulations on one shared tree.
+
+    A thread descending through an edge adds args.virtualLoss virtual visits with a loss to it until its value is
+    backed up, which steers concurrent threads towards other lines. Node updates are guarded by
+    args.numLockStripes locks, striped by state key, so threads only contend when they touch nodes of the same
+    stripe. Network evaluation happens outside the locks; with PyTorch it releases the GIL, which is where the
+    threads overlap. With one thread the search is identical to MCTS.
+
+    Call close() when done (or use the instance as a context manager) to shut the thread pool down.
+    """
+
+    def __init__(self, game, nnet, args, **kwargs):
+        super().__init__(game, nnet, args, **kwargs)
+        self.numThreads = args.get('numSearchThreads', mp.cpu_count())
+        self.virtualLoss = args.get('virtualLoss', 1)
+        self.VLsa = {}  # virtual visits of the edges s,a currently being searched
+        self.VLs = {}  # virtual visits of the boards s currently being searched
+        self.locks = [threading.Lock() for _ in range(args.get('numLockStripes', 64))]
+        self.pool = ThreadPoolExecutor(self.numThreads)
+
+    def lock(self, s):
+        return self.locks[hash(s) % len(self.locks)]
+
+    def simulate(self, canonicalBoard, numSims):
+        if numSims > 0 and self.game.stringRepresentation(canonicalBoard) not in self.Ps:
+            self.search(canonicalBoard)  # expand the root once, before the threads would all race for it
+            numSims -= 1
+        shares = [numSims // self.numThreads + (i < numSims % self.numThreads) for i in range(self.numThreads)]
+        futures = [self.pool.submit(MCTS.simulate, self, canonicalBoard, share) for share in shares if share]
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+    def search(self, canonicalBoard):
+        path = []
+        leaf = None
+        vl = self.virtualLoss
+
+        while True:
+            s = self.game.stringRepresentation(canonicalBoard)
+
+            with self.lock(s):
+                if s not in self.Es:
+                    self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
+                if self.Es[s] != 0:
+                    # terminal node
+                    v = -self.Es[s]
+                    break
+
+                if s not in self.Ps:
+                    leaf = s
+                    break
+
+                a = self.selectAction(s)
+                self.VLsa[(s, a)] = self.VLsa.get((s, a), 0) + vl
+                self.VLs[s] = self.VLs.get(s, 0) + vl
+
+            path.append((s, a))
+            next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
+            canonicalBoard = self.game.getCanonicalForm(next_s, next_player)
+
+        if leaf is not None:
+            ps, valids, v = self.evaluate(canonicalBoard, leaf)
+            v = -v
+            with self.lock(leaf):
+                if leaf not in self.Ps:  # another thread may have expanded it meanwhile
+                    self.Ps[leaf], self.Vs[leaf] = ps, valids
+                    self.As[leaf] = np.flatnonzero(valids).tolist()
+                    self.Ns[leaf] = 0
+
+        for s, a in reversed(path):
+            with self.lock(s):
+                self.VLsa[(s, a)] -= vl
+                self.VLs[s] -= vl
+                if (s, a) in self.Qsa:
+                    self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
+                    self.Nsa[(s, a)] += 1
+                else:
+                    self.Qsa[(s, a)] = v
+                    self.Nsa[(s, a)] = 1
+                self.Ns[s] += 1
+            v = -v
+        return v
+
+    def selectAction(self, s):
+        """
+        Like MCTS.selectAction, counting the virtual visits of every edge as lost visits.
+        """
+        cur_best = -float('inf')
+        best_act = -1
+        Ps = self.Ps[s]
+        sqrt_Ns = math.sqrt(self.Ns[s] + self.VLs.get(s, 0))
+        sqrt_Ns_eps = math.sqrt(self.Ns[s] + self.VLs.get(s, 0) + EPS)
+
+        for a in self.As[s]:
+            vl = self.VLsa.get((s, a), 0)
+            if (s, a) in self.Qsa:
+                n = self.Nsa[(s, a)]
+                q = self.Qsa[(s, a)]
+                if vl:
+                    q = (n * q - vl) / (n + vl)
+                    n += vl
+                u = q + self.args.cpuct * Ps[a] * sqrt_Ns / (1 + n)
+            elif vl:
+                u = -1 + self.args.cpuct * Ps[a] * sqrt_Ns / (1 + vl)
+            else:
+                u = self.args.cpuct * Ps[a] * sqrt_Ns_eps
+
+            if u > cur_best:
+                cur_best = u
+                best_act = a
+
+        return best_act
+
+
+def createMCTS(game, nnet, args, **kwargs):
+    """
+    Returns the search for args.parallelMode: None (sequential MCTS), 'root' (RootParallelMCTS) or 'tree'
+    (TreeParallelMCTS). kwargs (e.g. book) are passed on to the search. Close the search when done, or use it as a
+    context manager.
+    """
+    mode = args.get('parallelMode')
+    if mode is None:
+        return MCTS(game, nnet, args, **kwargs)
+    if mode == 'root':
+        return RootParallelMCTS(game, nnet, args, **kwargs)
+    if mode == 'tree':
+        return TreeParallelMCTS(game, nnet, args, **kwargs)
+    raise ValueError(f'Unknown parallelMode "{mode}"')
@@ -0,0 +1,219 @@
+import logging
+import threading
+
+import numpy as np
+
+from MCTS import MCTS
+
+log = logging.getLogger(__name__)
+
+
+class BatchedMCTS(MCTS):
+    """
+    MCTS over many roots at once. Every round runs one simulation from each root: the descents stop at the first
+    unexpanded state, all those leaves are evaluated together in one nnet.predict_batch call, and the values are
+    backed up. With a network that evaluates a batch in one forward pass, a round costs about as much inference as
+    a single simulation.
+
+    Roots whose descents reach the same leaf in a round share its evaluation. Leaf evaluations bypass the
+    evaluation cache, the trees are built with the weights of nnet only.
+    """
+
+    def simulateBatch(self, canonicalBoards, numSims):
+        """
+        Runs numSims simulations from each of the canonicalBoards.
+        """
+        for _ in range(numSims):
+            leaves = {}  # s -> (canonicalBoard of the leaf, paths ending in it)
+            for canonicalBoard in canonicalBoards:
+                path, s, leafBoard = self.descend(canonicalBoard)
+                if self.Es[s] != 0:
+                    self.backup(path, -self.Es[s])
+                else:
+                    leaves.setdefault(s, (leafBoard, []))[1].append(path)
+            if not leaves:
+                continue
+
+            pis, vs = self.nnet.predict_batch(np.array([leafBoard for leafBoard, _ in leaves.values()]))
+            for (s, (leafBoard, paths)), ps, v in zip(leaves.items(), pis, vs):
+                self.expandLeaf(s, leafBoard, ps)
+                for path in paths:
+                    self.backup(path, -v)
+
+    def expandLeaf(self, s, canonicalBoard, ps):
+        """
+        Expands the leaf s (with board canonicalBoard) with the network policy ps, evaluated in a batch.
+        """
+        self.Vs[s] = self.game.getValidMoves(canonicalBoard, 1)
+        self.Ps[s] = self.maskPolicy(ps, self.Vs[s])
+        self.As[s] = np.flatnonzero(self.Vs[s]).tolist()
+        self.Ns[s] = 0
+
+    def descend(self, canonicalBoard):
+        """
+        Descends from canonicalBoard by the upper confidence bound like search, without expanding.
+
+        Returns:
+            (path, s, canonicalBoard): the (s, a) edges taken, and the key and board of the terminal or unexpanded
+                                       state reached
+        """
+        path = []
+        while True:
+            s = self.game.stringRepresentation(canonicalBoard)
+            if s not in self.Es:
+                self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
+            if self.Es[s] != 0 or s not in self.Ps:
+                return path, s, canonicalBoard
+
+            a = self.selectAction(s)
+            path.append((s, a))
+            next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
+            canonicalBoard = self.game.getCanonicalForm(next_s, next_player)
+
+    def getRootValue(self, canonicalBoard):
+        """
+        Returns:
+            v: the visit-weighted average of the Q values of canonicalBoard, its value for the player to move
+               according to the search, or None if it has no visited action
+        """
+        s = self.game.stringRepresentation(canonicalBoard)
+        visits = [(self.Nsa[(s, a)], self.Qsa[(s, a)]) for a in self.As.get(s, []) if (s, a) in self.Nsa]
+        total = sum(n for n, _ in visits)
+        if total == 0:
+            return None
+        return sum(n * q for n, q in visits) / total
+
+
+class Reanalyser():
+    """
+    Refreshes the targets of stored training examples with the latest accepted network: sampled example boards
+    are searched again with BatchedMCTS (args.reanalyseSims simulations, args.numMCTSSims by default, in batches of
+    args.reanalyseBatchSize boards) and their pi target is replaced by the new visit distribution. Their v target
+    is mixed with the searched root value by args.reanalyseValueMix (0 by default: the game outcome is kept).
+
+    Examples are replaced in place in the example lists of the history (as (board, pi, v) plus any further
+    elements, e.g. the count of ReplayBuffer examples), so every later training set drawn from the history sees
+    the refreshed targets.
+
+    Coach calls reanalyse() between self-play and training, on the iterations before the latest one. AsyncCoach
+    runs it in the background with start(), on its own copy of the accepted network: the trainer grants a number
+    of positions per iteration, which the reanalysis thread works off while the trainer waits for self-play or
+    trains. setWeights() switches it to a newly accepted network.
+    """
+
+    def __init__(self, game, nnet, args):
+        self.game = game
+        self.nnet = nnet
+        self.args = args
+        self.lock = threading.Lock()  # held while the network is searched with or replaced
+        self.budget = threading.Condition()
+        self.granted = 0
+        self.history = None
+        self.thread = None
+        self.stopped = False
+        self.refreshed = 0  # positions refreshed in total
+
+    def sample(self, history, numPositions):
+        """
+        Returns:
+            targets: up to numPositions distinct (examples, index) pairs drawn uniformly from all examples of history
+        """
+        lists = [examples for examples in list(history) if len(examples) > 0]
+        sizes = np.array([len(examples) for examples in lists], dtype=np.int64)
+        total = int(sizes.sum())
+        if total == 0:
+            return []
+        ends = np.cumsum(sizes)
+        picks = np.random.choice(total, min(numPositions, total), replace=False)
+        targets = []
+        for flat in picks:
+            i = int(np.searchsorted(ends, flat, side='right'))
+            targets.append((lists[i], int(flat - (ends[i] - sizes[i]))))
+        return targets
+
+    def refresh(self, targets):
+        """
+        Searches the boards of the (examples, index) targets and replaces their examples by the refreshed ones.
+        """
+        examples = [target[index] for target, index in targets]
+        boards = [example[0] for example in examples]
+        numSims = self.args.get('reanalyseSims') or self.args.numMCTSSims
+        mix = self.args.get('reanalyseValueMix', 0)
+
+        with self.lock:
+            mcts = BatchedMCTS(self.game, self.nnet, self.args)
+            mcts.simulateBatch(boards, numSims)
+
+        for (target, index), example, board in zip(targets, examples, boards):
+            counts = mcts.getVisitCounts(board)
+            if sum(counts) == 0:
+                continue  # terminal board, nothing to search
+            pi = np.array(MCTS.countsToProbs(counts, 1))
+            v = example[2]
+            rootValue = mcts.getRootValue(board)
+            if mix and rootValue is not None:
+                v = (1 - mix) * v + mix * rootValue
+            if index < len(target) and target[index] is example:  # not replaced meanwhile
+                target[index] = (board, pi, v) + tuple(example[3:])
+
+    def reanalyse(self, history, numPositions):
+        """
+        Refreshes numPositions examples sampled from history (a list of example lists).
+
+        Returns:
+            refreshed: the number of examples searched
+        """
+        targets = self.sample(history, numPositions)
+        batchSize = self.args.get('reanalyseBatchSize', 64)
+        for start in range(0, len(targets), batchSize):
+            self.refresh(targets[start:start + batchSize])
+        self.refreshed += len(targets)
+        return len(targets)
+
+    def setWeights(self, snapshot):
+        """
+        Switches the reanalysis to the network weights of snapshot (NeuralNet.snapshot).
+        """
+        with self.lock:
+            self.nnet.restore(snapshot)
+
+    def start(self, history):
+        """
+        Starts the background reanalysis of history, which works off the positions granted by grant(). Like
+        Coach.reanalyseHistory, it leaves out the latest iteration of history, whose targets are fresh.
+        """
+        self.history = history
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name='reanalyse', daemon=True)
+        self.thread.start()
+
+    def grant(self, numPositions):
+        """
+        Allows the background reanalysis to refresh numPositions more examples.
+        """
+        with self.budget:
+            self.granted += numPositions
+            self.budget.notify()
+
+    def stop(self):
+        with self.budget:
+            self.stopped = True
+            self.budget.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        batchSize = self.args.get('reanalyseBatchSize', 64)
+        while True:
+            with self.budget:
+                while self.granted == 0 and not self.stopped:
+                    self.budget.wait()
+                if self.stopped:
+                    return
+                numPositions = min(self.granted, batchSize)
+                self.granted -= numPositions
+            try:
+                self.reanalyse(self.history[:-1], numPositions)
+            except Exception:
+                log.exception('Reanalysis failed')
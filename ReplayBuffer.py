@@ -0,0 +1,62 @@
+import logging
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class ReplayBuffer():
+    """
+    Aggregates training examples by state key (game.stringRepresentation of the example board, i.e. of a
+    canonical board or one of its symmetries). Recurring positions, openings in particular, are kept once with
+    the count-weighted average of their policies and values instead of once per occurrence.
+
+    The aggregated examples have the form (board, pi, v, count); NNet.train weights their losses by count
+    (utils.example_weights), so that an epoch minimizes the same loss as over the raw examples at a fraction of
+    the size.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.entries = {}  # s -> [board, sum of count * pi, sum of count * v, count]
+
+    def add(self, example):
+        """
+        Adds one example (board, pi, v), or an already aggregated (board, pi, v, count).
+        """
+        board, pi, v = example[:3]
+        count = example[3] if len(example) > 3 else 1
+        s = self.game.stringRepresentation(board)
+        entry = self.entries.get(s)
+        if entry is None:
+            self.entries[s] = [board, np.asarray(pi, dtype=np.float64) * count, v * count, count]
+        else:
+            entry[1] += np.asarray(pi, dtype=np.float64) * count
+            entry[2] += v * count
+            entry[3] += count
+
+    def extend(self, examples):
+        for example in examples:
+            self.add(example)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def examples(self):
+        """
+        Returns:
+            examples: list of (board, pi, v, count) with pi and v averaged over the count occurrences
+        """
+        return [(board, pi / count, v / count, count) for board, pi, v, count in self.entries.values()]
+
+    @classmethod
+    def deduplicate(cls, game, examples):
+        """
+        Returns the aggregated form of examples, see examples().
+        """
+        buffer = cls(game)
+        buffer.extend(examples)
+        total = sum(e[3] if len(e) > 3 else 1 for e in examples)
+        if total:
+            log.info(f'Deduplicated {total} examples into {len(buffer)} states ({len(buffer) / total:.1%})')
+        return buffer.examples()
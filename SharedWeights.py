@@ -0,0 +1,93 @@
+import time
+
+import torch
+import torch.multiprocessing as mp  # registers the reductions that hand shared tensors to worker processes
+
+
+def bind_tensors(module, tensors):
+    """
+    Makes the parameters and buffers of module alias the given tensors (a name -> tensor mapping like a
+    state_dict) instead of copying them.
+    """
+    for name, tensor in tensors.items():
+        owner_name, _, attr = name.rpartition('.')
+        owner = module.get_submodule(owner_name) if owner_name else module
+        if attr in owner._parameters:
+            owner._parameters[attr].data = tensor
+        else:
+            owner._buffers[attr] = tensor
+
+
+class SharedWeights():
+    """
+    A network's state_dict published once into shared memory, for worker processes (self-play, arena) to attach
+    read-only instead of each loading its own copy of the weights from a checkpoint file.
+
+    The weights are double buffered: version v lives in slot v % 2. Readers alias the parameters of their module to
+    the tensors of the latest version, so attaching and hot-swapping cost no copy, and acknowledge the version they
+    are bound to. publish() writes the next version into the other slot once no reader is bound to it anymore.
+    Readers only ever run inference on the shared tensors, they must not train the attached module.
+    """
+
+    def __init__(self, state_dict, readers):
+        ctx = mp.get_context('spawn')
+        self.slots = [{name: t.detach().cpu().clone().share_memory_() for name, t in state_dict.items()}
+                      for _ in range(2)]
+        self.version = ctx.Value('i', 0)
+        self.acks = ctx.Array('i', [0] * readers)
+        self.reader = None
+        self.attached = -1
+
+    def publish(self, state_dict, timeout=None, wait=None):
+        """
+        Makes state_dict the latest version. Blocks until every reader has moved off the slot that gets
+        overwritten, i.e. has refreshed at least once since the previous publish.
+
+        wait, if given, is called while the readers are waited for. A publisher that is also the consumer of
+        something the readers may block on (e.g. a bounded queue of their results) must keep consuming it there,
+        or a reader blocked before its next refresh never releases the slot.
+        """
+        version = self.version.value
+        target = self.slots[(version + 1) % 2]
+
+        start = time.time()
+        while min(self.acks[:]) < version:
+            if timeout is not None and time.time() - start > timeout:
+                raise TimeoutError('Readers did not release the shared weights of version {}'.format(version - 1))
+            if wait is not None:
+                wait()
+            time.sleep(0.01)
+
+        with torch.no_grad():
+            for name, tensor in state_dict.items():
+                target[name].copy_(tensor)
+        self.version.value = version + 1
+
+    def attach(self, module, reader):
+        """
+        Binds module to the latest published weights. reader is the index of the calling worker in
+        range(readers).
+        """
+        self.reader = reader
+        self.attached = -1
+        self.refresh(module)
+
+    def refresh(self, module):
+        """
+        Hot-swaps module to the latest published weights.
+
+        Returns:
+            swapped: True if a newer version was bound
+        """
+        version = self.version.value
+        if version == self.attached:
+            return False
+
+        tensors = self.slots[version % 2]
+        if any(p.is_cuda for p in module.parameters()):
+            module.load_state_dict(tensors)
+        else:
+            bind_tensors(module, tensors)
+        self.attached = version
+        self.acks[self.reader] = version
+        return True
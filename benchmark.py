@@ -0,0 +1,420 @@
+"""
+Performance benchmarks for the rules engines, MCTS and inference.
+
+    python benchmark.py                                   # run the default suite and print the results
+    python benchmark.py rules mcts --output results.json  # run some benchmarks, write the results as JSON
+    python benchmark.py --save-baseline baseline.json     # store the results as the baseline
+    python benchmark.py --baseline baseline.json          # exit with code 1 on regressions against the baseline
+
+rules:             construction time of every game, and getValidMoves / getNextState / getGameEnded /
+                   getCanonicalForm / getSymmetries / stringRepresentation calls per second on positions recorded
+                   from seeded random games, plus the peak bytes allocated by one getNextState / getCanonicalForm
+mcts:              MCTS simulations per second from the initial position with a stub network, i.e. search and rules
+                   cost only
+inference:         NNetWrapper.predict latency, and forward latency per position at larger batch sizes
+selfplay:          self-play games per hour (Coach.executeEpisode) with a stub network
+batch:             positions per second of the vectorized Nine Men's Morris engine (NineMensMorrisBatch) on batches
+                   of args.batch_games positions, next to the same calls on the scalar engine, and of predict_batch
+sample_efficiency: (not in the default suite) trains two identically initialised Nine Men's Morris networks for the
+                   same number of gradient steps, one drawing mini-batches with replacement and one doing proper
+                   passes over a permutation of the examples (utils.epoch_batches), and reports the loss over the
+                   whole example set and the fraction of examples each pass actually visited
+
+Results are flat 'benchmark.game.metric' keys. Metrics ending in '_per_s', '_per_h' or '_per_pass' are better when
+higher, all others are better when lower. A metric regresses if it is worse than the baseline by more than
+--tolerance (relative). Operations a game does not support (they raise) are reported on stderr and left out.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import torch
+
+from Coach import Coach
+from MCTS import MCTS
+from utils import dotdict, epoch_batches
+
+args = dotdict({
+    'seed': 0,
+    'positions': 200,          # Number of positions recorded per game for the rules benchmark.
+    'min_time': 0.5,           # Minimum wall time in seconds spent measuring one operation.
+    'mcts_sims': 200,          # Simulations per MCTS measurement.
+    'batch_sizes': [1, 8, 64], # Batch sizes of the inference benchmark.
+    'selfplay_games': 1,       # Games per self-play measurement.
+    'selfplay_sims': 5,        # MCTS simulations per move during self-play.
+    'batch_games': 64,         # Positions per call of the batch benchmark.
+    'sample_positions': 4000,  # Number of self-generated training examples of sample_efficiency.
+    'sample_passes': 5,        # Number of passes (epochs) over the examples of sample_efficiency.
+    'sample_channels': 64,     # Network width of sample_efficiency, smaller than the default to keep the run short.
+})
+
+
+def morris_game():
+    from ninemensmorris.NineMensMorrisGame import NineMensMorrisGame
+    return NineMensMorrisGame()
+
+
+def morris2_game():
+    from ninemensmorris2.NineMensMorrisGame2 import NineMensMorrisGame
+    return NineMensMorrisGame()
+
+
+def othello_game(n):
+    from othello.OthelloGame import OthelloGame
+    return lambda: OthelloGame(n)
+
+
+def morris_nnet(game):
+    from ninemensmorris.pytorch.NNet import NNetWrapper
+    return NNetWrapper(game)
+
+
+def othello_nnet(game):
+    from othello.pytorch.NNet import NNetWrapper
+    return NNetWrapper(game)
+
+
+GAMES = {
+    'ninemensmorris': morris_game,
+    'ninemensmorris2': morris2_game,
+    'othello6': othello_game(6),
+    'othello8': othello_game(8),
+}
+
+NNETS = {
+    'ninemensmorris': morris_nnet,
+    'othello6': othello_nnet,
+}
+
+_games = {}
+
+
+def get_game(name):
+    """
+    Returns the (cached) game instance and the seconds its construction took.
+    """
+    if name not in _games:
+        start = time.perf_counter()
+        game = GAMES[name]()
+        _games[name] = game, time.perf_counter() - start
+    return _games[name]
+
+
+class StubNNet():
+    """
+    Network replacement returning a uniform policy and a zero value, so that only the search is measured.
+    """
+
+    def __init__(self, game):
+        self.pi = np.ones(game.getActionSize()) / game.getActionSize()
+
+    def predict(self, board):
+        return self.pi, 0
+
+
+def ops_per_second(fn, items):
+    """
+    Calls fn on the items round-robin for at least args.min_time seconds and returns the calls per second.
+    """
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            fn(item)
+        calls += len(items)
+        elapsed = time.perf_counter() - start
+        if elapsed >= args.min_time:
+            return calls / elapsed
+
+
+def peak_bytes(fn, items):
+    """
+    Returns the average peak memory in bytes allocated while calling fn on one of the items.
+    """
+    tracemalloc.start()
+    try:
+        total = 0
+        for item in items:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn(item)
+            total += tracemalloc.get_traced_memory()[1] - before
+        return total / len(items)
+    finally:
+        tracemalloc.stop()
+
+
+def record_positions(game, count):
+    """
+    Plays seeded uniformly random games until count positions are collected.
+
+    Returns:
+        positions: list of (canonicalBoard, validAction)
+    """
+    rng = np.random.RandomState(args.seed)
+    positions = []
+    while len(positions) < count:
+        board = game.getInitBoard()
+        cur_player = 1
+        while game.getGameEnded(board, cur_player) == 0 and len(positions) < count:
+            canonical_board = game.getCanonicalForm(board, cur_player)
+            action = rng.choice(np.flatnonzero(game.getValidMoves(canonical_board, 1)))
+            positions.append((canonical_board, action))
+            board, cur_player = game.getNextState(board, cur_player, action)
+    return positions
+
+
+def bench_rules():
+    results = {}
+    for name in GAMES:
+        game, construction = get_game(name)
+        results[f'{name}.construct_s'] = construction
+        try:
+            positions = record_positions(game, args.positions)
+        except Exception as e:
+            print(f'rules.{name}: cannot record positions ({e!r}), measuring the initial position only',
+                  file=sys.stderr)
+            positions = [(game.getInitBoard(), 0)]
+
+        uniform_pi = np.ones(game.getActionSize()) / game.getActionSize()
+        operations = {
+            'getValidMoves': lambda p: game.getValidMoves(p[0], 1),
+            'getNextState': lambda p: game.getNextState(p[0], 1, p[1]),
+            'getGameEnded': lambda p: game.getGameEnded(p[0], 1),
+            'getCanonicalForm': lambda p: game.getCanonicalForm(p[0], -1),
+            'getSymmetries': lambda p: game.getSymmetries(p[0], uniform_pi),
+            'stringRepresentation': lambda p: game.stringRepresentation(p[0]),
+        }
+        for op, fn in operations.items():
+            try:
+                results[f'{name}.{op}_per_s'] = ops_per_second(fn, positions)
+                if op in ('getNextState', 'getCanonicalForm'):
+                    results[f'{name}.{op}_peak_bytes'] = peak_bytes(fn, positions)
+            except Exception as e:
+                print(f'rules.{name}.{op}: {e!r}', file=sys.stderr)
+    return results
+
+
+def bench_mcts():
+    results = {}
+    for name in GAMES:
+        game, _ = get_game(name)
+        mcts = MCTS(game, StubNNet(game), dotdict({'numMCTSSims': args.mcts_sims, 'cpuct': 1.0}))
+        try:
+            start = time.perf_counter()
+            mcts.getActionProb(game.getInitBoard(), temp=1)
+            results[f'{name}.simulations_per_s'] = args.mcts_sims / (time.perf_counter() - start)
+        except Exception as e:
+            print(f'mcts.{name}: {e!r}', file=sys.stderr)
+    return results
+
+
+def bench_inference():
+    results = {}
+    for name, make_nnet in NNETS.items():
+        game, _ = get_game(name)
+        nnet = make_nnet(game)
+        board = game.getInitBoard()
+        results[f'{name}.predict_ms'] = 1000 / ops_per_second(nnet.predict, [board])
+
+        nnet.nnet.eval()
+        device = next(nnet.nnet.parameters()).device
+        for batch_size in args.batch_sizes:
+            batch = torch.FloatTensor(np.repeat(board[np.newaxis], batch_size, axis=0).astype(np.float32)).to(device)
+            with torch.no_grad():
+                per_s = ops_per_second(nnet.nnet, [batch])
+            results[f'{name}.forward_batch{batch_size}_ms_per_position'] = 1000 / (per_s * batch_size)
+    return results
+
+
+def bench_selfplay():
+    results = {}
+    selfplay_args = dotdict({'numMCTSSims': args.selfplay_sims, 'cpuct': 1.0, 'tempThreshold': 15})
+    for name in GAMES:
+        game, _ = get_game(name)
+        coach = Coach.__new__(Coach)  # executeEpisode only needs the game, the args and a fresh search tree
+        coach.game, coach.args = game, selfplay_args
+        np.random.seed(args.seed)
+        try:
+            start = time.perf_counter()
+            for _ in range(args.selfplay_games):
+                coach.mcts = MCTS(game, StubNNet(game), selfplay_args)
+                coach.executeEpisode()
+            results[f'{name}.games_per_h'] = 3600 * args.selfplay_games / (time.perf_counter() - start)
+        except Exception as e:
+            print(f'selfplay.{name}: {e!r}', file=sys.stderr)
+    return results
+
+
+def bench_batch():
+    from ninemensmorris.NineMensMorrisBatch import NineMensMorrisBatch
+
+    results = {}
+    game, _ = get_game('ninemensmorris')
+    engine = NineMensMorrisBatch(game)
+    positions = record_positions(game, args.batch_games)
+    boards = np.stack([board for board, _ in positions])
+    actions = np.array([action for _, action in positions])
+    players = np.ones(len(boards), dtype=int)
+
+    operations = {
+        'getValidMoves': (lambda: engine.getValidMoves(boards, players),
+                          lambda: [game.getValidMoves(board, 1) for board in boards]),
+        'getNextState': (lambda: engine.getNextState(boards, players, actions),
+                         lambda: [game.getNextState(board, 1, action) for board, action in positions]),
+        'getGameEnded': (lambda: engine.getGameEnded(boards, players),
+                         lambda: [game.getGameEnded(board, 1) for board in boards]),
+    }
+    for op, (batched, scalar) in operations.items():
+        results[f'ninemensmorris.batch_{op}_positions_per_s'] = ops_per_second(lambda _: batched(), [0]) * len(boards)
+        results[f'ninemensmorris.{op}_positions_per_s'] = ops_per_second(lambda _: scalar(), [0]) * len(boards)
+
+    nnet = morris_nnet(game)
+    results['ninemensmorris.predict_batch_positions_per_s'] = \
+        ops_per_second(nnet.predict_batch, [boards]) * len(boards)
+    return results
+
+
+def random_examples(game, count):
+    """
+    Plays uniformly random games and returns count examples (canonicalBoard, pi, v) where pi is uniform over the
+    valid moves and v is the final outcome for the player to move.
+    """
+    examples = []
+    while len(examples) < count:
+        board = game.getInitBoard()
+        cur_player = 1
+        positions = []
+        while game.getGameEnded(board, cur_player) == 0:
+            canonical_board = game.getCanonicalForm(board, cur_player)
+            valids = game.getValidMoves(canonical_board, 1)
+            positions.append((canonical_board, valids / valids.sum(), cur_player))
+            board, cur_player = game.getNextState(board, cur_player, np.random.choice(np.flatnonzero(valids)))
+        r = game.getGameEnded(board, cur_player)
+        examples += [(b, pi, r * ((-1) ** (p != cur_player))) for b, pi, p in positions]
+    return examples[:count]
+
+
+def full_loss(nnet, data):
+    """
+    Returns the policy + value loss of nnet over all prepared examples.
+    """
+    boards, policies, vs = data
+    nnet.nnet.eval()
+    total = 0.
+    with torch.no_grad():
+        for ids in np.array_split(np.arange(len(vs)), max(1, len(vs) // 512)):
+            out_pi, out_v = nnet.nnet(torch.from_numpy(boards[ids]))
+            target_pis = torch.from_numpy(nnet.dense_policies(policies, ids))
+            target_vs = torch.from_numpy(vs[ids])
+            total += (nnet.loss_pi(target_pis, out_pi) + nnet.loss_v(target_vs, out_v)).item() * len(ids)
+    return total / len(vs)
+
+
+def bench_sample_efficiency():
+    import ninemensmorris.pytorch.NNet as morris_nnet_module
+
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    morris_nnet_module.args['num_channels'] = args.sample_channels
+
+    game, _ = get_game('ninemensmorris')
+    examples = random_examples(game, args.sample_positions)
+
+    initial = morris_nnet_module.NNetWrapper(game)
+    samplers = {
+        'replacement': lambda n, b: [np.random.randint(n, size=b) for _ in range(n // b)],
+        'epoch': epoch_batches,
+    }
+
+    results = {}
+    for name, sampler in samplers.items():
+        nnet = morris_nnet_module.NNetWrapper(game)
+        nnet.nnet.load_state_dict(initial.nnet.state_dict())
+        data = nnet.prepare_examples(examples)
+        coverage = []
+        start = time.perf_counter()
+        for _ in range(args.sample_passes):
+            batches = sampler(len(examples), morris_nnet_module.args.batch_size)
+            nnet.train_epoch(data, batches)
+            coverage.append(len(np.unique(np.concatenate(batches))) / len(examples))
+        results[f'{name}.train_s'] = time.perf_counter() - start
+        results[f'{name}.final_loss'] = full_loss(nnet, data)
+        results[f'{name}.coverage_per_pass'] = float(np.mean(coverage))
+    return results
+
+
+BENCHMARKS = {
+    'rules': bench_rules,
+    'mcts': bench_mcts,
+    'inference': bench_inference,
+    'selfplay': bench_selfplay,
+    'batch': bench_batch,
+    'sample_efficiency': bench_sample_efficiency,
+}
+
+DEFAULT_SUITE = ['rules', 'mcts', 'inference', 'selfplay', 'batch']
+
+
+def higher_is_better(metric):
+    return metric.endswith(('_per_s', '_per_h', '_per_pass'))
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns (metric, baseline value, new value) for every metric that is worse than the baseline by more than the
+    relative tolerance. Metrics missing from either side are ignored.
+    """
+    regressions = []
+    for metric, value in results.items():
+        old = baseline.get(metric)
+        if not old:
+            continue
+        change = (value - old) / abs(old)
+        if -change > tolerance if higher_is_better(metric) else change > tolerance:
+            regressions.append((metric, old, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the performance benchmarks.')
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                        help='benchmarks to run, out of %s (default: %s)' % (list(BENCHMARKS), DEFAULT_SUITE))
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against the results stored in this JSON file')
+    parser.add_argument('--save-baseline', help='store the results in this JSON file as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown (default: 0.2)')
+    parser.add_argument('--min-time', type=float, default=args.min_time, help='seconds spent per measured operation')
+    options = parser.parse_args()
+
+    names = options.benchmarks or DEFAULT_SUITE
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error('unknown benchmarks %s' % unknown)
+    args['min_time'] = options.min_time
+
+    results = {}
+    for name in names:
+        for metric, value in BENCHMARKS[name]().items():
+            results[f'{name}.{metric}'] = value
+            print(f'{name}.{metric}: {value:.6g}')
+
+    for path in (options.output, options.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            regressions = compare(results, json.load(f), options.tolerance)
+        for metric, old, new in regressions:
+            print(f'REGRESSION {metric}: {old:.6g} -> {new:.6g}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
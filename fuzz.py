@@ -0,0 +1,317 @@
+"""
+Differential fuzzing of the rules engines: plays seeded random games through a reference engine and a candidate
+backend side by side and compares them at every ply.
+
+    python fuzz.py                                   # fuzz every pair with the default number of games
+    python fuzz.py othello8 --games 100000           # fuzz one pair, on all cores
+    python fuzz.py ninemensmorris-batch --seed 1000  # other seeds than the last run
+
+At every ply the two engines must agree on getGameEnded, getValidMoves, getCanonicalForm, getSymmetries (of the
+canonical board, with a pseudo-random policy over the valid moves) and getNextState of the action played, which is
+drawn from the valid moves of the reference. Game i is played with seed --seed + i, so every failure reproduces.
+Failing games are minimized: actions are removed from the failing game as long as the remaining ones are legal
+and still lead to a mismatch, and the shortest failing prefix found is reported with the seed of its game.
+
+Pairs compare boards in the encoding of the reference; a candidate with another encoding (ninemensmorris2) comes
+with the conversion of its boards. Exits with code 1 if any game failed.
+"""
+import argparse
+import multiprocessing as mp
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from ninemensmorris.NineMensMorrisBatch import NineMensMorrisBatch
+from ninemensmorris.NineMensMorrisGame import NineMensMorrisGame
+from ninemensmorris2.NineMensMorrisGame2 import NineMensMorrisGame as NineMensMorrisGame2
+from ninemensmorris2.NineMensMorrisLogic2 import to_core_board
+from othello.OthelloGame import OthelloGame
+from othello.OthelloLogic import Board
+from utils import dotdict
+
+args = dotdict({
+    'games': 200,         # Number of games fuzzed per pair.
+    'max_plies': 400,     # Games still running after this many plies are cut off.
+    'seed': 0,            # Seed of the first game, game i uses seed + i.
+    'max_failures': 5,    # Stop fuzzing a pair after this many failed games.
+})
+
+# reference and candidate engine, and the conversion of candidate boards to the encoding of the reference (or None)
+Pair = namedtuple('Pair', ['reference', 'candidate', 'to_reference'])
+
+# first disagreement of the engines: the ply, the Game method and a description of the difference
+Mismatch = namedtuple('Mismatch', ['ply', 'check', 'detail'])
+
+
+class OthelloBoardGame(OthelloGame):
+    """
+    OthelloGame playing by the square-walking Board of OthelloLogic instead of the bitboards.
+    """
+
+    def board(self, board):
+        b = Board(self.n)
+        b.pieces = np.copy(board)
+        return b
+
+    def getNextState(self, board, player, action):
+        if action == self.n * self.n:
+            return board, -player
+        b = self.board(board)
+        b.execute_move((int(action) // self.n, int(action) % self.n), player)
+        return b.pieces, -player
+
+    def getValidMoves(self, board, player):
+        valids = np.zeros(self.getActionSize(), dtype=int)
+        legalMoves = self.board(board).get_legal_moves(player)
+        if len(legalMoves) == 0:
+            valids[-1] = 1
+        for x, y in legalMoves:
+            valids[self.n * x + y] = 1
+        return valids
+
+    def getGameEnded(self, board, player):
+        b = self.board(board)
+        if b.has_legal_moves(player) or b.has_legal_moves(-player):
+            return 0
+        return 1 if b.countDiff(player) > 0 else -1
+
+
+class NineMensMorrisBatchGame(NineMensMorrisGame):
+    """
+    NineMensMorrisGame whose rules calls go through the vectorized engine (NineMensMorrisBatch) with batches of
+    one position.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.engine = NineMensMorrisBatch(self)
+
+    def getNextState(self, board, player, action):
+        boards, players = self.engine.getNextState(board[np.newaxis], np.array([player]), np.array([action]))
+        return boards[0], players[0]
+
+    def getValidMoves(self, board, player):
+        return self.engine.getValidMoves(board[np.newaxis], np.array([player]))[0]
+
+    def getGameEnded(self, board, player):
+        return self.engine.getGameEnded(board[np.newaxis], np.array([player]))[0]
+
+    def getCanonicalForm(self, board, player):
+        return self.engine.getCanonicalForm(board[np.newaxis], np.array([player]))[0]
+
+
+def morris2_pair():
+    candidate = NineMensMorrisGame2()
+    reference = NineMensMorrisGame(max_moves_without_mill=candidate.MAX_MOVES_WITHOUT_MILL)
+    return Pair(reference, candidate, to_core_board)
+
+
+PAIRS = {
+    'othello6': lambda: Pair(OthelloBoardGame(6), OthelloGame(6), None),
+    'othello8': lambda: Pair(OthelloBoardGame(8), OthelloGame(8), None),
+    'ninemensmorris-batch': lambda: Pair(NineMensMorrisGame(), NineMensMorrisBatchGame(), None),
+    'ninemensmorris2': morris2_pair,
+}
+
+
+def difference(reference, candidate):
+    """
+    :return: None if the values are equal, else a short description of the difference
+    """
+    reference, candidate = np.asarray(reference), np.asarray(candidate)
+    if reference.shape != candidate.shape:
+        return f'shape {reference.shape} != {candidate.shape}'
+    if np.array_equal(reference, candidate):
+        return None
+    if reference.ndim == 0:
+        return f'{reference} != {candidate}'
+    different = np.argwhere(reference != candidate)[:5]
+    return ', '.join(f'{tuple(i)}: {reference[tuple(i)]} != {candidate[tuple(i)]}' for i in different)
+
+
+def policy(valids, ply):
+    """
+    :return: a pseudo-random policy over the valid moves, the same for every replay of the ply
+    """
+    pi = np.random.RandomState(ply).rand(len(valids)) * valids
+    return pi / pi.sum()
+
+
+def run(pair, choose):
+    """
+    Plays a game through both engines of pair, the actions chosen by choose(ply, valid moves of the reference),
+    which returns None to stop.
+
+    :return: (actions played, first Mismatch or None), the actions played lead to the mismatch
+    """
+    reference, candidate, to_reference = pair
+    to_reference = to_reference or (lambda board: board)
+    board, player = reference.getInitBoard(), 1
+    candidate_board, candidate_player = candidate.getInitBoard(), 1
+    actions = []
+    ply = 0
+
+    def check(name, reference_value, candidate_value):
+        detail = difference(reference_value, candidate_value)
+        return None if detail is None else Mismatch(ply, name, detail)
+
+    while True:
+        ended = reference.getGameEnded(board, player)
+        mismatch = check('getInitBoard' if ply == 0 else 'getNextState', board, to_reference(candidate_board)) or \
+            check('getNextState', player, candidate_player) or \
+            check('getGameEnded', ended, candidate.getGameEnded(candidate_board, candidate_player))
+        if mismatch or ended != 0:
+            return actions, mismatch
+
+        valids = reference.getValidMoves(board, player)
+        canonical = reference.getCanonicalForm(board, player)
+        candidate_canonical = candidate.getCanonicalForm(candidate_board, candidate_player)
+        mismatch = check('getValidMoves', valids, candidate.getValidMoves(candidate_board, candidate_player)) or \
+            check('getCanonicalForm', canonical, to_reference(candidate_canonical))
+        if mismatch:
+            return actions, mismatch
+
+        pi = policy(valids, ply)
+        symmetries = reference.getSymmetries(canonical, pi)
+        candidate_symmetries = candidate.getSymmetries(candidate_canonical, pi)
+        mismatch = check('getSymmetries', len(symmetries), len(candidate_symmetries))
+        for (b, p), (candidate_b, candidate_p) in zip(symmetries, candidate_symmetries):
+            mismatch = mismatch or check('getSymmetries', b, to_reference(candidate_b)) or \
+                check('getSymmetries', p, candidate_p)
+        if mismatch:
+            return actions, mismatch
+
+        action = choose(ply, valids)
+        if action is None:
+            return actions, None
+        actions.append(action)
+        board, player = reference.getNextState(board, player, action)
+        candidate_board, candidate_player = candidate.getNextState(candidate_board, candidate_player, action)
+        ply += 1
+
+
+def play(pair, seed, max_plies):
+    """
+    Plays a random game with the given seed.
+
+    :return: (actions played, first Mismatch or None)
+    """
+    rng = np.random.RandomState(seed)
+
+    def choose(ply, valids):
+        return int(rng.choice(np.flatnonzero(valids))) if ply < max_plies else None
+
+    return run(pair, choose)
+
+
+def replay(pair, actions):
+    """
+    Replays the actions, stopping early at an action the reference does not allow.
+
+    :return: (actions played, first Mismatch or None)
+    """
+    def choose(ply, valids):
+        return actions[ply] if ply < len(actions) and valids[actions[ply]] else None
+
+    return run(pair, choose)
+
+
+def minimize(pair, actions, mismatch):
+    """
+    Shrinks a failing game: removes chunks of actions, halving the chunk size down to single actions, as long as
+    the remaining actions still lead to a mismatch. Removing an action can make others removable (e.g. a capture
+    that needed the stone), so single actions are tried until none can be removed. Actions after the mismatch are
+    dropped by the replay.
+
+    :return: (actions, Mismatch) of the shortest failing game found
+    """
+    chunk = len(actions) // 2 or 1
+    while True:
+        start, removed = 0, False
+        while start < len(actions):
+            shorter = actions[:start] + actions[start + chunk:]
+            played, found = replay(pair, shorter)
+            if found is not None:
+                actions, mismatch, removed = played, found, True
+            else:
+                start += chunk
+        if chunk == 1 and not removed:
+            return actions, mismatch
+        chunk = max(chunk // 2, 1)
+
+
+_pair = None
+
+
+def init_worker(name):
+    global _pair
+    _pair = PAIRS[name]()
+
+
+def fuzz_game(task):
+    """
+    Worker: plays the game of the given seed and minimizes it if it fails.
+
+    :return: (seed, plies played, (actions, Mismatch) of the minimized failure or None)
+    """
+    seed, max_plies = task
+    actions, mismatch = play(_pair, seed, max_plies)
+    return seed, len(actions), minimize(_pair, actions, mismatch) if mismatch else None
+
+
+def fuzz(name, games, seed, max_plies, max_failures, workers):
+    """
+    Fuzzes the pair with games seeded seed ... seed + games - 1 in parallel worker processes.
+
+    :return: (plies played, list of (seed, actions, Mismatch) of the failed games)
+    """
+    tasks = [(seed + i, max_plies) for i in range(games)]
+    plies, failures = 0, []
+    ctx = mp.get_context('spawn')
+    with ctx.Pool(workers, initializer=init_worker, initargs=(name,)) as pool:
+        for game_seed, game_plies, failure in pool.imap_unordered(fuzz_game, tasks, chunksize=4):
+            plies += game_plies
+            if failure is not None:
+                failures.append((game_seed,) + failure)
+                if len(failures) >= max_failures:
+                    break
+    return plies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fuzz candidate rules engines against their reference.')
+    parser.add_argument('pairs', nargs='*', metavar='pair',
+                        help='pairs to fuzz, out of %s (default: all)' % list(PAIRS))
+    parser.add_argument('--games', type=int, default=args.games, help='games per pair')
+    parser.add_argument('--seed', type=int, default=args.seed, help='seed of the first game')
+    parser.add_argument('--max-plies', type=int, default=args.max_plies, help='plies per game at most')
+    parser.add_argument('--max-failures', type=int, default=args.max_failures,
+                        help='failed games after which a pair is given up')
+    parser.add_argument('--workers', type=int, default=mp.cpu_count(), help='worker processes')
+    options = parser.parse_args()
+
+    names = options.pairs or list(PAIRS)
+    unknown = [name for name in names if name not in PAIRS]
+    if unknown:
+        parser.error('unknown pairs %s' % unknown)
+
+    failed = False
+    for name in names:
+        start = time.perf_counter()
+        plies, failures = fuzz(name, options.games, options.seed, options.max_plies, options.max_failures,
+                               options.workers)
+        elapsed = time.perf_counter() - start
+        print(f'{name}: {plies} plies in {elapsed:.1f}s ({plies / elapsed:.0f} plies/s), {len(failures)} failures')
+        for seed, actions, mismatch in failures:
+            print(f'  seed {seed}: {mismatch.check} differs at ply {mismatch.ply} after actions {actions}: '
+                  f'{mismatch.detail}', file=sys.stderr)
+        failed = failed or bool(failures)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import logging
 import coloredlogs
 import torch
 
+from AsyncCoach import AsyncCoach
 from Coach import Coach
 from ninemensmorris.NineMensMorrisGame import NineMensMorrisGame as Game, NineMensMorrisGame
 from ninemensmorris.pytorch.NNet import NNetWrapper as nn, NNetWrapper
@@ -22,11 +23,27 @@ args = dotdict({
     'numMCTSSims': 50,          # Number of games moves for MCTS to simulate. default 25
     'arenaCompare': 18,         # Number of games to play during arena play to determine if new net will be accepted. default 40
     'cpuct': 1,                 # default 1
+    'earlyStop': True,          # Stop a temp=0 search (arena, late self-play) once the best move cannot be overtaken.
+    'timeBudget': None,         # Optional wall-clock limit in seconds per MCTS move.
+    'openingBook': None,        # Path of an OpeningBook consulted during self-play (see OpeningBook.py).
+    'bookMix': 0.5,             # Weight of the book policy; the search runs (1 - bookMix) * numMCTSSims simulations.
+    'evaluationCacheSize': 100000,  # Network evaluations of the accepted model kept across episodes (0 disables).
 
     'checkpoint': './tempMorris/',
     'load_model': False,
     'load_folder_file': ('/dev/models/8x100x50','best.pth.tar'),
     'numItersForTrainExamplesHistory': 10000,
+    'profileMCTS': False,       # Record MCTS counters and rules / hashing / inference time split in the metrics.
+    'metricsFile': None,        # Append per-iteration metrics (phase wall times, MCTS counters) to this file.
+    'metricsFormat': 'json',    # 'json' (JSON lines) or 'prometheus' (text format, file is replaced every iteration).
+    'dedupExamples': False,     # Aggregate training examples by state (see ReplayBuffer), losses weighted by count.
+    'gameRecords': None,        # Append every self-play game to this binary log (see GameRecord.py).
+    'reanalysePositions': 0,    # Stored examples searched again with the accepted network per iteration (see Reanalyse.py).
+    'reanalyseSims': None,      # Simulations per reanalysed position (numMCTSSims if None).
+    'reanalyseValueMix': 0,     # Weight of the searched root value in the refreshed v target (0 keeps the game outcome).
+    'tablebase': None,          # Path of a 3v3 endgame tablebase (python -m ninemensmorris.NineMensMorrisTablebase).
+    'selfPlayBatchSize': 0,     # > 0 plays this many self-play games at once, their leaves evaluated in one batch (see BatchedSelfPlay.py).
+    'numSelfPlayWorkers': 0,    # > 0 runs self-play, training and arena as a pipeline (AsyncCoach) with this many self-play processes.
 
     # 'lr': 0.001, #default 0.001
     # 'dropout': 0.3,
@@ -41,7 +58,7 @@ args = dotdict({
 
 def main():
     log.info('Loading %s...', NineMensMorrisGame.__name__)
-    g = NineMensMorrisGame()
+    g = NineMensMorrisGame(tablebase=args.tablebase)
 
     log.info('Loading %s...', NNetWrapper.__name__)
     nnet = NNetWrapper(g)
@@ -52,7 +69,7 @@ def main():
         log.warning('Not loading a checkpoint!')
 
     log.info('Loading the Coach...')
-    c = Coach(g, nnet, args)
+    c = AsyncCoach(g, nnet, args) if args.numSelfPlayWorkers > 0 else Coach(g, nnet, args)
 
     if args.load_model:
         log.info("Loading 'trainExamples' from file...")
@@ -3,11 +3,13 @@ use this script to play any two agents against each other, or play manually with
 any agent.
 """
 import sys
+from contextlib import ExitStack
 
 import numpy as np
 
 from Arena import Arena
-from MCTS import MCTS
+from OpeningBook import OpeningBook
+from ParallelMCTS import createMCTS
 from ninemensmorris.NineMensMorrisGame import NineMensMorrisGame
 from ninemensmorris.NineMensMorrisPlayers import RandomPlayer, HumanNineMensMorrisPlayer, GreedyNineMensMorrisPlayer
 from ninemensmorris.pytorch.NNet import NNetWrapper
@@ -16,56 +18,68 @@ from utils import dotdict
 human_vs_cpu = True
 random_play = False
 greedy_play = False
+opening_book = None  # path of an OpeningBook for the nnet players
 
-g = NineMensMorrisGame()
 
-# all players
-rp = RandomPlayer(g).play
-gp = GreedyNineMensMorrisPlayer(g).play
-hp = HumanNineMensMorrisPlayer(g, True).play
+def main():
+    g = NineMensMorrisGame()
 
-if human_vs_cpu:
-    arena = Arena(rp, hp, g, display=NineMensMorrisGame.display)
+    # all players
+    rp = RandomPlayer(g).play
+    gp = GreedyNineMensMorrisPlayer(g).play
+    hp = HumanNineMensMorrisPlayer(g, True).play
 
-    print(arena.playGames(4, verbose=True))
+    if human_vs_cpu:
+        arena = Arena(rp, hp, g, display=NineMensMorrisGame.display)
 
-else:
-    # nnet players
-    n1 = NNetWrapper(g)
-    n1.load_checkpoint('./pretrained_models/ninemensmorris/pytorch/',
-                       'x_best.pth.tar')
-    args1 = dotdict({'numMCTSSims': 50, 'cpuct': 1.0})
-    mcts1 = MCTS(g, n1, args1)
-    n1p = lambda x: np.argmax(mcts1.getActionProb(x, temp=0))
+        print(arena.playGames(4, verbose=True))
 
-    if human_vs_cpu:
-        player2 = hp
-        file_name = "outputHuman.txt"
-    elif random_play:
-        player2 = rp
-        file_name = "outputRandom.txt"
-    elif greedy_play:
-        player2 = gp
-        file_name = "outputGreedy.txt"
     else:
-        n2 = NNetWrapper(g)
-        n2.load_checkpoint('./pretrained_models/ninemensmorris/pytorch/',
+        # nnet players
+        n1 = NNetWrapper(g)
+        n1.load_checkpoint('./pretrained_models/ninemensmorris/pytorch/',
                            'x_best.pth.tar')
-        args2 = dotdict({'numMCTSSims': 50, 'cpuct': 1.0})
-        mcts2 = MCTS(g, n2, args2)
-        n2p = lambda x: np.argmax(mcts2.getActionProb(x, temp=0))
+        # parallelMode 'root' (numSearchWorkers processes) or 'tree' (numSearchThreads threads) spreads the
+        # simulations of one move over several cores
+        args1 = dotdict({'numMCTSSims': 50, 'cpuct': 1.0, 'parallelMode': None, 'earlyStop': True})
+        book = OpeningBook.load(opening_book) if opening_book else None
+        searches = ExitStack()  # closes the searches after the games
+        mcts1 = searches.enter_context(createMCTS(g, n1, args1, book=book))
+        n1p = lambda x: np.argmax(mcts1.getActionProb(x, temp=0))
 
-        player2 = n2p
-        file_name = "outputModel.txt"
+        if human_vs_cpu:
+            player2 = hp
+            file_name = "outputHuman.txt"
+        elif random_play:
+            player2 = rp
+            file_name = "outputRandom.txt"
+        elif greedy_play:
+            player2 = gp
+            file_name = "outputGreedy.txt"
+        else:
+            n2 = NNetWrapper(g)
+            n2.load_checkpoint('./pretrained_models/ninemensmorris/pytorch/',
+                               'x_best.pth.tar')
+            args2 = dotdict({'numMCTSSims': 50, 'cpuct': 1.0, 'parallelMode': None, 'earlyStop': True})
+            mcts2 = searches.enter_context(createMCTS(g, n2, args2, book=book))
+            n2p = lambda x: np.argmax(mcts2.getActionProb(x, temp=0))
 
-    print("Arena play is starting.")
-    with open(file_name, "w") as file:
-        # Redirect sys.stdout to the file
-        sys.stdout = file
+            player2 = n2p
+            file_name = "outputModel.txt"
 
-        arena = Arena(n1p, player2, g, display=NineMensMorrisGame.display)
+        print("Arena play is starting.")
+        with searches, open(file_name, "w") as file:
+            # Redirect sys.stdout to the file
+            sys.stdout = file
+
+            arena = Arena(n1p, player2, g, display=NineMensMorrisGame.display)
+
+            print(arena.playGames(4, verbose=True))
+
+            sys.stdout = sys.__stdout__
+        print("Arena play is over.")
 
-        print(arena.playGames(4, verbose=True))
 
-        sys.stdout = sys.__stdout__
-    print("Arena play is over.")
+if __name__ == "__main__":
+    # the root-parallel search starts spawn processes, which re-import this script
+    main()
@@ -0,0 +1,165 @@
+"""
+Vectorized rules engine stepping many Nine Men's Morris games at once.
+
+A batch of B games is a (B, 6, 6) integer array of boards in the layout of NineMensMorrisGame (rows 0-3 hold the 24
+points, board[4][0] the placements and board[4][1] the moves without mill) together with a (B,) array of players.
+Legal-move masks, moves, mills and terminal status are computed for all games with NumPy operations over precomputed
+per-action tables instead of one Board at a time, so that a single process can keep hundreds of games going and
+evaluate their positions with one NNetWrapper.predict_batch call.
+
+The results are identical to the ones of NineMensMorrisGame on every board of the batch.
+"""
+import numpy as np
+
+from . import NineMensMorrisTables as tables
+
+MILLS = np.array(tables.MILLS)
+
+# MILL_MEMBERS[m, p]: point p belongs to mill m
+MILL_MEMBERS = np.zeros((len(MILLS), 24), dtype=bool)
+MILL_MEMBERS[np.arange(len(MILLS))[:, None], MILLS] = True
+
+# LINE_OTHERS[p, k]: the two other points of the k-th of the two mills through p
+LINE_OTHERS = np.array(tables.MILL_PARTNERS)
+
+ADJACENT = np.zeros((24, 24), dtype=bool)
+for _position, _neighbours in enumerate(tables.NEIGHBOURS):
+    ADJACENT[_position, list(_neighbours)] = True
+
+
+class NineMensMorrisBatch():
+    """
+    Batched counterpart of the NineMensMorrisGame rules. The per-action tables are derived from game.all_moves, so
+    the action indices are the ones of game.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.action_size = game.getActionSize()
+        self.max_moves_without_mill = game.MAX_MOVES_WITHOUT_MILL
+
+        moves = game.all_moves
+        self.origin = np.array([-1 if o is None else o for o, _, _ in moves])
+        self.destination = np.array([d for _, d, _ in moves])
+        self.capture = np.array([-1 if c is None else c for _, _, c in moves])
+
+        self.has_capture = self.capture >= 0
+        self.safe_capture = np.maximum(self.capture, 0)
+
+        # the legality of the moved stone and whether a mill is closed only depend on the (origin, destination)
+        # pair, of which there are 25 * 24 (origin -1 for placements), so they are computed per pair and gathered
+        pair_origin, pair_destination = np.divmod(np.arange(25 * 24), 24)
+        pair_origin -= 1
+        self.pair = (self.origin + 1) * 24 + self.destination
+        self.pair_origin = np.maximum(pair_origin, 0)
+        self.pair_destination = pair_destination
+        self.pair_is_placement = pair_origin < 0
+        self.pair_is_step = ~self.pair_is_placement & ADJACENT[self.pair_origin, pair_destination]
+        # whether the moved stone is not one of the two other points of each mill through the destination
+        self.pair_keeps_line = (LINE_OTHERS[pair_destination] != pair_origin[:, None, None]).all(axis=2)
+
+    def getInitBoards(self, size):
+        """
+        :param size: number of games B
+        :return: (B, 6, 6) initial boards
+        """
+        return np.repeat(self.game.getInitBoard()[np.newaxis], size, axis=0)
+
+    @staticmethod
+    def get_cells(boards, players):
+        """
+        :return: (B, 24) points of every board from the perspective of the given players (1 own, -1 opponent)
+        """
+        return boards[:, :4].reshape(len(boards), 24) * np.asarray(players)[:, None]
+
+    def getValidMoves(self, boards, players):
+        """
+        :param boards: (B, 6, 6) boards
+        :param players: (B,) players to move
+        :return: (B, action size) 1/0 valid moves of every game
+        """
+        cells = self.get_cells(boards, players)
+        own = cells == 1
+        opponent = cells == -1
+
+        placing = boards[:, 4, 0] < 18
+        flying = ~placing & (own.sum(axis=1) <= 3)
+        origin_ok = np.where(placing[:, None], self.pair_is_placement,
+                             ~self.pair_is_placement & own[:, self.pair_origin] &
+                             (flying[:, None] | self.pair_is_step))
+        pair_ok = origin_ok & (cells[:, self.pair_destination] == 0)
+
+        # lines_full[b, p, k]: the two other points of the k-th mill through p are own stones
+        lines_full = own[:, LINE_OTHERS].all(axis=3)
+        closes_mill = (lines_full[:, self.pair_destination] & self.pair_keeps_line).any(axis=2)
+
+        # opponent stones inside a mill cannot be captured
+        opponent_mills = opponent[:, MILLS].all(axis=2)
+        capturable = opponent & ~(opponent_mills @ MILL_MEMBERS)
+
+        closes_mill = closes_mill[:, self.pair]
+        capture_ok = np.where(self.has_capture, closes_mill & capturable[:, self.safe_capture], ~closes_mill)
+        return (pair_ok[:, self.pair] & capture_ok).astype(np.int8)
+
+    def hasLegalMoves(self, boards, players):
+        return self.getValidMoves(boards, players).any(axis=1)
+
+    def getNextState(self, boards, players, actions):
+        """
+        Applies one action per game.
+        :param boards: (B, 6, 6) boards
+        :param players: (B,) players to move
+        :param actions: (B,) valid action indices
+        :return: the (B, 6, 6) next boards and the (B,) next players
+        """
+        players = np.asarray(players)
+        actions = np.asarray(actions)
+        rows = np.arange(len(boards))
+        origin = self.origin[actions]
+        capture = self.capture[actions]
+
+        cells = boards[:, :4].reshape(len(boards), 24).copy()
+        moving = origin >= 0
+        cells[rows[moving], origin[moving]] = 0
+        capturing = capture >= 0
+        cells[rows[capturing], capture[capturing]] = 0
+        cells[rows, self.destination[actions]] = players
+
+        next_boards = np.zeros_like(boards)
+        next_boards[:, :4] = cells.reshape(len(boards), 4, 6)
+        placements = boards[:, 4, 0]
+        next_boards[:, 4, 0] = placements + (placements < 18)
+        next_boards[:, 4, 1] = np.where(capturing, 0, boards[:, 4, 1] + 1)
+        return next_boards, -players
+
+    def getGameEnded(self, boards, players):
+        """
+        :return: (B,) results as NineMensMorrisGame.getGameEnded: 0 - game has not ended; 1 - player won;
+                 -1 - player lost; 0.0001 - draw
+        """
+        players = np.asarray(players)
+        cells = self.get_cells(boards, players)
+        placed = boards[:, 4, 0] == 18
+        own_stones = (cells == 1).sum(axis=1)
+        opponent_stones = (cells == -1).sum(axis=1)
+
+        results = np.select(
+            [boards[:, 4, 1] >= self.max_moves_without_mill,
+             ~self.hasLegalMoves(boards, players),
+             ~self.hasLegalMoves(boards, -players),
+             placed & (own_stones < 3),
+             placed & (opponent_stones < 3)],
+            [0.0001, -1, 1, -1, 1], 0)
+
+        if self.game.tablebase is not None:
+            for i in np.flatnonzero((results == 0) & placed & (own_stones == 3) & (opponent_stones == 3)):
+                results[i] = self.game.tablebase.result(boards[i], players[i], self.max_moves_without_mill)
+        return results
+
+    def getCanonicalForm(self, boards, players):
+        """
+        :return: (B, 6, 6) boards from the perspective of the given players, misc info unchanged
+        """
+        canonical = boards.copy()
+        canonical[:, :4] *= np.asarray(players)[:, None, None]
+        return canonical
@@ -3,7 +3,11 @@ from __future__ import print_function
 from itertools import product
 
 from Game import Game
+from .NineMensMorrisBatch import NineMensMorrisBatch
 from .NineMensMorrisLogic import Board
+from .NineMensMorrisState import MorrisState
+from .NineMensMorrisTables import build_move_index
+from .NineMensMorrisTablebase import Tablebase
 import sys
 import numpy as np
 import copy
@@ -174,13 +178,8 @@ def get_all_moves_phase_one_and_two():
     moves_phase_one = get_all_moves_phase_one()
     moves_phase_two = get_all_moves_phase_two()
 
-    seen_moves = []
-
-    for move in moves_phase_one + moves_phase_two:
-        if move not in seen_moves:
-            seen_moves.append(move)
-
-    return seen_moves
+    # dict keys keep the order of first occurrence
+    return list(dict.fromkeys(moves_phase_one + moves_phase_two))
 
 
 def get_all_moves():
@@ -200,20 +199,28 @@ class NineMensMorrisGame(Game):
     }
     """
     Initializes the board size, list of all possible moves, the policy rotation vector and
-    the number of moves without a mill to determine a draw
+    the number of moves without a mill to determine a draw (a rule parameter, which differs
+    between the variants played by this rules core, see ninemensmorris2).
+    If tablebase is the path of a 3v3 tablebase (see NineMensMorrisTablebase), positions it covers
+    are scored by getGameEnded as if played out perfectly, i.e. they are terminal. The table must be
+    solved at least max_moves_without_mill plies deep.
     """
 
-    def __init__(self):
+    def __init__(self, tablebase=None, max_moves_without_mill=20):
         super().__init__()
         self.n = 6
         self.m = 6
         self.all_moves = get_all_moves()
+        self.move_index = build_move_index(self.all_moves)
         self.policy_rotation_vector = self.get_policy_rotation_by_90()
-        self.MAX_MOVES_WITHOUT_MILL = 20
+        self.MAX_MOVES_WITHOUT_MILL = max_moves_without_mill
+        self.tablebase = Tablebase(tablebase) if tablebase is not None else None
+        if self.tablebase is not None:
+            self.tablebase.check(max_moves_without_mill)
 
     def get_policy_rotation_by_90(self):
         """
-        :return: Lookup list for the rotation of all possible moves by 90 degrees
+        :return: Lookup array for the rotation of all possible moves by 90 degrees
         """
 
         rotation_90 = [-1] * len(self.all_moves)
@@ -221,10 +228,10 @@ class NineMensMorrisGame(Game):
         for move_index in range(len(self.all_moves)):
             move = self.all_moves[move_index]
             rotated_move = rotate(move)
-            new_index = self.all_moves.index(rotated_move)
+            new_index = self.move_index[rotated_move]
             rotation_90[move_index] = new_index
 
-        return rotation_90
+        return np.array(rotation_90)
 
     def getInitBoard(self):
         """
@@ -254,7 +261,7 @@ class NineMensMorrisGame(Game):
         :param move: The move to be made
         :return: The new board after the move and the next player
         """
-        b = Board(board)
+        b = Board(board)  # the only copy of the board, the move is executed in place
 
         b.execute_move(player, move, self.all_moves)
 
@@ -276,7 +283,7 @@ class NineMensMorrisGame(Game):
         """
         b = Board(board)
 
-        valid_moves = b.get_legal_move_vector(player, self.all_moves)
+        valid_moves = b.get_legal_move_vector(player, self.all_moves, self.move_index)
 
         return np.array(valid_moves)
 
@@ -303,6 +310,9 @@ class NineMensMorrisGame(Game):
             return -1
         elif len(b.get_player_stones(-player)) < 3 and b.get_stones_placed() == 18:
             return 1
+        elif self.tablebase is not None and \
+                (result := self.tablebase.result(board, player, self.MAX_MOVES_WITHOUT_MILL)) is not None:
+            return result
         elif b.has_legal_moves(-player) and b.has_legal_moves(player):
             return 0
 
@@ -314,25 +324,12 @@ class NineMensMorrisGame(Game):
         :return: The board in canonical form
         """
 
-        # If you don't want misc to be taken here
-        # b = Board()
-        # b.pieces = np.copy(board)
-        #
-        # stone_board, _, _ = b.get_stones_and_misc()
-        # canon_board = player * stone_board
-        # return canon_board
-
-        b = Board(board)
-
-        count_placements = b.get_stones_placed()
-        current_moves = b.get_moves_made_without_mill()
-
         canon_board = player * board
 
-        canon_board[4][0] = count_placements
-        canon_board[4][1] = current_moves
+        # the misc info (placements, moves without mill) is not negated
+        canon_board[4][0] = board[4][0]
+        canon_board[4][1] = board[4][1]
 
-        # print(f"Canon board is {canon_board}")
         return canon_board
 
     def getSymmetries(self, board, pi):
@@ -354,6 +351,26 @@ class NineMensMorrisGame(Game):
         """
         Used for hashing in MCTS.
         :param board: The current board
+        :return: The board as compact, hashable MorrisState
+        """
+        return MorrisState.fromBoard(board)
+
+    def getPlyCount(self, board):
+        """
+        :param board: The current board
+        :return: The number of stones placed, i.e. of plies played, in the placement phase, None after it
+        """
+        return int(board[4][0]) if board[4][0] < 18 else None
+
+    def getBatchEngine(self):
+        """
+        :return: A NineMensMorrisBatch stepping many games of this game at once
+        """
+        return NineMensMorrisBatch(self)
+
+    def stringRepresentationReadable(self, board):
+        """
+        :param board: The current board
         :return: String representation of the board
         """
         board_s = ""
@@ -1,64 +1,19 @@
 import numpy as np
 
-coefficients_dict = {
-    0: (1, 2),
-    1: (-1, 1),
-    2: (-1, -2)
-}
-
-
-def get_zone(position):
-    return int(position / 8)
-
-
-def is_corner_move(move):
-    return move % 2 == 0
+from .NineMensMorrisTables import MILLS, MILL_PARTNERS, NEIGHBOURS
 
 
 def check_not_previously_occupied(original, new_1, new_2):
     return original is None or (original != new_1 and original != new_2)
 
 
-def get_missing_for_mill_corner_horizontal(position, zone):
-    stone_for_mill_1 = (position + 1) % 8 + zone * 8
-    stone_for_mill_2 = (position + 2) % 8 + zone * 8
-    return stone_for_mill_1, stone_for_mill_2
-
-
-def get_missing_for_mill_corner_vertical(position, zone):
-    stone_for_mill_1 = (position - 1) % 8 + zone * 8
-    stone_for_mill_2 = (position - 2) % 8 + zone * 8
-    return stone_for_mill_1, stone_for_mill_2
-
-
-def get_missing_for_mill_middle_horizontal(position, zone):
-    stone_for_mill_1 = ((position - 1) % 8) + zone * 8
-    stone_for_mill_2 = ((position + 1) % 8) + zone * 8
-    return stone_for_mill_1, stone_for_mill_2
-
-
-def get_missing_for_mill_middle_vertical(position, zone):
-    coefficients = coefficients_dict[zone]
-    stone_for_mill_1 = position + coefficients[0] * 8
-    stone_for_mill_2 = position + coefficients[1] * 8
-    return stone_for_mill_1, stone_for_mill_2
-
-
 def get_adjacent(position):
     """
     Gets all adjacent positions for given position
     :return: list of adjacent positions
     """
     if position is not None and 0 <= position <= 23:
-        zone = get_zone(position)
-        adjacent = [((position - 1) % 8) + zone * 8, ((position + 1) % 8) + zone * 8]
-
-        if not is_corner_move(position):
-            potentials = [position + 8, position - 8]
-            for potential in potentials:
-                if 0 <= potential <= 23:
-                    adjacent.append(potential)
-        return adjacent
+        return list(NEIGHBOURS[position])
     return []
 
 
@@ -92,6 +47,9 @@ class Board():
         self.n = 6
         self.m = 6
         self.pieces = np.array(pieces, dtype=int) if pieces is not None else np.zeros((self.n, self.m), dtype=int)
+        # player -> set of the player's stones that are part of a mill, computed on first use, dropped by
+        # execute_move
+        self.mill_stones = {}
 
     def __getitem__(self, index):
         return self.pieces[index]
@@ -104,15 +62,7 @@ class Board():
         """
         Retrieves only the stone positions as array of length 24
         """
-        board_array = []
-        board_array.extend(self.pieces[0])
-        board_array.extend(self.pieces[1])
-        board_array.extend(self.pieces[2])
-        board_array.extend(self.pieces[3])
-
-        assert (len(board_array) == 24)
-
-        return board_array
+        return self.pieces[:4].reshape(-1).tolist()
 
     def get_stones_placed(self):
         """
@@ -135,11 +85,13 @@ class Board():
 
         return board_array, self.get_stones_placed(), self.get_moves_made_without_mill()
 
-    def get_legal_move_vector(self, player, all_moves):
+    def get_legal_move_vector(self, player, all_moves, move_index=None):
         """
         Valid moves vector for current player in current board state
         :param player: The current player
         :param all_moves: All possible moves array
+        :param move_index: Dict from move to action index (NineMensMorrisTables.build_move_index), saves searching
+            all_moves for every legal move
         :return: 1/0 valid moves vector
         """
 
@@ -147,7 +99,7 @@ class Board():
         legal_move_vector = [0] * len(all_moves)
 
         for move in legal_moves:
-            index = all_moves.index(move)
+            index = move_index[move] if move_index is not None else all_moves.index(move)
             legal_move_vector[index] = 1
         return legal_move_vector
 
@@ -241,43 +193,17 @@ class Board():
         :param player: The current player
         :return: List of all moves that will make a mill on the board for current player
         """
+        board = self.get_board_as_array()
         move_forms_mill = []
 
         for move in moves:
             if (move is not None) and 0 <= move[1] < 24:
-                stone_position_orig = move[0]
-                stone_position_new = move[1]
-                zone = get_zone(stone_position_new)
-                # Move to Corner
-                if is_corner_move(stone_position_new):
-
-                    # check horizontally
-                    stone_for_mill_1, stone_for_mill_2 = get_missing_for_mill_corner_horizontal(stone_position_new,
-                                                                                                zone)
-                    if check_not_previously_occupied(stone_position_orig, stone_for_mill_1, stone_for_mill_2) and \
-                            self.check_player_occupies_on_board(player, stone_for_mill_1, stone_for_mill_2):
-                        move_forms_mill.append(move)
-
-                    # check vertically
-                    stone_for_mill_1, stone_for_mill_2 = get_missing_for_mill_corner_vertical(stone_position_new, zone)
-                    if check_not_previously_occupied(stone_position_orig, stone_for_mill_1, stone_for_mill_2) and \
-                            self.check_player_occupies_on_board(player, stone_for_mill_1, stone_for_mill_2):
-                        move_forms_mill.append(move)
-
-                # Move to Middle
-                else:
-
-                    # check horizontally
-                    stone_for_mill_1, stone_for_mill_2 = get_missing_for_mill_middle_horizontal(stone_position_new,
-                                                                                                zone)
-                    if check_not_previously_occupied(stone_position_orig, stone_for_mill_1, stone_for_mill_2) and \
-                            self.check_player_occupies_on_board(player, stone_for_mill_1, stone_for_mill_2):
-                        move_forms_mill.append(move)
-
-                    # check vertically
-                    stone_for_mill_1, stone_for_mill_2 = get_missing_for_mill_middle_vertical(stone_position_new, zone)
-                    if check_not_previously_occupied(stone_position_orig, stone_for_mill_1, stone_for_mill_2) and \
-                            self.check_player_occupies_on_board(player, stone_for_mill_1, stone_for_mill_2):
+                origin = move[0]
+                # a mill is closed if the two other positions of a mill through the destination hold own stones,
+                # the moved stone not being one of them
+                for stone_for_mill_1, stone_for_mill_2 in MILL_PARTNERS[move[1]]:
+                    if check_not_previously_occupied(origin, stone_for_mill_1, stone_for_mill_2) and \
+                            board[stone_for_mill_1] == player and board[stone_for_mill_2] == player:
                         move_forms_mill.append(move)
 
         return list(move_forms_mill)
@@ -286,57 +212,35 @@ class Board():
         """
         Checks if player occupies the given positions on the board
         """
-        board = self.get_board_as_array()
-        return board[pos_1] == player and board[pos_2] == player
+        cells = self.pieces[:4].reshape(-1)
+        return cells[pos_1] == player and cells[pos_2] == player
 
     def check_for_mills(self, player):
         """
         :param player: The current player
         :return: List of all mills for current player
         """
-        # TODO: Check if I should remove duplicates mill 0-1-2 is same as 1-0-2, 0-2-1, 1-2-0, 2-1-0, 2-0-1
-
-        current_mills = []
-        stone_positions = self.get_player_stones(player)
-
-        for position in stone_positions:
-            zone = get_zone(position)
-            if is_corner_move(position):
-                stone_for_mill_1, stone_for_mill_2 = get_missing_for_mill_corner_horizontal(position, zone)
-                if self.check_player_occupies_on_board(player, stone_for_mill_1, stone_for_mill_2):
-                    current_mills.append((position, stone_for_mill_1, stone_for_mill_2))
-                stone_for_mill_1, stone_for_mill_2 = get_missing_for_mill_corner_vertical(position, zone)
-                if self.check_player_occupies_on_board(player, stone_for_mill_1, stone_for_mill_2):
-                    current_mills.append((position, stone_for_mill_1, stone_for_mill_2))
-
-            else:
-                stone_for_mill_1, stone_for_mill_2 = get_missing_for_mill_middle_horizontal(position, zone)
-                if self.check_player_occupies_on_board(player, stone_for_mill_1, stone_for_mill_2):
-                    current_mills.append((position, stone_for_mill_1, stone_for_mill_2))
-
-                stone_for_mill_1, stone_for_mill_2 = get_missing_for_mill_middle_vertical(position, zone)
-                if self.check_player_occupies_on_board(player, stone_for_mill_1, stone_for_mill_2):
-                    current_mills.append((position, stone_for_mill_1, stone_for_mill_2))
+        board = self.get_board_as_array()
+        return [mill for mill in MILLS if all(board[position] == player for position in mill)]
 
-        return list(current_mills)
+    def get_mill_stones(self, player):
+        """
+        :param player: The current player
+        :return: set of player's stones that are part of a mill
+        """
+        if player not in self.mill_stones:
+            cells = self.pieces[:4].reshape(-1).tolist()
+            self.mill_stones[player] = {stone for mill in MILLS if all(cells[p] == player for p in mill)
+                                        for stone in mill}
+        return self.mill_stones[player]
 
     def get_stones_outside_mills(self, player):
         """
         :param player: The current player
         :return: list of player's stones that are not in any mill
         """
-        all_player_stones = self.get_player_stones(player)
-
-        mills = self.check_for_mills(player)
-
-        remaining_pieces = self.get_player_stones(player)
-
-        for stone in all_player_stones:
-            for mill in mills:
-                if stone in mill and stone in remaining_pieces:
-                    remaining_pieces.remove(stone)
-
-        return list(remaining_pieces)
+        mill_stones = self.get_mill_stones(player)
+        return [stone for stone in self.get_player_stones(player) if stone not in mill_stones]
 
     def get_legal_moves_0(self, player):
         """
@@ -457,9 +361,9 @@ class Board():
 
             flat_rotated_board = rotated_board.flatten()
 
-            rotated_pi = np.zeros(len(all_moves), dtype=int)
-            for idx, move in enumerate(pi):
-                rotated_pi[policy_rotation_vector[idx]] = move
+            # move i of pi becomes move policy_rotation_vector[i] of the rotated policy
+            rotated_pi = np.zeros(len(all_moves))
+            rotated_pi[policy_rotation_vector] = pi
 
             rotated_results.append((self.to_board(flat_rotated_board, [count, moves_without_mills]), rotated_pi))
 
@@ -470,30 +374,26 @@ class Board():
 
     def execute_move(self, player, move_index, all_moves) -> None:
         """
-        Executes the given move.
+        Executes the given move in place on self.pieces.
         :param player: The current player
         :param move_index: The index of the move to be executed
         :param all_moves: List of all possible moves
         """
-        move = all_moves[move_index]
-        assert (len(move) == 3)  # move is a tuple of length 3
-        board, count_placements, moves_without_mills = self.get_stones_and_misc()
-        # print(f"EXECUTING MOVE: {move}. The board is now: {board}. The placements {count_placements}")
-
-        if self.get_game_phase(player) == 0:
-            count_placements += 1
-        if move[0] is not None:
-            board[move[0]] = 0
-        if move[2] is not None:
-            board[move[2]] = 0
-            moves_without_mills = 0
-        elif move[2] is None:
-            moves_without_mills += 1
-        board[move[1]] = player
-
-        # print(f"DONE MOVE: {move}. The board is now: {board}. The placements {count_placements}")
-
-        self.pieces = np.copy(self.to_board(board, [count_placements, moves_without_mills]))
+        origin, destination, capture = all_moves[move_index]
+        cells = self.pieces[:4].reshape(-1)  # view on the stone positions
+
+        if self.pieces[4][0] < 18:
+            # phase 0: every move is a placement
+            self.pieces[4][0] += 1
+        if origin is not None:
+            cells[origin] = 0
+        if capture is not None:
+            cells[capture] = 0
+            self.pieces[4][1] = 0
+        else:
+            self.pieces[4][1] += 1
+        cells[destination] = player
+        self.mill_stones = {}
 
     def to_board(self, board_array, misc):
         """
@@ -72,4 +72,4 @@ class HumanNineMensMorrisPlayer():
                 print('This input is invalid.')
 
         # Return index of move
-        return all_moves.index(move)
+        return self.game.move_index[move]
@@ -0,0 +1,76 @@
+import numpy as np
+
+# value of the bit of every point, stone positions as index in flattened board (0 - 23)
+BITS = 1 << np.arange(24, dtype=np.int64)
+MASK_24 = (1 << 24) - 1
+
+
+class MorrisState():
+    """
+    Immutable, compact Nine Men's Morris position, used as the state key of a board (see
+    NineMensMorrisGame.stringRepresentation) instead of a string of its 26 numbers.
+
+    The position is packed into a single int: two 24-bit masks (bit p of stones is set if board position p holds a
+    stone of player 1, the player to move in a canonical board, bit p of opponent_stones if it holds a stone of
+    player -1), the placements and the moves without mill. Together they determine the board, which toBoard()
+    rebuilds when an array is needed, e.g. as network input. Hashing and comparing a state is hashing and comparing
+    that int.
+    """
+
+    __slots__ = ('key',)
+
+    def __init__(self, stones, opponent_stones, placements, moves_without_mill):
+        object.__setattr__(self, 'key', stones | opponent_stones << 24 | placements << 48 | moves_without_mill << 53)
+
+    @classmethod
+    def fromBoard(cls, board):
+        """
+        :param board: 6 x 6 board array
+        :return: the MorrisState of board
+        """
+        cells = np.asarray(board)[:4].reshape(-1)
+        return cls(int((cells == 1) @ BITS), int((cells == -1) @ BITS), int(board[4][0]), int(board[4][1]))
+
+    @property
+    def stones(self):
+        return self.key & MASK_24
+
+    @property
+    def opponent_stones(self):
+        return self.key >> 24 & MASK_24
+
+    @property
+    def placements(self):
+        return self.key >> 48 & 0x1f
+
+    @property
+    def moves_without_mill(self):
+        return self.key >> 53
+
+    def toBoard(self):
+        """
+        :return: the 6 x 6 board array of the state
+        """
+        board = np.zeros((6, 6), dtype=int)
+        cells = board[:4].reshape(-1)
+        cells[(BITS & self.stones) != 0] = 1
+        cells[(BITS & self.opponent_stones) != 0] = -1
+        board[4][0] = self.placements
+        board[4][1] = self.moves_without_mill
+        return board
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __eq__(self, other):
+        return isinstance(other, MorrisState) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __reduce__(self):
+        return MorrisState, (self.stones, self.opponent_stones, self.placements, self.moves_without_mill)
+
+    def __repr__(self):
+        return f'MorrisState({self.stones:#08x}, {self.opponent_stones:#08x}, {self.placements}, ' \
+               f'{self.moves_without_mill})'
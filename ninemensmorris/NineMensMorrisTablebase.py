@@ -0,0 +1,189 @@
+"""
+Endgame tablebase for the flying phase of Nine Men's Morris with three stones per side.
+
+Once all 18 stones are placed and both players are down to three stones, both of them fly: any stone may move to
+any empty point. A move that closes a mill captures and leaves the opponent with two stones, which wins, unless all
+three opponent stones form a mill themselves, in which case mill-closing moves are not legal at all (see
+Board.get_legal_moves_2). Every 3v3 position can therefore be solved by retrograde analysis over the ~2.7 million
+placements of the six stones.
+
+The table stores, for the player to move, the distance to mate in plies (the capture included): d > 0 wins in d,
+d < 0 loses in -d, 0 is neither within the solved depth. Since no stone is captured before the final ply, the
+moves-without-mill counter only grows, and the game is drawn once it reaches MAX_MOVES_WITHOUT_MILL. A position
+with counter c is thus won (lost) if |d| <= MAX_MOVES_WITHOUT_MILL - c and drawn otherwise, which the table only
+tells for a MAX_MOVES_WITHOUT_MILL up to the solved depth. If the analysis reaches a fixed point before max_depth,
+the undecided positions are drawn at any depth and the solved depth is recorded as COMPLETE.
+
+Positions are indexed by rank(own stones) * 2024 + rank(opponent stones), where rank enumerates the 2024 sorted
+triples of the 24 points. Entries with overlapping triples are unused. The table is saved as an int8 .npy file, followed by one entry with
+the solved depth, and loaded memory-mapped:
+
+    python -m ninemensmorris.NineMensMorrisTablebase tablebase_3v3.npy
+"""
+import logging
+import sys
+from itertools import combinations
+
+import numpy as np
+
+from .NineMensMorrisTables import MILLS
+
+log = logging.getLogger(__name__)
+
+MAX_DEPTH = 50  # longest distance worth storing: the 4x8 variant is drawn after 50 moves without a mill
+COMPLETE = np.iinfo(np.int8).max  # solved depth of a table that decides every position at any depth
+
+TRIPLES = np.array(list(combinations(range(24), 3)), dtype=np.int64)  # 2024 x 3, sorted stone positions
+NUM_TRIPLES = len(TRIPLES)
+
+
+def _rank_table():
+    rank = np.full((24, 24, 24), -1, dtype=np.int64)
+    for r, (a, b, c) in enumerate(TRIPLES):
+        for x, y, z in ((a, b, c), (a, c, b), (b, a, c), (b, c, a), (c, a, b), (c, b, a)):
+            rank[x, y, z] = r
+    return rank
+
+
+RANK = _rank_table()
+MASKS = (1 << TRIPLES).sum(axis=1)  # 24-bit occupancy mask of every triple
+IS_MILL = np.zeros(NUM_TRIPLES, dtype=bool)
+IS_MILL[[RANK[m] for m in MILLS]] = True
+
+
+def rank(stones):
+    """
+    Returns the rank of three distinct stone positions (in any order).
+    """
+    a, b, c = stones
+    return int(RANK[a, b, c])
+
+
+def _moves():
+    """
+    Returns:
+        moves: (NUM_TRIPLES, 3 * 24) array with the rank of the own triple after flying stone k to point e (column
+               k * 24 + e), or -1 if e is already occupied by one of the own stones
+    """
+    moves = np.full((NUM_TRIPLES, 3, 24), -1, dtype=np.int64)
+    for k in range(3):
+        others = np.delete(TRIPLES, k, axis=1)
+        for e in range(24):
+            free = (others != e).all(axis=1) & (TRIPLES[:, k] != e)
+            moves[free, k, e] = RANK[others[free, 0], others[free, 1], e]
+    return moves.reshape(NUM_TRIPLES, 72)
+
+
+def generate(max_depth=MAX_DEPTH):
+    """
+    Solves all 3v3 flying positions up to max_depth plies by retrograde analysis.
+
+    Returns:
+        table: int8 array of NUM_TRIPLES ** 2 distances to mate and the solved depth, see the module docstring
+    """
+    if max_depth >= COMPLETE:
+        raise ValueError(f'max_depth must be below {COMPLETE}')
+    moves = _moves()
+    valid = (MASKS[:, None] & MASKS[None, :]) == 0  # [own, opp]: disjoint triples
+    table = np.zeros((NUM_TRIPLES, NUM_TRIPLES), dtype=np.int8)
+
+    # which (stone, point) moves are legal non-mill moves for each position; mill moves either win at once or,
+    # if all opponent stones are in a mill, are illegal
+    points = np.arange(72) % 24
+    opp_free = ((MASKS[None, :] >> points[:, None]) & 1) == 0  # [move, opp]
+    own_target = moves.T  # [move, own]
+    closes_mill = (own_target >= 0) & IS_MILL[own_target]
+
+    wins_now = np.zeros_like(valid)
+    for m in range(72):
+        wins_now |= (closes_mill[m][:, None] & opp_free[m][None, :]) & ~IS_MILL[None, :]
+    table[valid & wins_now] = 1
+    log.info(f'depth 1: {np.count_nonzero(table == 1)} wins')
+
+    undecided = valid & (table == 0)
+    solved, quiet = max_depth, 0
+    for depth in range(2, max_depth + 1):
+        losing = depth % 2 == 0
+        if losing:
+            all_won = undecided.copy()
+        else:
+            found = np.zeros_like(undecided)
+
+        for m in range(72):
+            legal = ((own_target[m] >= 0) & ~closes_mill[m])[:, None] & opp_free[m][None, :]
+            target = np.where(own_target[m] >= 0, own_target[m], 0)
+            # the successor has the opponent to move: table[opp, own'] seen from [own, opp] is table[:, target].T
+            successor = table[:, target].T
+            if losing:
+                all_won &= ~legal | (successor > 0)
+            else:
+                found |= legal & (successor == -(depth - 1))
+
+        newly = undecided & (all_won if losing else found)
+        table[newly] = -depth if losing else depth
+        undecided &= ~newly
+        log.info(f'depth {depth}: {np.count_nonzero(newly)} {"losses" if losing else "wins"}')
+        # a win needs a loss one ply shorter and a loss only wins, so two depths without news are a fixed point
+        quiet = quiet + 1 if not newly.any() else 0
+        if quiet == 2:
+            solved = COMPLETE
+            break
+
+    return np.append(table.reshape(-1), np.int8(solved))
+
+
+def save(table, path):
+    np.save(path, table)
+
+
+class Tablebase():
+    """
+    Read-only, memory-mapped 3v3 tablebase.
+    """
+
+    def __init__(self, path):
+        self.table = np.load(path, mmap_mode='r')
+        if self.table.shape != (NUM_TRIPLES * NUM_TRIPLES + 1,):
+            raise ValueError(f'"{path}" is not a 3v3 Nine Men\'s Morris tablebase')
+        self.depth = int(self.table[-1])  # solved depth, COMPLETE if every position is decided
+
+    def check(self, max_moves_without_mill):
+        """
+        Raises ValueError if the table cannot tell the results of a game drawn after max_moves_without_mill moves
+        without a mill, i.e. if it is not solved that deep.
+        """
+        if max_moves_without_mill > self.depth:
+            raise ValueError(f'The tablebase is solved to {self.depth} plies, too short for a draw after '
+                             f'{max_moves_without_mill} moves without a mill; generate it with max_depth >= '
+                             f'{max_moves_without_mill}')
+
+    def probe(self, own, opp):
+        """
+        :param own: positions (0-23) of the three stones of the player to move
+        :param opp: positions of the three opponent stones
+        :return: distance to mate in plies for the player to move (see module docstring)
+        """
+        return int(self.table[rank(own) * NUM_TRIPLES + rank(opp)])
+
+    def result(self, board, player, max_moves_without_mill):
+        """
+        Returns the game result for player as getGameEnded would report it once the position is played out
+        perfectly: 1 won, -1 lost, 0.0001 drawn, or None if the position is not covered (not all stones placed or
+        not three stones each). max_moves_without_mill must pass check().
+        """
+        stones = np.asarray(board)[:4].reshape(-1)
+        if board[4][0] != 18:
+            return None
+        own = np.flatnonzero(stones == player)
+        opp = np.flatnonzero(stones == -player)
+        if len(own) != 3 or len(opp) != 3:
+            return None
+        d = self.probe(own, opp)
+        if d != 0 and abs(d) <= max_moves_without_mill - board[4][1]:
+            return 1 if d > 0 else -1
+        return 0.0001
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    save(generate(), sys.argv[1] if len(sys.argv) > 1 else 'tablebase_3v3.npy')
@@ -0,0 +1,43 @@
+"""
+Static lookup tables of the Nine Men's Morris board, built once at import time and shared by the rules engines
+(NineMensMorrisLogic, NineMensMorrisBatch, NineMensMorrisTablebase).
+
+Stone positions are indices 0 - 23 in the flattened board: zone * 8 + index, zone 0 being the outer square, the
+index running around its square with the corners at even indices. Points with odd index are connected to the same
+index of the neighbouring zones.
+"""
+
+# the 16 possible mills: four per zone, along the sides of its square, and four crossing the zones
+MILLS = tuple([tuple(zone * 8 + (start + k) % 8 for k in range(3)) for zone in range(3) for start in (0, 2, 4, 6)] +
+              [(index, index + 8, index + 16) for index in (1, 3, 5, 7)])
+
+# MILLS_THROUGH[p]: the two mills through position p
+MILLS_THROUGH = tuple(tuple(mill for mill in MILLS if position in mill) for position in range(24))
+
+# MILL_PARTNERS[p]: for both mills through p, the two other positions, which must hold own stones for a stone
+# arriving at p to close the mill
+MILL_PARTNERS = tuple(tuple(tuple(q for q in mill if q != position) for mill in mills)
+                      for position, mills in enumerate(MILLS_THROUGH))
+
+
+def _neighbours(position):
+    zone, index = divmod(position, 8)
+    neighbours = [zone * 8 + (index - 1) % 8, zone * 8 + (index + 1) % 8]
+    if index % 2 == 1:
+        neighbours += [p for p in (position + 8, position - 8) if 0 <= p < 24]
+    return tuple(neighbours)
+
+
+# NEIGHBOURS[p]: the positions connected to p by a line, i.e. reachable by a move in phase 1
+NEIGHBOURS = tuple(_neighbours(position) for position in range(24))
+
+
+def build_move_index(all_moves):
+    """
+    :param all_moves: list of all moves (origin, destination, capture) of a game
+    :return: dict mapping every move to its action index
+
+    The moves of one (origin, destination) pair are not contiguous in the action list of the game (the moves of
+    phases 1 and 2 are merged), so a dict keyed by the move replaces a search of the list.
+    """
+    return {move: index for index, move in enumerate(all_moves)}
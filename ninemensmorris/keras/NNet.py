@@ -31,13 +31,17 @@ class NNetWrapper(NeuralNet):
 
     def train(self, examples):
         """
-        examples: list of examples, each example is of form (board, pi, v)
+        examples: list of examples, each example is of form (board, pi, v), or (board, pi, v, count) if
+                  aggregated by ReplayBuffer, in which case the loss is weighted by count
+                  (utils.example_weights)
         """
-        input_boards, target_pis, target_vs = list(zip(*examples))
+        input_boards, target_pis, target_vs = list(zip(*(e[:3] for e in examples)))
         input_boards = np.asarray(input_boards)
         target_pis = np.asarray(target_pis)
         target_vs = np.asarray(target_vs)
-        self.nnet.model.fit(x = input_boards, y = [target_pis, target_vs], batch_size = args.batch_size, epochs = args.epochs)
+        weights = example_weights(examples)
+        self.nnet.model.fit(x = input_boards, y = [target_pis, target_vs], batch_size = args.batch_size, epochs = args.epochs,
+                            sample_weight = [weights, weights] if weights is not None else None)
 
     def predict(self, board):
         """
@@ -55,25 +59,31 @@ class NNetWrapper(NeuralNet):
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
         return pi[0], v[0]
 
-    def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
-        # change extension
-        filename = filename.split(".")[0] + ".h5"
+    def snapshot(self):
+        """
+        Returns an in-memory copy of the weights, see NeuralNet.snapshot.
+        """
+        return self.nnet.model.get_weights()
+
+    def restore(self, snapshot):
+        self.nnet.model.set_weights(snapshot)
 
+    def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         filepath = os.path.join(folder, filename)
         if not os.path.exists(folder):
             print("Checkpoint Directory does not exist! Making directory {}".format(folder))
-            os.mkdir(folder)
-        else:
-            print("Checkpoint Directory exists! ")
-        self.nnet.model.save_weights(filepath)
+            os.makedirs(folder)
+        # write to a temporary file and rename it, so readers never see a partially written checkpoint
+        self.nnet.model.save_weights(filepath + '.tmp', save_format='h5')
+        os.replace(filepath + '.tmp', filepath)
 
     def load_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
-        # change extension
-        filename = filename.split(".")[0] + ".h5"
-
         # https://github.com/pytorch/examples/blob/master/imagenet/main.py#L98
         filepath = os.path.join(folder, filename)
         if not os.path.exists(filepath):
-            raise("No model in path {}".format(filepath))
+            # checkpoints used to be written with their extension changed to .h5
+            filepath = os.path.join(folder, filename.split(".")[0] + ".h5")
+        if not os.path.exists(filepath):
+            raise FileNotFoundError("No model in path {}".format(filepath))
 
         self.nnet.model.load_weights(filepath)
@@ -0,0 +1,85 @@
+'''
+Bitboard move generation for Othello boards of size n <= 8.
+
+A side is a Python int with bit n*x+y set if it has a piece on square (x,y),
+so that bit indices and action indices coincide. Move generation and flips
+shift whole bitboards along the 8 directions with Kogge-Stone occluded fills
+(log2(n) shift-and-mask steps per direction) instead of walking squares.
+'''
+import numpy as np
+
+
+class Bitboard():
+
+    def __init__(self, n):
+        assert n <= 8, 'bitboards hold at most 8x8 squares'
+        self.n = n
+        self.full = (1 << n * n) - 1
+        first_col = sum(1 << (x * n) for x in range(n))
+        last_col = first_col << (n - 1)
+
+        # (shift, mask of the squares a shifted piece may land on): moving
+        # along y wraps around the row ends, so y+1 must not land on column 0
+        # and y-1 not on column n-1
+        self.directions = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if dx == 0 and dy == 0:
+                    continue
+                mask = self.full
+                if dy == 1:
+                    mask &= ~first_col
+                elif dy == -1:
+                    mask &= ~last_col
+                self.directions.append((dx * n + dy, mask))
+
+    def from_board(self, board, color):
+        """Returns the bitboard of the pieces of the given color."""
+        bits = np.packbits(np.asarray(board).reshape(-1) == color, bitorder='little')
+        return int.from_bytes(bits.tobytes(), 'little')
+
+    def to_mask(self, bits):
+        """Returns the bitboard as a 0/1 vector of length n*n."""
+        data = np.frombuffer(bits.to_bytes(8, 'little'), dtype=np.uint8)
+        return np.unpackbits(data, bitorder='little')[:self.n * self.n]
+
+    def _fill(self, gen, pro, shift, mask):
+        """Kogge-Stone occluded fill: gen extended along shift through the
+        squares of pro (written out per shift sign, this is the hot loop)."""
+        pro &= mask
+        if shift > 0:
+            gen |= pro & (gen << shift)
+            pro &= pro << shift
+            gen |= pro & (gen << 2 * shift)
+            pro &= pro << 2 * shift
+            gen |= pro & (gen << 4 * shift)
+            return gen & self.full
+        shift = -shift
+        gen |= pro & (gen >> shift)
+        pro &= pro >> shift
+        gen |= pro & (gen >> 2 * shift)
+        pro &= pro >> 2 * shift
+        gen |= pro & (gen >> 4 * shift)
+        return gen
+
+    def legal_moves(self, own, opp):
+        """Returns the bitboard of the squares own may play on: empty squares
+        behind a line of opponent pieces that starts at an own piece."""
+        empty = self.full & ~(own | opp)
+        moves = 0
+        for shift, mask in self.directions:
+            line = self._fill(own, opp, shift, mask) & opp
+            moves |= (line << shift if shift > 0 else line >> -shift) & mask
+        return moves & empty
+
+    def flips(self, own, opp, move):
+        """Returns the bitboard of the opponent pieces flipped by own playing
+        on square index move."""
+        square = 1 << int(move)
+        flipped = 0
+        for shift, mask in self.directions:
+            line = self._fill(square, opp, shift, mask) & opp
+            end = line | square
+            if (end << shift if shift > 0 else end >> -shift) & mask & own:
+                flipped |= line
+        return flipped
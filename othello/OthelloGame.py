@@ -3,6 +3,7 @@ import sys
 sys.path.append('..')
 from Game import Game
 from .OthelloLogic import Board
+from .OthelloBitboard import Bitboard
 import numpy as np
 
 class OthelloGame(Game):
@@ -18,6 +19,8 @@ class OthelloGame(Game):
 
     def __init__(self, n):
         self.n = n
+        # move generation and flips run on bitboards, Board is only used to set up the initial position
+        self.bitboard = Bitboard(n)
 
     def getInitBoard(self):
         # return initial board (numpy board)
@@ -37,35 +40,36 @@ class OthelloGame(Game):
         # action must be a valid move
         if action == self.n*self.n:
             return (board, -player)
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        move = (int(action/self.n), action%self.n)
-        b.execute_move(move, player)
-        return (b.pieces, -player)
+        own = self.bitboard.from_board(board, player)
+        opp = self.bitboard.from_board(board, -player)
+        flips = self.bitboard.flips(own, opp, action)
+        assert flips
+        pieces = np.copy(board)
+        pieces.reshape(-1)[self.bitboard.to_mask(flips | (1 << int(action))).astype(bool)] = player
+        return (pieces, -player)
 
     def getValidMoves(self, board, player):
         # return a fixed size binary vector
-        valids = [0]*self.getActionSize()
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        legalMoves =  b.get_legal_moves(player)
-        if len(legalMoves)==0:
-            valids[-1]=1
-            return np.array(valids)
-        for x, y in legalMoves:
-            valids[self.n*x+y]=1
-        return np.array(valids)
+        own = self.bitboard.from_board(board, player)
+        opp = self.bitboard.from_board(board, -player)
+        valids = np.zeros(self.getActionSize(), dtype=int)
+        moves = self.bitboard.legal_moves(own, opp)
+        if moves == 0:
+            valids[-1] = 1
+            return valids
+        valids[:-1] = self.bitboard.to_mask(moves)
+        return valids
 
     def getGameEnded(self, board, player):
         # return 0 if not ended, 1 if player 1 won, -1 if player 1 lost
         # player = 1
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        if b.has_legal_moves(player):
+        own = self.bitboard.from_board(board, player)
+        opp = self.bitboard.from_board(board, -player)
+        if self.bitboard.legal_moves(own, opp):
             return 0
-        if b.has_legal_moves(-player):
+        if self.bitboard.legal_moves(opp, own):
             return 0
-        if b.countDiff(player) > 0:
+        if self.getScore(board, player) > 0:
             return 1
         return -1
 
@@ -90,16 +94,18 @@ class OthelloGame(Game):
         return l
 
     def stringRepresentation(self, board):
-        return board.tostring()
+        return board.tobytes()
+
+    def getPlyCount(self, board):
+        # every move adds one stone to the four initial ones (passes are not counted)
+        return int(np.count_nonzero(board)) - 4
 
     def stringRepresentationReadable(self, board):
         board_s = "".join(self.square_content[square] for row in board for square in row)
         return board_s
 
     def getScore(self, board, player):
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        return b.countDiff(player)
+        return int(player * np.sum(board))
 
     @staticmethod
     def display(board):
@@ -1,3 +1,5 @@
+import copy
+import logging
 import os
 import sys
 import time
@@ -8,22 +10,40 @@ from tqdm import tqdm
 sys.path.append('../../')
 from utils import *
 from NeuralNet import NeuralNet
+from SharedWeights import SharedWeights
 
 import torch
 import torch.optim as optim
 
 from .OthelloNNet import OthelloNNet as onnet
 
+log = logging.getLogger(__name__)
+
 args = dotdict({
     'lr': 0.001,
     'dropout': 0.3,
     'epochs': 10,
     'batch_size': 64,
+    'accumulation_steps': 1,    # mini-batches per optimizer step, effective batch = batch_size * accumulation_steps
+    'lr_decay': 1.0,            # multiplicative learning rate decay applied after every call to train()
+    'bf16': True,               # train under bfloat16 autocast when the device supports it
     'cuda': torch.cuda.is_available(),
     'num_channels': 512,
 })
 
 
+def bf16_supported():
+    """
+    Returns True if the training device has native bfloat16 support (AVX512-BF16/AMX on CPU, Ampere+ on GPU).
+    """
+    if args.cuda:
+        return torch.cuda.is_bf16_supported()
+    try:
+        return torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
 class NNetWrapper(NeuralNet):
     def __init__(self, game):
         self.nnet = onnet(game, args)
@@ -33,47 +53,114 @@ class NNetWrapper(NeuralNet):
         if args.cuda:
             self.nnet.cuda()
 
+        # the optimizer and its schedule live as long as the network, so Adam's moment estimates carry over
+        # from one Coach iteration to the next and are saved with the checkpoint
+        self.optimizer = optim.Adam(self.nnet.parameters(), lr=args.lr)
+        self.scheduler = optim.lr_scheduler.ExponentialLR(self.optimizer, gamma=args.lr_decay)
+        self.use_bf16 = args.bf16 and bf16_supported()
+
+    def autocast(self):
+        """
+        Context manager running the forward pass in bfloat16 if enabled, else a no-op.
+        """
+        return torch.autocast(device_type='cuda' if args.cuda else 'cpu', dtype=torch.bfloat16,
+                              enabled=self.use_bf16)
+
     def train(self, examples):
         """
-        examples: list of examples, each example is of form (board, pi, v)
+        examples: list of examples, each example is of form (board, pi, v), or (board, pi, v, count) if
+                  aggregated by ReplayBuffer, in which case their losses are weighted by count
+                  (utils.example_weights)
+
+        Returns:
+            stats: {'examples_per_sec': training throughput}, see NeuralNet.train
         """
-        optimizer = optim.Adam(self.nnet.parameters())
+        if len(examples) == 0:
+            return {}
+
+        data = self.prepare_examples(examples)
+        weights = example_weights(examples)
 
+        trained, elapsed = 0, 0.0
         for epoch in range(args.epochs):
             print('EPOCH ::: ' + str(epoch + 1))
-            self.nnet.train()
-            pi_losses = AverageMeter()
-            v_losses = AverageMeter()
-
-            batch_count = int(len(examples) / args.batch_size)
-
-            t = tqdm(range(batch_count), desc='Training Net')
-            for _ in t:
-                sample_ids = np.random.randint(len(examples), size=args.batch_size)
-                boards, pis, vs = list(zip(*[examples[i] for i in sample_ids]))
-                boards = torch.FloatTensor(np.array(boards).astype(np.float64))
-                target_pis = torch.FloatTensor(np.array(pis))
-                target_vs = torch.FloatTensor(np.array(vs).astype(np.float64))
-
-                # predict
-                if args.cuda:
-                    boards, target_pis, target_vs = boards.contiguous().cuda(), target_pis.contiguous().cuda(), target_vs.contiguous().cuda()
-
-                # compute output
-                out_pi, out_v = self.nnet(boards)
-                l_pi = self.loss_pi(target_pis, out_pi)
-                l_v = self.loss_v(target_vs, out_v)
-                total_loss = l_pi + l_v
-
-                # record loss
-                pi_losses.update(l_pi.item(), boards.size(0))
-                v_losses.update(l_v.item(), boards.size(0))
-                t.set_postfix(Loss_pi=pi_losses, Loss_v=v_losses)
-
-                # compute gradient and do SGD step
-                optimizer.zero_grad()
-                total_loss.backward()
-                optimizer.step()
+            batches = epoch_batches(len(examples), args.batch_size)
+            start = time.time()
+            self.train_epoch(data, batches, weights)
+            elapsed += time.time() - start
+            trained += sum(len(sample_ids) for sample_ids in batches)
+
+        self.scheduler.step()
+        if elapsed <= 0:
+            return {}
+        log.debug('Trained on %.1f examples/sec', trained / elapsed)
+        return {'examples_per_sec': trained / elapsed}
+
+    def train_epoch(self, data, batches, weights=None):
+        """
+        Runs one pass of gradient steps.
+
+        Input:
+            data: example arrays as returned by prepare_examples
+            batches: list of arrays of example indices, one per mini-batch
+            weights: optional per-example loss weights (utils.example_weights)
+
+        Returns:
+            pi_losses, v_losses: AverageMeters of the policy and value losses
+        """
+        boards, pis, vs = data
+        accumulation_steps = max(1, args.accumulation_steps)
+
+        self.nnet.train()
+        pi_losses = AverageMeter()
+        v_losses = AverageMeter()
+
+        self.optimizer.zero_grad()
+        t = tqdm(batches, desc='Training Net')
+        for step, sample_ids in enumerate(t):
+            batch_boards = torch.from_numpy(boards[sample_ids])
+            target_pis = torch.from_numpy(pis[sample_ids])
+            target_vs = torch.from_numpy(vs[sample_ids])
+            batch_weights = torch.from_numpy(weights[sample_ids]) if weights is not None else None
+
+            # predict
+            if args.cuda:
+                batch_boards, target_pis, target_vs = batch_boards.cuda(), target_pis.cuda(), target_vs.cuda()
+                batch_weights = batch_weights.cuda() if batch_weights is not None else None
+
+            # compute output
+            with self.autocast():
+                out_pi, out_v = self.nnet(batch_boards)
+            l_pi = self.loss_pi(target_pis, out_pi.float(), batch_weights)
+            l_v = self.loss_v(target_vs, out_v.float(), batch_weights)
+            total_loss = l_pi + l_v
+
+            # record loss
+            pi_losses.update(l_pi.item(), batch_boards.size(0))
+            v_losses.update(l_v.item(), batch_boards.size(0))
+            t.set_postfix(Loss_pi=pi_losses, Loss_v=v_losses)
+
+            # accumulate gradients, do an optimizer step every accumulation_steps mini-batches
+            (total_loss / accumulation_steps).backward()
+            if (step + 1) % accumulation_steps == 0 or step + 1 == len(batches):
+                self.optimizer.step()
+                self.optimizer.zero_grad()
+
+        return pi_losses, v_losses
+
+    def prepare_examples(self, examples):
+        """
+        Packs the examples once per call to train() into contiguous float32 arrays, so that mini-batches are
+        gathered with a single fancy index instead of re-zipping Python tuples.
+
+        Returns:
+            boards: array of shape (len(examples), board_x, board_y)
+            pis: array of shape (len(examples), action_size)
+            vs: array of shape (len(examples),)
+        """
+        boards, pis, vs = zip(*(e[:3] for e in examples))
+        return (np.asarray(boards, dtype=np.float32), np.asarray(pis, dtype=np.float32),
+                np.asarray(vs, dtype=np.float32))
 
     def predict(self, board):
         """
@@ -93,28 +180,65 @@ class NNetWrapper(NeuralNet):
         # print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
         return torch.exp(pi).data.cpu().numpy()[0], v.data.cpu().numpy()[0]
 
-    def loss_pi(self, targets, outputs):
-        return -torch.sum(targets * outputs) / targets.size()[0]
+    def loss_pi(self, targets, outputs, weights=None):
+        losses = -torch.sum(targets * outputs, dim=1)
+        return torch.mean(losses if weights is None else weights * losses)
+
+    def loss_v(self, targets, outputs, weights=None):
+        losses = (targets - outputs.view(-1)) ** 2
+        return torch.mean(losses if weights is None else weights * losses)
+
+    def snapshot(self):
+        """
+        Returns an in-memory copy of the weights and optimizer state, see NeuralNet.snapshot.
+        """
+        return copy.deepcopy({
+            'state_dict': self.nnet.state_dict(),
+            'optimizer': self.optimizer.state_dict(),
+            'scheduler': self.scheduler.state_dict(),
+        })
+
+    def restore(self, snapshot):
+        self.nnet.load_state_dict(snapshot['state_dict'])
+        self.optimizer.load_state_dict(snapshot['optimizer'])
+        self.scheduler.load_state_dict(snapshot['scheduler'])
+
+    def share_weights(self, readers):
+        return SharedWeights(self.nnet.state_dict(), readers)
+
+    def publish_weights(self, shared, snapshot, wait=None):
+        shared.publish(snapshot['state_dict'], wait=wait)
+
+    def attach_weights(self, shared, reader):
+        self.shared = shared
+        self.shared.attach(self.nnet, reader)
 
-    def loss_v(self, targets, outputs):
-        return torch.sum((targets - outputs.view(-1)) ** 2) / targets.size()[0]
+    def refresh_weights(self):
+        return self.shared.refresh(self.nnet)
 
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         filepath = os.path.join(folder, filename)
         if not os.path.exists(folder):
             print("Checkpoint Directory does not exist! Making directory {}".format(folder))
-            os.mkdir(folder)
-        else:
-            print("Checkpoint Directory exists! ")
+            os.makedirs(folder)
+        # write to a temporary file and rename it, so readers never see a partially written checkpoint
         torch.save({
             'state_dict': self.nnet.state_dict(),
-        }, filepath)
+            'optimizer': self.optimizer.state_dict(),
+            'scheduler': self.scheduler.state_dict(),
+        }, filepath + '.tmp')
+        os.replace(filepath + '.tmp', filepath)
 
     def load_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         # https://github.com/pytorch/examples/blob/master/imagenet/main.py#L98
         filepath = os.path.join(folder, filename)
         if not os.path.exists(filepath):
-            raise ("No model in path {}".format(filepath))
+            raise FileNotFoundError("No model in path {}".format(filepath))
         map_location = None if args.cuda else 'cpu'
         checkpoint = torch.load(filepath, map_location=map_location)
         self.nnet.load_state_dict(checkpoint['state_dict'])
+        # checkpoints written before the optimizer was persisted only hold the weights
+        if 'optimizer' in checkpoint:
+            self.optimizer.load_state_dict(checkpoint['optimizer'])
+        if 'scheduler' in checkpoint:
+            self.scheduler.load_state_dict(checkpoint['scheduler'])
@@ -1,5 +1,7 @@
+from contextlib import ExitStack
+
 import Arena
-from MCTS import MCTS
+from ParallelMCTS import createMCTS
 from othello.OthelloGame import OthelloGame
 from othello.OthelloPlayers import *
 from othello.pytorch.NNet import NNetWrapper as NNet
@@ -16,39 +18,48 @@ any agent.
 mini_othello = False  # Play in 6x6 instead of the normal 8x8.
 human_vs_cpu = False
 
-if mini_othello:
-    g = OthelloGame(6)
-else:
-    g = OthelloGame(8)
 
-# all players
-rp = RandomPlayer(g).play
-gp = GreedyOthelloPlayer(g).play
-hp = HumanOthelloPlayer(g).play
+def main():
+    if mini_othello:
+        g = OthelloGame(6)
+    else:
+        g = OthelloGame(8)
+
+    # all players
+    rp = RandomPlayer(g).play
+    gp = GreedyOthelloPlayer(g).play
+    hp = HumanOthelloPlayer(g).play
 
+    # nnet players
+    n1 = NNet(g)
+    if mini_othello:
+        n1.load_checkpoint('./pretrained_models/othello/pytorch/','6x100x25_best.pth.tar')
+    else:
+        n1.load_checkpoint('./pretrained_models/othello/pytorch/','8x8_100checkpoints_best.pth.tar')
+    # parallelMode 'root' (numSearchWorkers processes) or 'tree' (numSearchThreads threads) spreads the simulations of
+    # one move over several cores
+    args1 = dotdict({'numMCTSSims': 50, 'cpuct':1.0, 'parallelMode': None, 'earlyStop': True})
+    searches = ExitStack()  # closes the searches after the games
+    mcts1 = searches.enter_context(createMCTS(g, n1, args1))
+    n1p = lambda x: np.argmax(mcts1.getActionProb(x, temp=0))
 
+    if human_vs_cpu:
+        player2 = hp
+    else:
+        n2 = NNet(g)
+        n2.load_checkpoint('./pretrained_models/othello/pytorch/', '8x8_100checkpoints_best.pth.tar')
+        args2 = dotdict({'numMCTSSims': 50, 'cpuct': 1.0, 'parallelMode': None, 'earlyStop': True})
+        mcts2 = searches.enter_context(createMCTS(g, n2, args2))
+        n2p = lambda x: np.argmax(mcts2.getActionProb(x, temp=0))
 
-# nnet players
-n1 = NNet(g)
-if mini_othello:
-    n1.load_checkpoint('./pretrained_models/othello/pytorch/','6x100x25_best.pth.tar')
-else:
-    n1.load_checkpoint('./pretrained_models/othello/pytorch/','8x8_100checkpoints_best.pth.tar')
-args1 = dotdict({'numMCTSSims': 50, 'cpuct':1.0})
-mcts1 = MCTS(g, n1, args1)
-n1p = lambda x: np.argmax(mcts1.getActionProb(x, temp=0))
+        player2 = n2p  # Player 2 is neural network if it's cpu vs cpu.
 
-if human_vs_cpu:
-    player2 = hp
-else:
-    n2 = NNet(g)
-    n2.load_checkpoint('./pretrained_models/othello/pytorch/', '8x8_100checkpoints_best.pth.tar')
-    args2 = dotdict({'numMCTSSims': 50, 'cpuct': 1.0})
-    mcts2 = MCTS(g, n2, args2)
-    n2p = lambda x: np.argmax(mcts2.getActionProb(x, temp=0))
+    arena = Arena.Arena(n1p, player2, g, display=OthelloGame.display)
 
-    player2 = n2p  # Player 2 is neural network if it's cpu vs cpu.
+    with searches:
+        print(arena.playGames(2, verbose=True))
 
-arena = Arena.Arena(n1p, player2, g, display=OthelloGame.display)
 
-print(arena.playGames(2, verbose=True))
+if __name__ == "__main__":
+    # the root-parallel search starts spawn processes, which re-import this script
+    main()
@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+
+import fuzz
+from ninemensmorris.NineMensMorrisGame import NineMensMorrisGame
+
+
+class CornerBugMorrisGame(NineMensMorrisGame):
+    """
+    NineMensMorrisGame that declares a draw as soon as stones are placed on both corners 0 and 2 of the outer
+    square.
+    """
+
+    def getGameEnded(self, board, player):
+        if board[0][0] != 0 and board[0][2] != 0 and board[4][0] < 18:
+            return 0.0001
+        return super().getGameEnded(board, player)
+
+
+class TestFuzz(unittest.TestCase):
+
+    def test_pairs_agree(self):
+        for name, make_pair in fuzz.PAIRS.items():
+            pair = make_pair()
+            for seed in range(2):
+                actions, mismatch = fuzz.play(pair, seed, 100)
+                self.assertIsNone(mismatch, name)
+                self.assertGreater(len(actions), 0)
+
+    def test_failure_is_minimized(self):
+        """
+        A failing game is shrunk to the two placements on the corners.
+        """
+        pair = fuzz.Pair(NineMensMorrisGame(), CornerBugMorrisGame(), None)
+        played, mismatch = fuzz.play(pair, 1, 100)
+        self.assertIsNotNone(mismatch)
+        self.assertEqual(mismatch.check, 'getGameEnded')
+        self.assertGreater(len(played), 2)
+
+        actions, mismatch = fuzz.minimize(pair, played, mismatch)
+        self.assertEqual({pair.reference.all_moves[action][1] for action in actions}, {0, 2})
+        self.assertEqual((mismatch.ply, mismatch.check), (2, 'getGameEnded'))
+        self.assertEqual(fuzz.replay(pair, actions), (actions, mismatch))
+
+
+if __name__ == '__main__':
+    unittest.main()
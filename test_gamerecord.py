@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from Coach import Coach
+from GameRecord import GameRecord, readGameRecords
+from OpeningBook import OpeningBook
+from othello.OthelloGame import OthelloGame
+from utils import dotdict
+
+
+class UniformNNet():
+
+    def __init__(self, game):
+        self.pi = np.ones(game.getActionSize()) / game.getActionSize()
+
+    def predict(self, board):
+        return self.pi, 0
+
+
+class TestGameRecord(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'games.rec')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_records_reproduce_selfplay_examples(self):
+        """
+        Self-play logs its games, and replaying the records gives back the examples of the episodes.
+        """
+        game = OthelloGame(6)
+        args = dotdict({'numMCTSSims': 10, 'cpuct': 1.0, 'tempThreshold': 1000, 'gameRecords': self.path})
+        coach = Coach(game, UniformNNet(game), args)
+        np.random.seed(0)
+        episodes = []
+        for _ in range(3):
+            coach.mcts = coach.selfPlayMCTS()
+            episodes.append(coach.executeEpisode())
+
+        records = list(readGameRecords(self.path))
+        self.assertEqual(len(records), 3)
+        for record, examples in zip(records, episodes):
+            self.assertLess(len(record.encode()), 20 * len(record))
+            replayed = record.examples(game, args.tempThreshold)
+            self.assertEqual(len(replayed), len(examples))
+            for (board, pi, v), (replayedBoard, replayedPi, replayedV) in zip(examples, replayed):
+                np.testing.assert_array_equal(board, replayedBoard)
+                np.testing.assert_allclose(pi, replayedPi)
+                self.assertEqual(v, replayedV)
+
+        book = OpeningBook.fromGameRecords(game, [self.path], plies=1, minCount=3)
+        self.assertEqual(len(book), 1)
+
+    def test_round_trip_and_truncated_log(self):
+        record = GameRecord(result=-0.0001)
+        record.add(3, [0, 0, 0, 200, 1])
+        record.add(300, np.eye(1, 400, 300, dtype=int)[0] * 70000)
+        record.add(0, [0, 0])
+        record.appendTo(self.path)
+        record.appendTo(self.path)
+        with open(self.path, 'ab') as f:
+            f.write(record.encode()[:-3])
+
+        records = list(readGameRecords(self.path))
+        self.assertEqual(len(records), 2)
+        for decoded in records:
+            self.assertEqual(decoded.actions, [3, 300, 0])
+            self.assertEqual(decoded.result, -0.0001)
+            for (visited, counts), (decodedVisited, decodedCounts) in zip(record.visits, decoded.visits):
+                np.testing.assert_array_equal(visited, decodedVisited)
+                np.testing.assert_array_equal(counts, decodedCounts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from League import League, playMatch
+from othello.OthelloGame import OthelloGame
+
+
+class FirstMoverWinsGame(OthelloGame):
+    """
+    Othello ending after the first move, won by the player who made it.
+    """
+
+    def getGameEnded(self, board, player):
+        return -1 if board.any() else 0
+
+    def getInitBoard(self):
+        return np.zeros((self.n, self.n), dtype=int)
+
+    def getNextState(self, board, player, action):
+        board = np.copy(board)
+        board[action // self.n, action % self.n] = player
+        return board, -player
+
+    def getValidMoves(self, board, player):
+        return np.ones(self.getActionSize(), dtype=int)
+
+
+class TestLeague(unittest.TestCase):
+
+    def test_fit_recovers_ratings(self):
+        """
+        Ratings fit to many games simulated from known ratings come back, relative to each other.
+        """
+        rng = np.random.RandomState(0)
+        truth = {'a': 0, 'b': 100, 'c': 200, 'd': 400}
+        league = League(prior=0.1)
+        names = list(truth)
+        for i, a in enumerate(names):
+            for b in names[i + 1:]:
+                p = 1 / (1 + 10 ** ((truth[b] - truth[a]) / 400))
+                winsA = rng.binomial(2000, p)
+                league.addResult(a, b, winsA, 2000 - winsA, 0)
+        for name in names[1:]:
+            self.assertAlmostEqual(league.rating(name) - league.rating('a'), truth[name] - truth['a'], delta=30)
+            self.assertLess(league.stderr(name), 15)
+
+    def test_select_prefers_new_and_close_players(self):
+        league = League()
+        league.addResult('checkpoint_1.pth.tar', 'checkpoint_2.pth.tar', 30, 10, 10)
+        league.addResult('checkpoint_2.pth.tar', 'checkpoint_3.pth.tar', 25, 25, 10)
+        league.addResult('checkpoint_1.pth.tar', 'checkpoint_3.pth.tar', 40, 10, 0)
+        league.addPlayer('checkpoint_4.pth.tar')
+        pair = league.selectPair()
+        self.assertIn('checkpoint_4.pth.tar', pair)
+        self.assertNotEqual(league.selectPair(busy={pair}), pair)
+        self.assertEqual(league.selectPair(focus={'checkpoint_2.pth.tar'}),
+                         ('checkpoint_2.pth.tar', 'checkpoint_4.pth.tar'))
+        self.assertIsNone(League().selectPair())
+
+    def test_save_and_load(self):
+        league = League()
+        league.addResult('b', 'a', 3, 1, 2)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'league.json')
+            league.save(path)
+            loaded = League.load(path)
+        self.assertEqual(loaded.results, {('a', 'b'): [1, 3, 2]})
+        self.assertAlmostEqual(loaded.rating('b'), league.rating('b'))
+        self.assertGreater(loaded.rating('b'), loaded.rating('a'))
+
+    def test_match_swaps_sides(self):
+        """
+        Every opening is played with either player starting: in a game won by the starting player, the match is
+        split evenly.
+        """
+        game = FirstMoverWinsGame(4)
+        result = playMatch(game, lambda board: 0, lambda board: 1, 6, 0, np.random.RandomState(0))
+        self.assertEqual(result, (3, 3, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
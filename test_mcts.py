@@ -0,0 +1,481 @@
+"""
+Tests for MCTS: the iterative search must visit, back up and choose exactly like the recursive formulation it
+replaced, which is kept here as the reference.
+"""
+
+import math
+import os
+import pickle
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from BatchedSelfPlay import BatchedSelfPlay
+from Coach import Coach
+from EvaluationCache import EvaluationCache
+from GameRecord import readGameRecords
+from MCTS import MCTS, EPS
+from Metrics import Metrics
+from OpeningBook import OpeningBook
+from ParallelMCTS import RootParallelMCTS, TreeParallelMCTS, createMCTS
+from Reanalyse import BatchedMCTS, Reanalyser
+from ninemensmorris.NineMensMorrisBatch import NineMensMorrisBatch
+from ninemensmorris.NineMensMorrisGame import NineMensMorrisGame
+from utils import dotdict
+
+
+class RecursiveMCTS(MCTS):
+    """
+    The original recursive search.
+    """
+
+    def search(self, canonicalBoard):
+        s = self.game.stringRepresentation(canonicalBoard)
+
+        if s not in self.Es:
+            self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
+        if self.Es[s] != 0:
+            return -self.Es[s]
+
+        if s not in self.Ps:
+            self.Ps[s], v = self.nnet.predict(canonicalBoard)
+            valids = self.game.getValidMoves(canonicalBoard, 1)
+            self.Ps[s] = self.Ps[s] * valids
+            sum_Ps_s = np.sum(self.Ps[s])
+            if sum_Ps_s > 0:
+                self.Ps[s] /= sum_Ps_s
+            else:
+                self.Ps[s] = self.Ps[s] + valids
+                self.Ps[s] /= np.sum(self.Ps[s])
+            self.Vs[s] = valids
+            self.Ns[s] = 0
+            return -v
+
+        valids = self.Vs[s]
+        cur_best = -float('inf')
+        best_act = -1
+        for a in range(self.game.getActionSize()):
+            if valids[a]:
+                if (s, a) in self.Qsa:
+                    u = self.Qsa[(s, a)] + self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s]) / (
+                            1 + self.Nsa[(s, a)])
+                else:
+                    u = self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s] + EPS)
+                if u > cur_best:
+                    cur_best = u
+                    best_act = a
+
+        a = best_act
+        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
+        next_s = self.game.getCanonicalForm(next_s, next_player)
+
+        v = self.search(next_s)
+
+        if (s, a) in self.Qsa:
+            self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
+            self.Nsa[(s, a)] += 1
+        else:
+            self.Qsa[(s, a)] = v
+            self.Nsa[(s, a)] = 1
+
+        self.Ns[s] += 1
+        return -v
+
+
+class HashNNet():
+    """
+    Deterministic network: policy and value are pseudo-random functions of the board.
+    """
+
+    def __init__(self, game):
+        self.game = game
+
+    def snapshot(self):
+        return None
+
+    def restore(self, snapshot):
+        pass
+
+    def predict(self, board):
+        rng = np.random.RandomState(zlib.crc32(np.ascontiguousarray(board).tobytes()))
+        pi = rng.rand(self.game.getActionSize())
+        return pi / pi.sum(), rng.rand() * 2 - 1
+
+    def predict_batch(self, boards):
+        pis, vs = zip(*(self.predict(board) for board in boards))
+        return np.array(pis), np.array(vs)
+
+
+class SubtractionGame():
+    """
+    Take 1 to 3 stones from a pile; whoever takes the last stone wins. Long games exercise deep search paths.
+    """
+
+    def __init__(self, stones):
+        self.stones = stones
+
+    def getInitBoard(self):
+        return np.array([self.stones])
+
+    def getActionSize(self):
+        return 3
+
+    def getNextState(self, board, player, action):
+        return np.array([board[0] - action - 1]), -player
+
+    def getValidMoves(self, board, player):
+        return np.array([int(board[0] > a) for a in range(3)])
+
+    def getGameEnded(self, board, player):
+        return -1 if board[0] == 0 else 0  # the previous player took the last stone
+
+    def getCanonicalForm(self, board, player):
+        return board
+
+    def stringRepresentation(self, board):
+        return board.tobytes()
+
+    def getSymmetries(self, board, pi):
+        return [(board, pi)]
+
+    def getBatchEngine(self):
+        return None
+
+
+class TestMCTS(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.morris = NineMensMorrisGame()
+
+    def assertSameSearch(self, game, board, sims):
+        args = dotdict({'numMCTSSims': sims, 'cpuct': 1.0})
+        reference = RecursiveMCTS(game, HashNNet(game), args)
+        mcts = MCTS(game, HashNNet(game), args)
+
+        self.assertEqual(reference.getActionProb(board, temp=1), mcts.getActionProb(board, temp=1))
+        self.assertEqual(reference.Nsa, mcts.Nsa)
+        self.assertEqual(reference.Qsa, mcts.Qsa)
+        self.assertEqual(reference.Ns, mcts.Ns)
+        self.assertEqual(reference.search(board), mcts.search(board))
+
+    def test_subtraction_game_matches_recursive_search(self):
+        game = SubtractionGame(40)
+        self.assertSameSearch(game, game.getInitBoard(), 400)
+
+    def test_morris_matches_recursive_search(self):
+        game = self.morris
+        board, player = game.getInitBoard(), 1
+        rng = np.random.RandomState(0)
+        for _ in range(30):
+            action = rng.choice(np.flatnonzero(game.getValidMoves(game.getCanonicalForm(board, player), 1)))
+            board, player = game.getNextState(board, player, action)
+        self.assertSameSearch(game, game.getCanonicalForm(board, player), 100)
+
+    def test_deep_search_does_not_recurse(self):
+        game = SubtractionGame(3000)
+        # all prior on taking one stone and a zero value: every simulation extends the same line by one ply
+        nnet = dotdict({'predict': lambda board: (np.array([1., 0., 0.]), 0)})
+        mcts = MCTS(game, nnet, dotdict({'numMCTSSims': 2000, 'cpuct': 1.0}))
+        mcts.getActionProb(game.getInitBoard())
+        self.assertEqual(len(mcts.Ns), 2000)
+        self.assertEqual(mcts.Nsa[(np.array([3000 - 1998]).tobytes(), 0)], 1)
+
+
+    def test_single_thread_tree_parallel_matches_sequential_search(self):
+        game = SubtractionGame(40)
+        args = dotdict({'numMCTSSims': 300, 'cpuct': 1.0, 'numSearchThreads': 1, 'virtualLoss': 3})
+        reference = MCTS(game, HashNNet(game), args)
+        with TreeParallelMCTS(game, HashNNet(game), args) as mcts:
+            self.assertEqual(reference.getActionProb(game.getInitBoard()), mcts.getActionProb(game.getInitBoard()))
+        self.assertEqual(reference.Qsa, mcts.Qsa)
+
+    def test_tree_parallel_runs_all_simulations(self):
+        game = SubtractionGame(40)
+        args = dotdict({'numMCTSSims': 301, 'cpuct': 1.0, 'numSearchThreads': 4, 'numLockStripes': 2})
+        with TreeParallelMCTS(game, HashNNet(game), args) as mcts:
+            mcts.getActionProb(game.getInitBoard())
+        self.assertEqual(mcts.Ns[game.getInitBoard().tobytes()], 300)  # the first simulation expands the root
+        self.assertFalse(any(mcts.VLsa.values()))
+
+    def test_close_shuts_the_search_threads_down(self):
+        game = SubtractionGame(40)
+        args = dotdict({'numMCTSSims': 50, 'cpuct': 1.0, 'numSearchThreads': 2, 'parallelMode': 'tree'})
+        with createMCTS(game, HashNNet(game), args) as mcts:
+            mcts.getActionProb(game.getInitBoard())
+            threads = list(mcts.pool._threads)
+        self.assertTrue(threads)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        with self.assertRaises(RuntimeError):
+            mcts.getActionProb(np.array([30]))
+
+        args['parallelMode'] = None
+        with createMCTS(game, HashNNet(game), args) as mcts:  # the sequential search has nothing to close
+            mcts.getActionProb(game.getInitBoard())
+
+    def test_root_parallel_merges_worker_counts(self):
+        game = SubtractionGame(40)
+        board = game.getInitBoard()
+        args = dotdict({'numMCTSSims': 200, 'cpuct': 1.0, 'numSearchWorkers': 1})
+        reference = MCTS(game, HashNNet(game), args)
+        with RootParallelMCTS(game, HashNNet(game), args) as mcts:
+            self.assertEqual(reference.getActionProb(board), mcts.getActionProb(board))
+
+        args["numSearchWorkers"] = 2
+        with RootParallelMCTS(game, HashNNet(game), args) as mcts:
+            mcts.getActionProb(board)
+            # each worker's first simulation only expands its root
+            self.assertEqual(sum(mcts.getVisitCounts(board)), 198)
+
+
+    def test_forced_move_returns_without_search(self):
+        game = SubtractionGame(1)
+        mcts = MCTS(game, HashNNet(game), dotdict({'numMCTSSims': 100, 'cpuct': 1.0}))
+        self.assertEqual(mcts.getActionProb(game.getInitBoard(), temp=1), [1, 0, 0])
+        self.assertEqual(mcts.Ps, {})
+
+    def test_early_stop_keeps_the_chosen_action(self):
+        game = SubtractionGame(40)
+        board = game.getInitBoard()
+        args = dotdict({'numMCTSSims': 400, 'cpuct': 1.0})
+        full = MCTS(game, HashNNet(game), args)
+        probs = full.getActionProb(board, temp=0)
+
+        args = dotdict({'numMCTSSims': 400, 'cpuct': 1.0, 'earlyStop': True, 'searchCheckInterval': 5})
+        metrics = Metrics()
+        mcts = MCTS(game, HashNNet(game), args, metrics=metrics)
+        self.assertEqual(mcts.getActionProb(board, temp=0), probs)
+        self.assertLess(sum(mcts.getVisitCounts(board)), 399)
+        self.assertEqual(metrics.counters['mcts.early_stops'], 1)
+        self.assertNotIn('mcts.budget_stops', metrics.counters)
+
+    def test_time_budget_stops_search(self):
+        game = SubtractionGame(3000)
+        args = dotdict({'numMCTSSims': 10 ** 6, 'cpuct': 1.0, 'timeBudget': 0.2})
+        metrics = Metrics()
+        mcts = MCTS(game, HashNNet(game), args, metrics=metrics)
+        start = time.perf_counter()
+        mcts.getActionProb(game.getInitBoard())
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertEqual(metrics.counters['mcts.budget_stops'], 1)
+        self.assertNotIn('mcts.early_stops', metrics.counters)
+
+        # a budget that runs out with the last simulations is not a stop
+        args = dotdict({'numMCTSSims': 20, 'cpuct': 1.0, 'timeBudget': 0.0, 'searchCheckInterval': 10})
+        mcts = MCTS(game, HashNNet(game), args)
+        self.assertEqual(mcts.runSimulations(game.getInitBoard(), 1, time.perf_counter()), (10, 'budget'))
+        args['searchCheckInterval'] = 20
+        self.assertEqual(mcts.runSimulations(game.getInitBoard(), 1, time.perf_counter()), (20, None))
+
+
+    def test_evaluation_cache_is_transparent(self):
+        game = SubtractionGame(40)
+        board = game.getInitBoard()
+        args = dotdict({'numMCTSSims': 200, 'cpuct': 1.0})
+        cache = EvaluationCache(maxsize=1000, version=3)
+
+        reference = MCTS(game, HashNNet(game), args)
+        first = MCTS(game, HashNNet(game), args, cache=cache, cacheVersion=3)
+        second = MCTS(game, HashNNet(game), args, cache=cache, cacheVersion=3)
+        probs = reference.getActionProb(board)
+        self.assertEqual(first.getActionProb(board), probs)
+        self.assertEqual(cache.stats()['hits'], 0)
+        self.assertEqual(second.getActionProb(board), probs)
+        self.assertEqual(cache.stats()['misses'], len(reference.Ps))
+        self.assertEqual(cache.stats()['hits'], len(reference.Ps))
+
+        stale = MCTS(game, HashNNet(game), args, cache=cache, cacheVersion=2)
+        stale.getActionProb(board)
+        self.assertEqual(cache.stats()['hits'], len(reference.Ps))
+
+    def test_evaluation_cache_evicts_least_recently_used(self):
+        cache = EvaluationCache(maxsize=2)
+        cache.put(0, 'a', 1)
+        cache.put(0, 'b', 2)
+        cache.get(0, 'a')
+        cache.put(0, 'c', 3)
+        self.assertIsNone(cache.get(0, 'b'))
+        self.assertEqual(cache.get(0, 'a'), 1)
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1, 'a'))
+        cache.put(0, 'a', 1)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_evaluation_cache_is_thread_safe(self):
+        """
+        Threads looking up and inserting keys of a small cache concurrently never fail and count every lookup once,
+        even if the threads switch between the lookup of an entry and its LRU update, where other threads may
+        evict it.
+        """
+
+        class SlowEntries(OrderedDict):
+            def get(self, key, default=None):
+                entry = super().get(key, default)
+                time.sleep(0.0001)  # let the other threads run
+                return entry
+
+        cache = EvaluationCache(maxsize=8)
+        cache.entries = SlowEntries()
+        errors = []
+
+        def work(seed):
+            rng = np.random.RandomState(seed)
+            try:
+                for key in rng.randint(16, size=500):
+                    if cache.get(0, key) is None:
+                        cache.put(0, key, key)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(seed,)) for seed in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        stats = cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 8 * 500)
+        self.assertLessEqual(stats['size'], 8)
+
+
+    def test_opening_book_replaces_or_shortens_search(self):
+        game = SubtractionGame(40)
+        board = game.getInitBoard()
+        book = OpeningBook(game.getActionSize())
+        book.add(game.stringRepresentation(board), [0.5, 0.5, 0.])
+        book.add(game.stringRepresentation(board), [0., 1., 0.])
+        book.finalize()
+
+        mcts = MCTS(game, HashNNet(game), dotdict({'numMCTSSims': 100, 'cpuct': 1.0}), book=book)
+        self.assertEqual(mcts.getActionProb(board, temp=1), [0.25, 0.75, 0.])
+        self.assertEqual(mcts.Ns, {})
+
+        mcts = MCTS(game, HashNNet(game), dotdict({'numMCTSSims': 100, 'cpuct': 1.0, 'bookMix': 0.5}), book=book)
+        probs = mcts.getActionProb(board, temp=1)
+        self.assertEqual(mcts.Ns[game.stringRepresentation(board)], 49)
+        self.assertAlmostEqual(sum(probs), 1.)
+
+    def test_opening_book_covers_the_opening_only(self):
+        """
+        A book built from examples keeps the recurring positions of its first plies, not recurring later ones,
+        and is not consulted after them.
+        """
+        game = NineMensMorrisGame()
+        board = game.getInitBoard()
+        late = np.copy(board)
+        late[:4] = 0
+        late[0][:3], late[1][:3], late[4][0] = 1, -1, 18
+        pi = np.ones(game.getActionSize()) / game.getActionSize()
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'checkpoint_1.pth.tar.examples')
+            with open(path, 'wb') as f:
+                pickle.dump([[(board, pi, 0), (late, pi, 0)] * 2], f)
+            book = OpeningBook.fromExamples(game, [path], plies=4)
+            book.save(os.path.join(folder, 'book.pkl'))
+            self.assertEqual(OpeningBook.load(os.path.join(folder, 'book.pkl')).plies, 4)
+        self.assertEqual(len(book), 1)
+        self.assertIsNotNone(book.lookup(game.stringRepresentation(board), game.getPlyCount(board)))
+
+        book.add(game.stringRepresentation(late), pi)
+        book.finalize()
+        self.assertIsNone(book.lookup(game.stringRepresentation(late), game.getPlyCount(late)))
+        mcts = MCTS(game, HashNNet(game), dotdict({'numMCTSSims': 10, 'cpuct': 1.0}), book=book)
+        mcts.getActionProb(late, temp=1)
+        self.assertIn(game.stringRepresentation(late), mcts.Ns)
+
+    def test_batched_search_of_one_root_matches_sequential_search(self):
+        game = SubtractionGame(40)
+        board = game.getInitBoard()
+        args = dotdict({'numMCTSSims': 200, 'cpuct': 1.0})
+        reference = MCTS(game, HashNNet(game), args)
+        reference.simulate(board, 200)
+        mcts = BatchedMCTS(game, HashNNet(game), args)
+        mcts.simulateBatch([board], 200)
+        self.assertEqual(reference.Nsa, mcts.Nsa)
+        self.assertEqual(reference.Qsa, mcts.Qsa)
+        self.assertEqual(reference.Ns, mcts.Ns)
+
+    def test_batched_self_play_of_one_game_matches_execute_episode(self):
+        game = SubtractionGame(30)
+        args = dotdict({'numMCTSSims': 25, 'cpuct': 1.0, 'tempThreshold': 4})
+        coach = Coach(game, HashNNet(game), args, selfPlayOnly=True)
+        for seed in range(5):
+            np.random.seed(seed)
+            coach.mcts = coach.selfPlayMCTS()
+            reference = coach.executeEpisode()
+            np.random.seed(seed)
+            [examples] = BatchedSelfPlay(game, HashNNet(game), args).playEpisodes(1)
+
+            self.assertEqual(len(examples), len(reference))
+            for (board, pi, v), (referenceBoard, referencePi, referenceV) in zip(examples, reference):
+                np.testing.assert_array_equal(board, referenceBoard)
+                self.assertEqual(pi, referencePi)
+                self.assertEqual(v, referenceV)
+
+    def test_batched_self_play_steps_morris_games_with_the_batch_engine(self):
+        """
+        The games stepped by NineMensMorrisBatch replay through NineMensMorrisGame to the same examples.
+        """
+        game = self.morris
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'games.rec')
+            args = dotdict({'numMCTSSims': 3, 'cpuct': 1.0, 'tempThreshold': 1000, 'gameRecords': path})
+            selfPlay = BatchedSelfPlay(game, HashNNet(game), args)
+            self.assertIsInstance(selfPlay.engine, NineMensMorrisBatch)
+            np.random.seed(0)
+            episodes = selfPlay.playEpisodes(4)
+            records = list(readGameRecords(path))
+
+        # records are appended in the order the games end
+        replayed = [record.examples(game, 1000) for record in records]
+        self.assertEqual(len(episodes), 4)
+        self.assertEqual(len(replayed), 4)
+        for examples in episodes:
+            self.assertTrue(any(len(examples) == len(other) and
+                                all(np.array_equal(board, otherBoard) and np.allclose(pi, otherPi) and v == otherV
+                                    for (board, pi, v), (otherBoard, otherPi, otherV) in zip(examples, other))
+                                for other in replayed))
+
+    def test_reanalyse_refreshes_sampled_examples_in_place(self):
+        game = SubtractionGame(40)
+        args = dotdict({'numMCTSSims': 30, 'cpuct': 1.0, 'reanalyseBatchSize': 4})
+        uniform = np.ones(3) / 3
+        history = [[(np.array([n]), uniform, 1, 2) for n in range(1, 20)],
+                   [(np.array([n]), uniform, -1) for n in range(20, 30)]]
+        old = [list(examples) for examples in history]
+        reanalyser = Reanalyser(game, HashNNet(game), args)
+        np.random.seed(0)
+        self.assertEqual(reanalyser.reanalyse(history, 10), 10)
+
+        refreshed = 0
+        for examples, oldExamples in zip(history, old):
+            for example, oldExample in zip(examples, oldExamples):
+                if example is oldExample:
+                    continue
+                refreshed += 1
+                board, pi, v = example[:3]
+                self.assertIs(board, oldExample[0])
+                self.assertEqual(example[2:], oldExample[2:])  # value and count kept
+                self.assertAlmostEqual(pi.sum(), 1)
+                self.assertFalse(np.any((pi > 0) & (game.getValidMoves(board, 1) == 0)))
+        self.assertEqual(refreshed, 10)
+
+        # in the background, granted positions are worked off, except in the latest iteration
+        latest = list(history[-1])
+        reanalyser.start(history)
+        reanalyser.grant(6)
+        deadline = time.time() + 10
+        while reanalyser.refreshed < 16 and time.time() < deadline:
+            time.sleep(0.01)
+        reanalyser.stop()
+        self.assertEqual(reanalyser.refreshed, 16)
+        self.assertTrue(all(example is before for example, before in zip(history[-1], latest)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from Metrics import Metrics, TimedGame, TimedNNet
+from othello.OthelloGame import OthelloGame
+
+
+class ConstantNNet():
+
+    def __init__(self, game):
+        self.pi = np.ones(game.getActionSize()) / game.getActionSize()
+        self.name = 'constant'
+
+    def predict(self, board):
+        return self.pi, 0.5
+
+
+class TestMetrics(unittest.TestCase):
+
+    def metrics(self):
+        metrics = Metrics()
+        metrics.count('mcts.simulations', 10)
+        metrics.count('mcts.simulations', 5)
+        metrics.count('mcts.forced_moves')
+        metrics.add_time('coach.training', 1.5)
+        metrics.add_time('coach.training', 0.5)
+        metrics.gauge('cache.hit_rate', 0.25)
+        metrics.gauge('cache.hit_rate', 0.75)
+        return metrics
+
+    def test_counters_timers_and_gauges(self):
+        metrics = self.metrics()
+        with mock.patch('time.perf_counter', side_effect=[10.0, 12.5]):
+            with metrics.timer('coach.arena'):
+                pass
+        self.assertEqual(metrics.to_dict(), {
+            'counters': {'mcts.simulations': 15, 'mcts.forced_moves': 1},
+            'timers': {'coach.training': {'seconds': 2.0, 'count': 2}, 'coach.arena': {'seconds': 2.5, 'count': 1}},
+            'gauges': {'cache.hit_rate': 0.75},
+        })
+
+        # a failing section is timed as well
+        with self.assertRaises(KeyError):
+            with metrics.timer('coach.arena'):
+                raise KeyError()
+        self.assertEqual(metrics.timers['coach.arena'][1], 2)
+
+        metrics.reset()
+        self.assertEqual(metrics.to_dict(), {'counters': {}, 'timers': {}, 'gauges': {}})
+
+    def test_json_line(self):
+        line = self.metrics().to_json_line(iteration=3)
+        self.assertTrue(line.endswith('\n'))
+        record = json.loads(line)
+        self.assertEqual(record['iteration'], 3)
+        self.assertIn('time', record)
+        self.assertEqual(record['counters']['mcts.simulations'], 15)
+        self.assertEqual(record['timers']['coach.training'], {'seconds': 2.0, 'count': 2})
+
+    def test_prometheus_format(self):
+        text = self.metrics().to_prometheus(iteration=3)
+        self.assertEqual(text.splitlines(), [
+            '# TYPE alphazero_mcts_forced_moves counter',
+            'alphazero_mcts_forced_moves_total{iteration="3"} 1',
+            '# TYPE alphazero_mcts_simulations counter',
+            'alphazero_mcts_simulations_total{iteration="3"} 15',
+            '# TYPE alphazero_coach_training_seconds summary',
+            'alphazero_coach_training_seconds_sum{iteration="3"} 2.0',
+            'alphazero_coach_training_seconds_count{iteration="3"} 2',
+            '# TYPE alphazero_cache_hit_rate gauge',
+            'alphazero_cache_hit_rate{iteration="3"} 0.75',
+        ])
+
+        metrics = Metrics()
+        metrics.gauge('size', 1)
+        self.assertEqual(metrics.to_prometheus(prefix='az', run='a "b"\\c\nd').splitlines()[1],
+                         'az_size{run="a \\"b\\"\\\\c\\nd"} 1')
+        self.assertEqual(metrics.to_prometheus(prefix='az').splitlines()[1], 'az_size 1')
+
+    def test_export(self):
+        metrics = self.metrics()
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'metrics.jsonl')
+            metrics.export(path, iteration=1)
+            metrics.export(path, iteration=2)
+            with open(path) as f:
+                self.assertEqual([json.loads(line)['iteration'] for line in f], [1, 2])
+
+            path = os.path.join(folder, 'metrics.prom')
+            metrics.export(path, 'prometheus', iteration=1)
+            metrics.export(path, 'prometheus', iteration=2)
+            with open(path) as f:
+                self.assertEqual(f.read(), metrics.to_prometheus(iteration=2))
+            self.assertFalse(os.path.exists(path + '.tmp'))
+
+            with self.assertRaises(ValueError):
+                metrics.export(path, 'csv')
+
+    def test_timed_proxies(self):
+        game = OthelloGame(6)
+        metrics = Metrics()
+        timedGame = TimedGame(game, metrics)
+        timedNNet = TimedNNet(ConstantNNet(game), metrics)
+
+        board = timedGame.getInitBoard()
+        timedGame.getValidMoves(board, 1)
+        timedGame.stringRepresentation(board)
+        timedGame.stringRepresentation(board)
+        self.assertEqual(timedGame.n, game.n)  # attributes are passed through untimed
+        pi, v = timedNNet.predict(board)
+        timedNNet.predict(board)
+
+        self.assertEqual(metrics.timers['mcts.rules'][1], 2)
+        self.assertEqual(metrics.timers['mcts.hash'][1], 2)
+        self.assertEqual(metrics.timers['mcts.inference'][1], 2)
+        self.assertEqual(metrics.counters, {'mcts.nnet_calls': 2})
+        self.assertEqual(v, 0.5)
+        self.assertEqual(timedNNet.name, 'constant')
+        with self.assertRaises(AttributeError):
+            timedGame._board
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,260 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from ninemensmorris.NineMensMorrisBatch import NineMensMorrisBatch
+from ninemensmorris.NineMensMorrisGame import NineMensMorrisGame
+from ninemensmorris.NineMensMorrisLogic import Board
+from ninemensmorris.NineMensMorrisState import MorrisState
+from ninemensmorris.NineMensMorrisTables import MILL_PARTNERS, MILLS, NEIGHBOURS
+from ninemensmorris.NineMensMorrisTablebase import Tablebase, generate, save
+from ninemensmorris2.NineMensMorrisGame2 import NineMensMorrisGame as NineMensMorrisGame2
+from ninemensmorris2.NineMensMorrisLogic2 import from_core_board, to_core_board
+
+
+class TestNineMensMorris(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.game = NineMensMorrisGame()
+
+    def test_symmetries_keep_fractional_probabilities(self):
+        """
+        The rotated policies are permutations of pi, also for policies that are not one-hot.
+        """
+        game = self.game
+        board = game.getNextState(game.getInitBoard(), 1, 0)[0]
+        uniform = np.ones(game.getActionSize()) / game.getActionSize()
+        for _, rotated_pi in game.getSymmetries(board, uniform):
+            self.assertAlmostEqual(rotated_pi.sum(), 1)
+            np.testing.assert_allclose(rotated_pi, uniform)
+
+        pi = np.random.RandomState(0).rand(game.getActionSize())
+        pi /= pi.sum()
+        for _, rotated_pi in game.getSymmetries(board, pi):
+            np.testing.assert_allclose(np.sort(rotated_pi), np.sort(pi))
+
+    def test_tables(self):
+        """
+        Checks the shared tables against the position arithmetic of the board: corners (even index) form mills
+        along their zone, middles (odd index) along their zone and across the zones.
+        """
+        self.assertEqual(len(MILLS), 16)
+        for position in range(24):
+            zone, index = divmod(position, 8)
+            if index % 2 == 0:
+                expected = {((index + 1) % 8 + zone * 8, (index + 2) % 8 + zone * 8),
+                            ((index - 1) % 8 + zone * 8, (index - 2) % 8 + zone * 8)}
+            else:
+                cross = tuple(zone_other * 8 + index for zone_other in range(3) if zone_other != zone)
+                expected = {((index - 1) % 8 + zone * 8, (index + 1) % 8 + zone * 8), cross}
+            self.assertEqual({tuple(sorted(partners)) for partners in MILL_PARTNERS[position]},
+                             {tuple(sorted(partners)) for partners in expected})
+
+            # neighbours are the positions next to each other on a mill line, and connections go both ways
+            for neighbour in NEIGHBOURS[position]:
+                self.assertIn(position, NEIGHBOURS[neighbour])
+                self.assertTrue(any(abs(mill.index(position) - mill.index(neighbour)) == 1
+                                    for mill in MILLS if position in mill and neighbour in mill))
+            self.assertEqual(len(NEIGHBOURS[position]), 2 if index % 2 == 0 else 3 if zone != 1 else 4)
+
+    def test_batch_engine_matches_game(self):
+        """
+        Plays random games in a batch and compares every result of the vectorized engine with the scalar one.
+        """
+        game, engine = self.game, NineMensMorrisBatch(self.game)
+        rng = np.random.RandomState(0)
+        size = 16
+        boards, players = engine.getInitBoards(size), np.ones(size, dtype=int)
+        finished = 0
+
+        for _ in range(150):
+            valids = engine.getValidMoves(boards, players)
+            results = engine.getGameEnded(boards, players)
+            canonical = engine.getCanonicalForm(boards, players)
+            for i in range(size):
+                np.testing.assert_array_equal(valids[i], game.getValidMoves(boards[i], players[i]))
+                self.assertEqual(results[i], game.getGameEnded(boards[i], players[i]))
+                np.testing.assert_array_equal(canonical[i], game.getCanonicalForm(boards[i], players[i]))
+
+            actions = np.array([rng.choice(np.flatnonzero(v)) if v.any() else 0 for v in valids])
+            nextBoards, nextPlayers = engine.getNextState(boards, players, actions)
+            for i in np.flatnonzero(results == 0):
+                board, player = game.getNextState(boards[i], players[i], actions[i])
+                np.testing.assert_array_equal(nextBoards[i], board)
+                self.assertEqual(nextPlayers[i], player)
+
+            # restart finished games
+            ended = results != 0
+            finished += ended.sum()
+            nextBoards[ended], nextPlayers[ended] = engine.getInitBoards(ended.sum()), 1
+            boards, players = nextBoards, nextPlayers
+
+        self.assertGreater(finished, 0)
+
+    def test_mill_stones(self):
+        """
+        The mill stones a Board caches are those of its mills, also for a Board kept across execute_move.
+        """
+        game = self.game
+        rng = np.random.RandomState(1)
+        for _ in range(5):
+            b, player = Board(game.getInitBoard()), 1
+            while game.getGameEnded(b.pieces, player) == 0:
+                for p in (1, -1):
+                    mill_stones = {stone for mill in b.check_for_mills(p) for stone in mill}
+                    self.assertEqual(b.get_mill_stones(p), mill_stones)
+                    self.assertEqual(b.get_stones_outside_mills(p),
+                                     [stone for stone in b.get_player_stones(p) if stone not in mill_stones])
+                valids = np.flatnonzero(b.get_legal_move_vector(player, game.all_moves))
+                b.execute_move(player, rng.choice(valids), game.all_moves)
+                player = -player
+
+    def test_variant_matches_core(self):
+        """
+        Replays random games through the 4 x 8 variant and the rules core with the same rule parameters, comparing
+        every result after converting the boards of the variant to the 6 x 6 encoding.
+        """
+        variant = NineMensMorrisGame2()
+        core = NineMensMorrisGame(max_moves_without_mill=variant.MAX_MOVES_WITHOUT_MILL)
+        self.assertEqual(variant.getBoardSize(), (4, 8))
+        self.assertEqual(variant.getActionSize(), core.getActionSize())
+        rng = np.random.RandomState(2)
+
+        for _ in range(5):
+            board, player = variant.getInitBoard(), 1
+            core_board = core.getInitBoard()
+            while True:
+                np.testing.assert_array_equal(to_core_board(board), core_board)
+                np.testing.assert_array_equal(from_core_board(core_board), board)
+                np.testing.assert_array_equal(to_core_board(variant.getCanonicalForm(board, player)),
+                                              core.getCanonicalForm(core_board, player))
+                self.assertEqual(variant.stringRepresentation(board), core.stringRepresentation(core_board))
+
+                valids = variant.getValidMoves(board, player)
+                np.testing.assert_array_equal(valids, core.getValidMoves(core_board, player))
+                ended = variant.getGameEnded(board, player)
+                self.assertEqual(ended, core.getGameEnded(core_board, player))
+                if ended != 0:
+                    break
+
+                pi = valids / valids.sum()
+                for (rotated, rotated_pi), (core_rotated, core_rotated_pi) in zip(
+                        variant.getSymmetries(board, pi), core.getSymmetries(core_board, pi)):
+                    np.testing.assert_array_equal(to_core_board(rotated), core_rotated)
+                    np.testing.assert_array_equal(rotated_pi, core_rotated_pi)
+
+                action = rng.choice(np.flatnonzero(valids))
+                board, next_player = variant.getNextState(board, player, action)
+                core_board, _ = core.getNextState(core_board, player, action)
+                player = next_player
+
+    def test_state_round_trip(self):
+        game = self.game
+        board, _ = game.getNextState(game.getInitBoard(), 1, 0)
+        board = game.getCanonicalForm(board, -1)
+        state = game.stringRepresentation(board)
+
+        np.testing.assert_array_equal(state.toBoard(), board)
+        self.assertEqual(state, MorrisState.fromBoard(board.copy()))
+        self.assertNotEqual(state, game.stringRepresentation(game.getInitBoard()))
+        self.assertEqual(pickle.loads(pickle.dumps(state)), state)
+        with self.assertRaises(AttributeError):
+            state.key = 0
+
+
+
+class TestTablebase(unittest.TestCase):
+    """
+    Solves the 3v3 flying phase up to DEPTH plies and plays it with a draw after as many moves without a mill, so
+    that the table covers every decided position of the game.
+    """
+    DEPTH = 6
+
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.folder.name, 'tablebase.npy')
+        save(generate(cls.DEPTH), cls.path)
+        cls.tablebase = Tablebase(cls.path)
+        cls.game = NineMensMorrisGame(tablebase=cls.path, max_moves_without_mill=cls.DEPTH)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.folder.cleanup()
+
+    @staticmethod
+    def board(own, opp, moves_without_mill=0):
+        board = np.zeros((6, 6), dtype=int)
+        cells = board[:4].reshape(-1)
+        cells[list(own)] = 1
+        cells[list(opp)] = -1
+        board[4][0] = 18
+        board[4][1] = moves_without_mill
+        return board
+
+    def test_known_positions(self):
+        # closes the mill (0, 1, 2) by flying 10 to 2
+        self.assertEqual(self.tablebase.probe((0, 1, 10), (12, 13, 20)), 1)
+        # the opponent threatens to close (0, 1, 2) and (1, 9, 17), only one of them can be blocked
+        self.assertEqual(self.tablebase.probe((4, 12, 21), (0, 1, 9)), -2)
+        # (8, 9, 10) cannot be closed while all opponent stones form a mill
+        self.assertNotEqual(self.tablebase.probe((8, 9, 20), (0, 1, 2)), 1)
+
+        board = self.board((4, 12, 21), (0, 1, 9), moves_without_mill=self.DEPTH - 2)
+        self.assertEqual(self.tablebase.result(board, 1, self.DEPTH), -1)
+        board[4][1] += 1  # the loss takes longer than the moves left before the draw
+        self.assertEqual(self.tablebase.result(board, 1, self.DEPTH), 0.0001)
+
+        board = self.board((0, 1, 10, 11), (12, 13, 20))
+        self.assertIsNone(self.tablebase.result(board, 1, self.DEPTH))
+        board = self.board((0, 1, 10), (12, 13, 20))
+        board[4][0] = 17
+        self.assertIsNone(self.tablebase.result(board, 1, self.DEPTH))
+
+    def test_rejects_games_longer_than_the_table(self):
+        """
+        A position undecided within DEPTH plies may still be decided before a later draw, so the table cannot score
+        games with more moves without a mill.
+        """
+        self.assertEqual(self.tablebase.depth, self.DEPTH)
+        with self.assertRaises(ValueError):
+            NineMensMorrisGame(tablebase=self.path, max_moves_without_mill=self.DEPTH + 1)
+        with self.assertRaises(ValueError):
+            NineMensMorrisGame2(tablebase=self.path)
+
+    def test_consistent_with_rules(self):
+        """
+        On random 3v3 positions, the result getGameEnded takes from the table agrees with a one ply search over
+        getValidMoves and getNextState: won if a move leaves the opponent lost, lost if every move leaves it won.
+        The move counters tried include those where the distance to mate just fits before the draw and just not.
+        """
+        game = self.game
+        rng = np.random.RandomState(0)
+        checked = set()
+        for _ in range(300):
+            stones = rng.choice(24, 6, replace=False)
+            d = self.tablebase.probe(stones[:3], stones[3:])
+            boundary = self.DEPTH - abs(d) if d != 0 else rng.randint(self.DEPTH)
+            for moves_without_mill in {boundary, boundary + 1, rng.randint(self.DEPTH)}:
+                if moves_without_mill >= self.DEPTH:
+                    continue
+                board = self.board(stones[:3], stones[3:], moves_without_mill)
+                ended = game.getGameEnded(board, 1)
+                results = [game.getGameEnded(*game.getNextState(board, 1, a))
+                           for a in np.flatnonzero(game.getValidMoves(board, 1))]
+                if -1 in results:
+                    self.assertEqual(ended, 1)
+                elif all(r == 1 for r in results):
+                    self.assertEqual(ended, -1)
+                else:
+                    self.assertEqual(ended, 0.0001)
+                checked.add(ended)
+        self.assertEqual(checked, {1, -1, 0.0001})
+
+
+if __name__ == '__main__':
+    unittest.main()
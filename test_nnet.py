@@ -0,0 +1,104 @@
+import copy
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import torch
+
+import ninemensmorris.pytorch.NNet as morris_nnet
+import othello.pytorch.NNet as othello_nnet
+from ninemensmorris.NineMensMorrisGame import NineMensMorrisGame
+from othello.OthelloGame import OthelloGame
+
+
+class TestPytorchTraining(unittest.TestCase):
+    """
+    Runs every test on the Nine Men's Morris and the Othello wrapper, with small networks and without dropout, so
+    that updates can be compared exactly.
+    """
+    WRAPPERS = ((morris_nnet, NineMensMorrisGame), (othello_nnet, lambda: OthelloGame(6)))
+
+    def patched(self, module, **args):
+        return mock.patch.dict(module.args, dict({'num_channels': 16, 'dropout': 0.0, 'bf16': False, 'epochs': 1,
+                                                  'batch_size': 4, 'cuda': False}, **args))
+
+    @staticmethod
+    def examples(game, n, seed=0):
+        rng = np.random.RandomState(seed)
+        board = game.getInitBoard()
+        examples = []
+        for _ in range(n):
+            pi = rng.rand(game.getActionSize())
+            examples.append((board + rng.randint(-1, 2, board.shape), pi / pi.sum(), rng.uniform(-1, 1)))
+        return examples
+
+    def test_accumulation_matches_one_large_batch(self):
+        """
+        Two accumulated mini-batches make the same update as one batch of both. Each mini-batch holds the same eight
+        examples, so that batch normalization sees the same statistics either way.
+        """
+        for module, makeGame in self.WRAPPERS:
+            with self.subTest(module=module.__name__), self.patched(module, accumulation_steps=2):
+                self.check_accumulation(module, makeGame())
+
+    def check_accumulation(self, module, game):
+        torch.manual_seed(0)
+        nnet = module.NNetWrapper(game)
+        # plain SGD, whose update is linear in the gradient, unlike Adam's first step (about lr * sign(gradient))
+        nnet.optimizer = torch.optim.SGD(nnet.nnet.parameters(), lr=0.1)
+        data = nnet.prepare_examples(self.examples(game, 8))
+        ids = np.arange(8)
+        initial = copy.deepcopy(nnet.nnet.state_dict())
+
+        nnet.train_epoch(data, [ids, ids])
+        accumulated = copy.deepcopy(nnet.nnet.state_dict())
+
+        nnet.nnet.load_state_dict(initial)
+        with mock.patch.dict(module.args, accumulation_steps=1):
+            nnet.train_epoch(data, [np.concatenate([ids, ids])])
+        large = nnet.nnet.state_dict()
+
+        for name, _ in nnet.nnet.named_parameters():
+            torch.testing.assert_close(accumulated[name], large[name], rtol=1e-4, atol=1e-7)
+        self.assertFalse(torch.equal(initial['fc3.weight'], large['fc3.weight']))
+
+    def test_optimizer_state_survives_checkpoint(self):
+        for module, makeGame in self.WRAPPERS:
+            with self.subTest(module=module.__name__), self.patched(module, lr_decay=0.5):
+                game = makeGame()
+                nnet = module.NNetWrapper(game)
+                stats = nnet.train(self.examples(game, 8))
+                self.assertGreater(stats['examples_per_sec'], 0)
+
+                with tempfile.TemporaryDirectory() as folder:
+                    nnet.save_checkpoint(folder=folder, filename='best.pth.tar')
+                    loaded = module.NNetWrapper(game)
+                    loaded.load_checkpoint(folder=folder, filename='best.pth.tar')
+
+                self.assertAlmostEqual(loaded.optimizer.param_groups[0]['lr'], module.args.lr / 2)
+                saved, restored = nnet.optimizer.state_dict()['state'], loaded.optimizer.state_dict()['state']
+                self.assertTrue(saved)
+                self.assertEqual(saved.keys(), restored.keys())
+                for key in saved:
+                    self.assertEqual(saved[key]['step'], restored[key]['step'])
+                    torch.testing.assert_close(saved[key]['exp_avg'], restored[key]['exp_avg'])
+                    torch.testing.assert_close(saved[key]['exp_avg_sq'], restored[key]['exp_avg_sq'])
+
+    def test_bf16_falls_back_without_hardware_support(self):
+        for module, makeGame in self.WRAPPERS:
+            with self.subTest(module=module.__name__), self.patched(module, bf16=True):
+                game = makeGame()
+                with mock.patch.object(module, 'bf16_supported', return_value=False):
+                    nnet = module.NNetWrapper(game)
+                self.assertFalse(nnet.use_bf16)
+                with nnet.autocast():
+                    self.assertFalse(torch.is_autocast_enabled('cpu'))
+                self.assertIn('examples_per_sec', nnet.train(self.examples(game, 4)))
+
+                with mock.patch.object(torch.ops.mkldnn, '_is_mkldnn_bf16_supported', side_effect=RuntimeError):
+                    self.assertFalse(module.bf16_supported())
+
+
+if __name__ == '__main__':
+    unittest.main()
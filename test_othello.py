@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from othello.OthelloGame import OthelloGame
+from othello.OthelloLogic import Board
+
+
+class TestOthelloBitboard(unittest.TestCase):
+    """
+    Compares the bitboard backend of OthelloGame with the square-walking Board logic on random games.
+    """
+
+    def referenceValidMoves(self, game, board, player):
+        b = Board(game.n)
+        b.pieces = np.copy(board)
+        valids = np.zeros(game.getActionSize(), dtype=int)
+        legalMoves = b.get_legal_moves(player)
+        if len(legalMoves) == 0:
+            valids[-1] = 1
+        for x, y in legalMoves:
+            valids[game.n * x + y] = 1
+        return valids
+
+    def referenceNextState(self, game, board, player, action):
+        if action == game.n * game.n:
+            return board, -player
+        b = Board(game.n)
+        b.pieces = np.copy(board)
+        b.execute_move((action // game.n, action % game.n), player)
+        return b.pieces, -player
+
+    def referenceGameEnded(self, game, board, player):
+        b = Board(game.n)
+        b.pieces = np.copy(board)
+        if b.has_legal_moves(player) or b.has_legal_moves(-player):
+            return 0
+        return 1 if b.countDiff(player) > 0 else -1
+
+    def test_random_games(self):
+        rng = np.random.RandomState(0)
+        for n in (4, 6, 8):
+            game = OthelloGame(n)
+            for _ in range(10):
+                board, player = game.getInitBoard(), 1
+                while True:
+                    valids = game.getValidMoves(board, player)
+                    np.testing.assert_array_equal(valids, self.referenceValidMoves(game, board, player))
+                    ended = game.getGameEnded(board, player)
+                    self.assertEqual(ended, self.referenceGameEnded(game, board, player))
+                    if ended != 0:
+                        break
+
+                    action = rng.choice(np.flatnonzero(valids))
+                    nextBoard, nextPlayer = game.getNextState(board, player, action)
+                    referenceBoard, referencePlayer = self.referenceNextState(game, board, player, action)
+                    np.testing.assert_array_equal(nextBoard, referenceBoard)
+                    self.assertEqual(nextPlayer, referencePlayer)
+                    board, player = nextBoard, nextPlayer
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+import numpy as np
+import torch
+
+from ninemensmorris.NineMensMorrisGame import NineMensMorrisGame
+from ninemensmorris.pytorch.NNet import NNetWrapper
+from ReplayBuffer import ReplayBuffer
+from utils import epoch_batches, example_weights
+
+
+class TestReplayBuffer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.game = NineMensMorrisGame()
+        board = cls.game.getInitBoard()
+        cls.boards = [board] + [cls.game.getNextState(board, 1, a)[0] for a in (0, 1)]
+
+    def policy(self, action):
+        pi = np.zeros(self.game.getActionSize())
+        pi[action] = 1
+        return pi
+
+    def raw_examples(self):
+        """
+        Returns 6 examples of 3 states: the first state 3 times, the second twice, the third once.
+        """
+        a, b, c = self.boards
+        return [(a, self.policy(0), 1), (np.copy(a), self.policy(1), -1), (a, self.policy(1), 1),
+                (b, self.policy(2), 0.5), (np.copy(b), self.policy(2), 0.5), (c, self.policy(3), -1)]
+
+    def test_deduplicate_aggregates_counts(self):
+        examples = ReplayBuffer.deduplicate(self.game, self.raw_examples())
+        self.assertEqual(len(examples), 3)
+        self.assertEqual([count for _, _, _, count in examples], [3, 2, 1])
+
+        board, pi, v, _ = examples[0]
+        np.testing.assert_array_equal(board, self.boards[0])
+        np.testing.assert_allclose(pi[:2], [1 / 3, 2 / 3])
+        self.assertAlmostEqual(pi.sum(), 1)
+        self.assertAlmostEqual(v, 1 / 3)
+        np.testing.assert_allclose(examples[1][1], self.policy(2))
+        self.assertAlmostEqual(examples[1][2], 0.5)
+
+        # aggregated examples aggregate again by their counts
+        again = ReplayBuffer.deduplicate(self.game, examples + self.raw_examples()[:1])
+        self.assertEqual([count for _, _, _, count in again], [4, 2, 1])
+        np.testing.assert_allclose(again[0][1][:2], [2 / 4, 2 / 4])
+        self.assertAlmostEqual(again[0][2], 2 / 4)
+
+    def test_epoch_batches_visit_every_example_once(self):
+        batches = epoch_batches(103, 10)
+        self.assertEqual(len(batches), 10)
+        indices = np.concatenate(batches)
+        self.assertEqual(len(np.unique(indices)), 100)
+        self.assertEqual(epoch_batches(9, 10), [])
+
+    def test_example_weights(self):
+        self.assertIsNone(example_weights(self.raw_examples()))
+        examples = ReplayBuffer.deduplicate(self.game, self.raw_examples())
+        np.testing.assert_allclose(example_weights(examples), [1.5, 1, 0.5])
+        np.testing.assert_allclose(example_weights(examples + self.raw_examples()[:1]), np.array([3, 2, 1, 1]) * 4 / 7)
+
+    def test_weighted_loss_matches_raw_examples(self):
+        """
+        The count-weighted policy loss over the aggregated examples is the one over the raw examples, the value
+        loss differs by a constant.
+        """
+        nnet = NNetWrapper(self.game)
+        nnet.nnet.eval()
+
+        def losses(examples, weights=None):
+            boards, policies, vs = nnet.prepare_examples(examples)
+            ids = np.arange(len(examples))
+            with torch.no_grad():
+                out_pi, out_v = nnet.nnet(torch.from_numpy(boards))
+            targets = torch.from_numpy(nnet.dense_policies(policies, ids))
+            weights = torch.from_numpy(weights) if weights is not None else None
+            return (nnet.loss_pi(targets, out_pi, weights).item(),
+                    nnet.loss_v(torch.from_numpy(vs), out_v, weights).item())
+
+        raw = self.raw_examples()
+        aggregated = ReplayBuffer.deduplicate(self.game, raw)
+        raw_pi, raw_v = losses(raw)
+        weighted_pi, weighted_v = losses(aggregated, example_weights(aggregated))
+        self.assertAlmostEqual(weighted_pi, raw_pi, places=4)
+        # the squared errors differ by the spread of the raw values around their state average, a constant: the
+        # first state has the values 1, -1, 1 around 1 / 3, the others a single value
+        self.assertAlmostEqual(weighted_v + (4 / 9 + 16 / 9 + 4 / 9) / 6, raw_v, places=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
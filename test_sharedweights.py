@@ -0,0 +1,97 @@
+import multiprocessing as mp
+import time
+import unittest
+from collections import deque
+
+import torch
+
+from AsyncCoach import AsyncCoach
+from SharedWeights import SharedWeights
+
+
+def selfPlayWorker(shared, reader, version, examplesQueue, stop):
+    """
+    Mimics AsyncCoach's self-play worker: refreshes when the version counter moves, then puts an "episode" (the
+    bound version and weight) on the bounded queue, blocking while it is full.
+    """
+    module = torch.nn.Linear(1, 1, bias=False)
+    shared.attach(module, reader)
+    loadedVersion = 0
+    while not stop.is_set():
+        if version.value != loadedVersion:
+            loadedVersion = version.value
+            shared.refresh(module)
+        examplesQueue.put((loadedVersion, [(shared.attached, module.weight.item())]))
+
+
+class TestSharedWeights(unittest.TestCase):
+
+    def setUp(self):
+        ctx = mp.get_context('spawn')
+        self.shared = SharedWeights({'weight': torch.zeros(1, 1)}, readers=3)
+        self.version = ctx.Value('i', 1)
+        self.examplesQueue = ctx.Queue(maxsize=1)  # numEps = 1 < 3 workers
+        self.stop = ctx.Event()
+        self.workers = [ctx.Process(target=selfPlayWorker, daemon=True,
+                                    args=(self.shared, reader, self.version, self.examplesQueue, self.stop))
+                        for reader in range(3)]
+        for p in self.workers:
+            p.start()
+        self.coach = AsyncCoach.__new__(AsyncCoach)
+        self.coach.examplesQueue = self.examplesQueue
+        self.coach.drainedEpisodes = deque()
+
+    def tearDown(self):
+        self.stop.set()
+        for p in self.workers:
+            p.terminate()
+            p.join(timeout=10)
+
+    def publish(self, value, **kwargs):
+        self.shared.publish({'weight': torch.full((1, 1), float(value))}, **kwargs)
+        with self.version.get_lock():
+            self.version.value += 1
+
+    def waitUntilBlocked(self):
+        """
+        Waits until the queue is full and every worker is blocked putting an episode.
+        """
+        deadline = time.time() + 60
+        while not (self.examplesQueue.full() and min(self.shared.acks[:]) >= self.shared.version.value - 1):
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.05)
+        time.sleep(0.5)
+
+    def test_blocked_workers_do_not_stall_publish(self):
+        self.waitUntilBlocked()
+        self.publish(1, timeout=30, wait=self.coach.drainEpisodes)
+        self.waitUntilBlocked()
+        self.publish(2, timeout=30, wait=self.coach.drainEpisodes)
+        self.publish(3, timeout=30, wait=self.coach.drainEpisodes)
+
+        # episodes drained during the publishes come first, then the workers keep delivering the latest weights
+        self.assertTrue(self.coach.drainedEpisodes)
+        episodes = []
+        while self.coach.drainedEpisodes:
+            examples = []
+            self.coach.getEpisodeExamples(self.examplesQueue, examples, self.workers)
+            episodes += examples
+        deadline = time.time() + 60
+        while not episodes or episodes[-1] != (3, 3.0):
+            self.assertLess(time.time(), deadline)
+            examples = []
+            self.coach.getEpisodeExamples(self.examplesQueue, examples, self.workers)
+            episodes += examples
+        for attached, weight in episodes:
+            self.assertEqual(weight, float(attached))  # every episode saw the weights of the version it was bound to
+
+    def test_publish_without_consumer_times_out(self):
+        self.waitUntilBlocked()
+        self.publish(1, timeout=30)
+        self.waitUntilBlocked()
+        with self.assertRaises(TimeoutError):
+            self.shared.publish({'weight': torch.full((1, 1), 2.0)}, timeout=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class AverageMeter(object):
     """From https://github.com/pytorch/examples/blob/master/imagenet/main.py"""
 
@@ -19,4 +22,39 @@ class AverageMeter(object):
 
 class dotdict(dict):
     def __getattr__(self, name):
-        return self[name]
+        try:
+            return self[name]
+        except KeyError:
+            # AttributeError keeps getattr(args, name, default), copy and pickle (used by worker processes) working
+            raise AttributeError(name)
+
+
+def epoch_batches(size, batch_size):
+    """
+    Splits a random permutation of range(size) into mini-batches of batch_size indices, so that one pass over
+    the batches visits every example exactly once (the last size % batch_size examples of the permutation are
+    dropped).
+
+    Returns:
+        batches: list of index arrays
+    """
+    batch_count = size // batch_size
+    if batch_count == 0:
+        return []
+    permutation = np.random.permutation(size)
+    return np.split(permutation[:batch_count * batch_size], batch_count)
+
+
+def example_weights(examples):
+    """
+    Loss weights of training examples: the counts of examples aggregated by ReplayBuffer, (board, pi, v, count),
+    scaled to a mean of 1, so that the weighted mean loss over the aggregated examples is the mean loss over the
+    examples they aggregate. Plain (board, pi, v) examples count once.
+
+    Returns:
+        weights: float32 array, or None if all examples are plain
+    """
+    if all(len(e) == 3 for e in examples):
+        return None
+    counts = np.array([e[3] if len(e) > 3 else 1 for e in examples], dtype=np.float64)
+    return (counts * len(counts) / counts.sum()).astype(np.float32)